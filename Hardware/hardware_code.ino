@@ -17,6 +17,20 @@ const char* topic_vibration = "sensorGS2025FIAPLEOOO_XYZ_0987654321/vibration";
 const char* topic_temperature = "sensorGS2025FIAPLEOOO_XYZ_0987654321/temperature";
 const char* topic_humidity = "sensorGS2025FIAPLEOOO_XYZ_0987654321/humidity";
 
+// Formato dos payloads: false = JSON (padrão), true = binário fixo de 10 bytes
+// (versão 0x01, código do sensor, millis uint32, valor float32, little-endian;
+// ver src/interface/decoder.py)
+const bool useBinaryPayload = false;
+#define SENSOR_CODE_VIBRATION 1
+#define SENSOR_CODE_TEMPERATURE 2
+#define SENSOR_CODE_HUMIDITY 3
+
+// Lotes de vibração: true = acumula VIBRATION_BATCH_SIZE leituras (20Hz) e as publica em
+// uma única mensagem, com o millis() da primeira leitura e o intervalo entre elas
+// (JSON {"timestamp", "interval", "values"} ou lote binário versão 0x02)
+const bool batchVibration = false;
+#define VIBRATION_BATCH_SIZE 20
+
 // Definições dos pinos
 #define DHT_PIN 17     // Pino do DHT22 (SDA)
 #define DHT_TYPE DHT22 // Tipo do sensor DHT
@@ -55,6 +69,11 @@ unsigned long readingInterval = 50; // 20Hz para vibração
 unsigned long lastDataSend = 0;
 unsigned long dataSendInterval = 60000; // Enviar dados a cada 1 minuto
 
+// Lote de leituras de vibração aguardando publicação
+float vibrationBatch[VIBRATION_BATCH_SIZE];
+int vibrationBatchCount = 0;
+unsigned long vibrationBatchStart = 0;
+
 // Estatísticas
 int vibrationCount = 0;
 float maxVibration = 0;
@@ -82,6 +101,7 @@ void setup() {
   
   // Configurar MQTT
   mqtt.setServer(mqtt_server, mqtt_port);
+  mqtt.setBufferSize(512); // Lotes de vibração passam do limite padrão de 256 bytes
   
   // Inicializar I2C
   Wire.begin(SDA_PIN, SCL_PIN);
@@ -140,6 +160,9 @@ void loop() {
     if (Wire.endTransmission() == 0) {
       readAccelData();
       detectVibration();
+      if (batchVibration) {
+        addToVibrationBatch(currentTime);
+      }
     }
   }
   
@@ -364,6 +387,58 @@ void writeRegister(byte reg, byte data) {
 }
 
 // Funções de publicação MQTT otimizadas
+void publishBinarySample(const char* topic, uint8_t sensorCode, float value) {
+  uint8_t buffer[10];
+  uint32_t timestamp = millis();
+  buffer[0] = 0x01; // Versão do formato
+  buffer[1] = sensorCode;
+  memcpy(buffer + 2, &timestamp, sizeof(timestamp)); // ESP32 é little-endian
+  memcpy(buffer + 6, &value, sizeof(value));
+  mqtt.publish(topic, buffer, sizeof(buffer));
+}
+
+void addToVibrationBatch(unsigned long timestamp) {
+  if (vibrationBatchCount == 0) {
+    vibrationBatchStart = timestamp;
+  }
+  vibrationBatch[vibrationBatchCount++] = magnitude;
+  if (vibrationBatchCount == VIBRATION_BATCH_SIZE) {
+    if (mqtt.connected()) {
+      publishVibrationBatch();
+    }
+    vibrationBatchCount = 0;
+  }
+}
+
+void publishVibrationBatch() {
+  if (useBinaryPayload) {
+    uint8_t buffer[10 + 4 * VIBRATION_BATCH_SIZE];
+    uint16_t count = vibrationBatchCount;
+    uint32_t timestamp = vibrationBatchStart;
+    uint16_t interval = readingInterval;
+    buffer[0] = 0x02; // Versão do formato (lote)
+    buffer[1] = SENSOR_CODE_VIBRATION;
+    memcpy(buffer + 2, &count, sizeof(count));
+    memcpy(buffer + 4, &timestamp, sizeof(timestamp));
+    memcpy(buffer + 8, &interval, sizeof(interval));
+    memcpy(buffer + 10, vibrationBatch, 4 * vibrationBatchCount);
+    mqtt.publish(topic_vibration, buffer, 10 + 4 * vibrationBatchCount);
+    return;
+  }
+  
+  StaticJsonDocument<512> doc;
+  doc["timestamp"] = vibrationBatchStart;
+  doc["interval"] = readingInterval;
+  JsonArray values = doc.createNestedArray("values");
+  for (int i = 0; i < vibrationBatchCount; i++) {
+    values.add(vibrationBatch[i]);
+  }
+  
+  char buffer[400];
+  serializeJson(doc, buffer);
+  mqtt.publish(topic_vibration, buffer);
+}
+
 void publishVibrationAlert(float level, float magnitude) {
   StaticJsonDocument<150> doc;
   doc["timestamp"] = millis();
@@ -377,6 +452,11 @@ void publishVibrationAlert(float level, float magnitude) {
 }
 
 void publishCurrentVibration() {
+  if (useBinaryPayload) {
+    publishBinarySample(topic_vibration, SENSOR_CODE_VIBRATION, magnitude);
+    return;
+  }
+  
   StaticJsonDocument<150> doc;
   doc["timestamp"] = millis();
   doc["magnitude"] = magnitude;
@@ -404,6 +484,11 @@ void publishVibrationSummary() {
 }
 
 void publishTemperature(float temp) {
+  if (useBinaryPayload) {
+    publishBinarySample(topic_temperature, SENSOR_CODE_TEMPERATURE, temp);
+    return;
+  }
+  
   StaticJsonDocument<100> doc;
   doc["timestamp"] = millis();
   doc["temperature"] = temp;
@@ -414,6 +499,11 @@ void publishTemperature(float temp) {
 }
 
 void publishHumidity(float hum) {
+  if (useBinaryPayload) {
+    publishBinarySample(topic_humidity, SENSOR_CODE_HUMIDITY, hum);
+    return;
+  }
+  
   StaticJsonDocument<100> doc;
   doc["timestamp"] = millis();
   doc["humidity"] = hum;
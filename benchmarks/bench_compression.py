@@ -0,0 +1,164 @@
+"""Benchmark da compressão do histórico em memória (src/interface/gorilla.py).
+
+Gera séries realistas dos sensores do firmware (Hardware/hardware_code.ino)
+e compara o `RingBuffer` (arrays float64) com a `CompressedSeries` (blocos
+fechados com timestamps em delta-of-delta e valores em XOR):
+
+- `temperature` / `humidity`: DHT22 (resolução de 0,1, convertido de float32),
+  variação lenta ao longo do dia
+- `vibration`: magnitude do MPU6050 a 20 Hz (leituras int16 / 8192, float32),
+  com o valor remapeado para 0-9 e o valor bruto, como em `pipeline.py`
+
+Para cada série relata bytes por amostra e a vazão de codificação (inserção
+com fechamento dos blocos) e de decodificação (leitura do intervalo inteiro),
+e estima a memória de vários dias de histórico para N dispositivos. Os
+timestamps podem ser os do dispositivo alinhados ao servidor (espaçamento
+regular, `--timestamps device`) ou o instante de recepção (`--timestamps received`).
+
+Uso: python benchmarks/bench_compression.py [--samples N] [--block-size N]
+         [--timestamps device|received] [--devices N] [--days D] [--json]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from timeseries import CompressedSeries, RingBuffer  # noqa: E402
+
+# Mesmas constantes de pipeline.py para o remapeamento da vibração
+VIBRATION_MAX_SENSOR = 3.464102
+VIBRATION_MAX_SCALE = 9.0
+
+# Intervalo entre amostras de cada série (segundos)
+INTERVALS = {"vibration": 0.05, "temperature": 2.0, "humidity": 2.0}
+FIELDS = {"vibration": ("value", "raw_value"), "temperature": ("value",), "humidity": ("value",)}
+
+
+def float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+# Funções que geram (timestamps, colunas) de cada sensor
+def dht22_stream(count, interval, base, amplitude, seed, timestamps):
+    rng = random.Random(seed)
+    times, values = [], []
+    start = 1.75e9
+    for index in range(count):
+        t = start + index * interval
+        # Variação diária + ruído de leitura, na resolução de 0,1 do DHT22
+        reading = base + amplitude * math.sin(2 * math.pi * t / 86400) + rng.gauss(0, 0.05)
+        values.append(float32(round(reading, 1)))
+        times.append(jitter(t, rng, timestamps))
+    return times, [values]
+
+
+def mpu6050_stream(count, interval, seed, timestamps):
+    rng = random.Random(seed)
+    times, remapped, raw = [], [], []
+    start = 1.75e9
+    for index in range(count):
+        t = start + index * interval
+        # Aceleração em g (gravidade em z) com vibração de 12 Hz e ruído, quantizada como o int16 do sensor
+        ax = round(rng.gauss(0, 0.02) * 8192) / 8192.0
+        ay = round(rng.gauss(0, 0.02) * 8192) / 8192.0
+        az = round((1.0 + 0.05 * math.sin(2 * math.pi * 12 * t) + rng.gauss(0, 0.01)) * 8192) / 8192.0
+        magnitude = float32(math.sqrt(ax * ax + ay * ay + az * az))
+        raw.append(magnitude)
+        remapped.append(max(0, min(magnitude, VIBRATION_MAX_SENSOR)) / VIBRATION_MAX_SENSOR * VIBRATION_MAX_SCALE)
+        times.append(jitter(t, rng, timestamps))
+    return times, [remapped, raw]
+
+
+def jitter(t, rng, timestamps):
+    if timestamps == "device":
+        # millis() do dispositivo convertido com a diferença estimada: espaçamento regular
+        return round(t * 1000) / 1000 + 0.4321
+    # Instante de recepção: atraso variável de rede e do broker
+    return t + abs(rng.gauss(0.02, 0.01))
+
+
+def bench_series(name, times, columns, block_size):
+    fields = FIELDS[name]
+    count = len(times)
+    rows = list(zip(times, *columns))
+
+    ring = RingBuffer(count, fields)
+    for row in rows:
+        ring.append(*row)
+
+    compressed = CompressedSeries(count, fields, block_size)
+    start = time.perf_counter()
+    for row in rows:
+        compressed.append(*row)
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded_times, decoded = compressed.range()
+    decode_seconds = time.perf_counter() - start
+
+    # Conferir a leitura: valores exatos e timestamps com resolução de microssegundos
+    assert len(decoded_times) == count
+    assert max(abs(a - b) for a, b in zip(decoded_times.tolist(), times)) < 1e-6
+    for field, values in zip(fields, columns):
+        assert decoded[field].tolist() == values
+
+    return {
+        "series": name,
+        "samples": count,
+        "raw_bytes_per_sample": ring.nbytes() / count,
+        "compressed_bytes_per_sample": compressed.nbytes() / count,
+        "ratio": ring.nbytes() / compressed.nbytes(),
+        "encode_samples_per_second": count / encode_seconds,
+        "decode_samples_per_second": count / decode_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=100000, help="amostras por série")
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--timestamps", choices=("device", "received"), default="device")
+    parser.add_argument("--devices", type=int, default=100, help="dispositivos na estimativa de memória")
+    parser.add_argument("--days", type=float, default=7.0, help="dias de histórico na estimativa de memória")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    args = parser.parse_args()
+
+    streams = {
+        "vibration": mpu6050_stream(args.samples, INTERVALS["vibration"], 1, args.timestamps),
+        "temperature": dht22_stream(args.samples, INTERVALS["temperature"], 24.0, 3.0, 2, args.timestamps),
+        "humidity": dht22_stream(args.samples, INTERVALS["humidity"], 60.0, 10.0, 3, args.timestamps),
+    }
+    results = [bench_series(name, times, columns, args.block_size) for name, (times, columns) in streams.items()]
+
+    # Memória de `days` dias de histórico para `devices` dispositivos, nas taxas acima
+    seconds = args.days * 86400
+    estimate = {"devices": args.devices, "days": args.days, "raw_mb": 0.0, "compressed_mb": 0.0}
+    for result in results:
+        samples = seconds / INTERVALS[result["series"]] * args.devices
+        estimate["raw_mb"] += samples * result["raw_bytes_per_sample"] / 1e6
+        estimate["compressed_mb"] += samples * result["compressed_bytes_per_sample"] / 1e6
+
+    if args.json:
+        print(json.dumps({"timestamps": args.timestamps, "block_size": args.block_size,
+                          "series": results, "estimate": estimate}, indent=2))
+        return
+    print(f"Timestamps: {args.timestamps}; blocos de {args.block_size} pontos; {args.samples} amostras por série")
+    print()
+    print(f"{'série':<12} {'bytes/amostra':>14} {'comprimido':>11} {'razão':>7} {'codif. amostras/s':>18} {'decodif. amostras/s':>20}")
+    for result in results:
+        print(f"{result['series']:<12} {result['raw_bytes_per_sample']:>14.1f} {result['compressed_bytes_per_sample']:>11.2f} "
+              f"{result['ratio']:>6.1f}x {result['encode_samples_per_second']:>18,.0f} {result['decode_samples_per_second']:>20,.0f}")
+    print()
+    print(f"{estimate['devices']} dispositivos, {estimate['days']:g} dias (vibração a {1 / INTERVALS['vibration']:g} Hz, "
+          f"DHT22 a cada {INTERVALS['temperature']:g} s): {estimate['raw_mb']:,.0f} MB sem compressão, "
+          f"{estimate['compressed_mb']:,.0f} MB comprimido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Micro-benchmark dos formatos de payload aceitos pelo decodificador.
+
+Compara o custo de decodificação e o tamanho em bytes dos payloads que o
+firmware (Hardware/hardware_code.ino) publica hoje em JSON com as
+alternativas binárias (struct fixo e MessagePack, se instalado). Compara
+também o envio de um lote de leituras de vibração (publishVibrationBatch)
+com o envio de uma mensagem por leitura, por amostra.
+
+Uso: python benchmarks/bench_decoder.py [--iterations N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+import decoder  # noqa: E402
+
+# Payloads equivalentes aos gerados pelas funções publish* do firmware
+FIRMWARE_PAYLOADS = {
+    "publishCurrentVibration": ("vibration", {
+        "timestamp": 1234567, "magnitude": 1.0234, "vibration_level": 0.0234,
+        "baseline": 1.0, "is_vibrating": False}),
+    "publishVibrationAlert": ("vibration", {
+        "timestamp": 1234567, "level": 1.2, "magnitude": 2.2, "type": "alert"}),
+    "publishVibrationSummary": ("vibration", {
+        "timestamp": 1234567, "count": 12, "current_magnitude": 1.0234,
+        "threshold": 0.3, "baseline": 1.0, "type": "summary"}),
+    "publishTemperature": ("temperature", {"timestamp": 1234567, "temperature": 24.3}),
+    "publishHumidity": ("humidity", {"timestamp": 1234567, "humidity": 61.8}),
+}
+
+# Leituras por lote (VIBRATION_BATCH_SIZE do firmware) e intervalo entre elas (ms)
+BATCH_SIZE = 20
+BATCH_INTERVAL = 50
+
+
+# Função para extrair o valor como o código original fazia (json.loads + sondagem de chaves)
+def legacy_decode(sensor, payload):
+    data = json.loads(payload.decode())
+    for key in decoder.SCHEMAS[sensor]:
+        if key in data:
+            return float(data[key])
+    return None
+
+
+def bench(function, iterations):
+    seconds = min(timeit.repeat(function, number=iterations, repeat=3))
+    return seconds / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"Backend JSON do decodificador: {decoder.JSON_BACKEND}")
+    print(f"MessagePack disponível: {'sim' if decoder.msgpack is not None else 'não'}")
+    print()
+    print(f"{'payload':<26} {'formato':<18} {'bytes':>6} {'us/msg':>8}")
+
+    for name, (sensor, document) in FIRMWARE_PAYLOADS.items():
+        json_payload = json.dumps(document, separators=(",", ":")).encode()
+        value = decoder.extract_value(sensor, document)
+        rows = [
+            ("json (original)", json_payload, lambda: legacy_decode(sensor, json_payload)),
+            ("json (decoder)", json_payload, lambda: decoder.decode_sample(sensor, json_payload)),
+        ]
+        struct_payload = decoder.encode_struct(sensor, value, document["timestamp"])
+        rows.append(("struct", struct_payload, lambda: decoder.decode_sample(sensor, struct_payload)))
+        if decoder.msgpack is not None:
+            msgpack_payload = decoder.msgpack.packb(document)
+            rows.append(("msgpack", msgpack_payload, lambda: decoder.decode_sample(sensor, msgpack_payload)))
+        for label, payload, function in rows:
+            print(f"{name:<26} {label:<18} {len(payload):>6} {bench(function, args.iterations):>8.2f}")
+        print()
+
+    # Por amostra: uma mensagem por leitura contra uma mensagem com BATCH_SIZE leituras
+    values = [1.0 + 0.01 * index for index in range(BATCH_SIZE)]
+    single = json.dumps({"timestamp": 1234567, "magnitude": values[0]}, separators=(",", ":")).encode()
+    batch_json = json.dumps({"timestamp": 1234567, "interval": BATCH_INTERVAL, "values": values},
+                            separators=(",", ":")).encode()
+    single_struct = decoder.encode_struct("vibration", values[0], 1234567)
+    batch_struct = decoder.encode_batch("vibration", values, 1234567, BATCH_INTERVAL)
+    rows = [
+        ("json (1 por msg)", single, 1, lambda: decoder.decode_samples("vibration", single)),
+        ("struct (1 por msg)", single_struct, 1, lambda: decoder.decode_samples("vibration", single_struct)),
+        (f"json (lote de {BATCH_SIZE})", batch_json, BATCH_SIZE, lambda: decoder.decode_samples("vibration", batch_json)),
+        (f"struct (lote de {BATCH_SIZE})", batch_struct, BATCH_SIZE,
+         lambda: decoder.decode_samples("vibration", batch_struct)),
+    ]
+    print(f"{'publishVibrationBatch':<26} {'formato':<18} {'bytes/amostra':>13} {'us/amostra':>10}")
+    for label, payload, count, function in rows:
+        print(f"{'':<26} {label:<18} {len(payload) / count:>13.1f} {bench(function, args.iterations) / count:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Gerador de carga e benchmark do caminho de ingestão.
+
+Simula N dispositivos ESP32 publicando payloads no formato do firmware
+(publishCurrentVibration, publishTemperature, publishHumidity) a uma taxa
+configurável e mede o processamento pelo dashboard (src/interface/app.py) ou
+pelo receptor (src/mqtt-connection.py):
+
+- transporte `direct`: chama o `on_message` do alvo com mensagens em memória
+- transporte `broker`: publica em um broker MQTT local (benchmarks/mini_broker.py)
+  ao qual o cliente MQTT do alvo se conecta
+
+Relata mensagens por segundo, latência p50/p99 (do envio até o quadro
+Socket.IO emitido, no dashboard, ou até o fim do callback, no receptor), uso
+de CPU e memória (RSS). O gerador roda no mesmo processo, então a CPU
+medida inclui o custo de gerar as mensagens.
+
+Uso: python benchmarks/bench_ingest.py [--target app|receiver] [--transport direct|broker]
+         [--devices N] [--rate MSG/S por dispositivo] [--duration S] [--format json|struct] [--json]
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+sys.path.insert(0, os.path.join(SRC_DIR, "interface"))
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import decoder  # noqa: E402
+from mini_broker import MiniBroker  # noqa: E402
+
+# Sequência de publicação de cada dispositivo: 8 leituras de vibração para cada temperatura/umidade
+MESSAGE_CYCLE = ("vibration",) * 8 + ("temperature", "humidity")
+
+
+class FakeMessage:
+    """Mensagem no formato entregue pelo paho ao callback on_message."""
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class DeviceSimulator:
+    """Gera os payloads de um dispositivo; o campo timestamp é um contador usado para medir a latência."""
+
+    def __init__(self, device_id, payload_format):
+        self.device_id = device_id
+        self.payload_format = payload_format
+        self.sequence = 0
+        self.phase = random.random() * math.tau
+
+    def next_message(self):
+        self.sequence += 1
+        sensor = MESSAGE_CYCLE[self.sequence % len(MESSAGE_CYCLE)]
+        t = self.sequence * 0.1 + self.phase
+        if sensor == "vibration":
+            magnitude = 1.0 + 0.05 * math.sin(t * 7.0) + random.gauss(0, 0.01)
+            # Picos ocasionais para exercitar as regras de alerta
+            if random.random() < 0.001:
+                magnitude += 2.0
+            document = {"timestamp": self.sequence, "magnitude": magnitude,
+                        "vibration_level": abs(magnitude - 1.0), "baseline": 1.0, "is_vibrating": False}
+            value = magnitude
+        elif sensor == "temperature":
+            value = 24.0 + math.sin(t / 60.0) * 3.0
+            document = {"timestamp": self.sequence, "temperature": value}
+        else:
+            value = 60.0 + math.sin(t / 90.0) * 10.0
+            document = {"timestamp": self.sequence, "humidity": value}
+        if self.payload_format == "struct":
+            payload = decoder.encode_struct(sensor, value, self.sequence)
+        else:
+            payload = json.dumps(document, separators=(",", ":")).encode()
+        return f"{self.device_id}/{sensor}", payload, self.sequence
+
+
+class LatencyRecorder:
+    """Associa cada mensagem enviada ao instante em que ela foi processada/emitida."""
+
+    def __init__(self):
+        self.sent = {}      # (tópico, sequência) -> instante de envio
+        self.pending = []   # Mensagens processadas ainda não emitidas
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def on_sent(self, topic, sequence):
+        self.sent[(topic, sequence)] = time.perf_counter()
+
+    def on_processed(self, topic, payload):
+        with self.lock:
+            self.pending.append((topic, payload))
+
+    def on_emitted(self):
+        now = time.perf_counter()
+        with self.lock:
+            batch, self.pending = self.pending, []
+        self.latencies.append((now, batch))
+
+    def resolve(self):
+        """Calcula as latências (fora do caminho medido, decodificando a sequência dos payloads)."""
+        result = []
+        for emitted_at, batch in self.latencies:
+            for topic, payload in batch:
+                sensor = topic.rpartition("/")[2]
+                try:
+                    _, sequence = decoder.decode_sample(sensor, payload)
+                except decoder.DecodeError:
+                    continue
+                sent_at = self.sent.get((topic, sequence))
+                if sent_at is not None:
+                    result.append(emitted_at - sent_at)
+        return sorted(result)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+# Função para preparar o dashboard como alvo: histórico em diretório temporário e ganchos de medição
+def setup_app(recorder, history_dir):
+    import app
+    from storage import HistoryStore
+
+    app.history_store = app.pipeline.history_store = HistoryStore(history_dir, retention_days=app.HISTORY_RETENTION_DAYS)
+    handle_message = app.ingest_queue.handler
+
+    def measured_handler(topic, payload, received_at):
+        handle_message(topic, payload, received_at)
+        recorder.on_processed(topic, payload)
+
+    send_frame = app.broadcast_scheduler.send_frame
+
+    def measured_send(frame):
+        send_frame(frame)
+        recorder.on_emitted()
+
+    app.ingest_queue.handler = measured_handler
+    app.broadcast_scheduler.send_frame = measured_send
+    app.history_store.start()
+    app.ingest_queue.start()
+    app.broadcast_scheduler.start()
+
+    def drain(timeout):
+        deadline = time.time() + timeout
+        while app.ingest_queue.depth() and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(app.BROADCAST_MAX_LATENCY * 2)
+        app.broadcast_scheduler.flush()
+
+    def stop():
+        app.broadcast_scheduler.stop()
+        app.ingest_queue.stop(timeout=5)
+        app.history_store.stop()
+
+    def extra_stats():
+        return {"ingest": app.ingest_queue.stats(), "broadcast": app.broadcast_scheduler.stats()}
+
+    return app, app.on_message, app.mqtt_client, drain, stop, extra_stats
+
+
+# Função para preparar o receptor como alvo: a latência vai até o fim do callback
+def setup_receiver(recorder, history_dir):
+    spec = importlib.util.spec_from_file_location("mqtt_connection", os.path.join(SRC_DIR, "mqtt-connection.py"))
+    receiver = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(receiver)
+    on_message = receiver.on_message
+
+    def measured_on_message(client, userdata, msg):
+        on_message(client, userdata, msg)
+        recorder.on_processed(msg.topic, msg.payload)
+        recorder.on_emitted()
+
+    receiver.client.on_message = measured_on_message
+    return receiver, measured_on_message, receiver.client, lambda timeout: time.sleep(0.2), lambda: None, dict
+
+
+def run(args):
+    recorder = LatencyRecorder()
+    history_dir = tempfile.mkdtemp(prefix="bench-history-")
+    setup = setup_app if args.target == "app" else setup_receiver
+    module, on_message, target_client, drain, stop, extra_stats = setup(recorder, history_dir)
+
+    broker = publisher = None
+    if args.transport == "broker":
+        import paho.mqtt.client as mqtt
+
+        broker = MiniBroker()
+        port = broker.start()
+        connected = threading.Event()
+        target_on_connect = target_client.on_connect
+
+        def on_connect(client, userdata, flags, rc):
+            target_on_connect(client, userdata, flags, rc)
+            connected.set()
+
+        target_client.on_connect = on_connect
+        target_client.connect("127.0.0.1", port, 60)
+        target_client.loop_start()
+        connected.wait(5)
+        time.sleep(0.2)  # Esperar o SUBACK
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "bench-publisher")
+        publisher.connect("127.0.0.1", port, 60)
+        publisher.loop_start()
+
+        def send(topic, payload):
+            publisher.publish(topic, payload)
+    else:
+        def send(topic, payload):
+            on_message(None, None, FakeMessage(topic, payload))
+
+    devices = [DeviceSimulator(f"bench{index:04d}", args.format) for index in range(args.devices)]
+    total_rate = args.rate * args.devices
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= args.duration:
+            break
+        # Número de mensagens que já deveriam ter sido enviadas (rate 0 = o mais rápido possível)
+        due = sent + 100 if total_rate <= 0 else int(elapsed * total_rate)
+        if due <= sent:
+            time.sleep(0.0005)
+            continue
+        while sent < due:
+            topic, payload, sequence = devices[sent % len(devices)].next_message()
+            recorder.on_sent(topic, sequence)
+            send(topic, payload)
+            sent += 1
+    send_elapsed = time.perf_counter() - start
+
+    drain(10)
+    elapsed = time.perf_counter() - start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    if publisher is not None:
+        publisher.loop_stop()
+        target_client.loop_stop()
+        broker.stop()
+    stop()
+
+    latencies = recorder.resolve()
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    return {
+        "target": args.target,
+        "transport": args.transport,
+        "format": args.format,
+        "devices": args.devices,
+        "sent": sent,
+        "processed": len(latencies),
+        "send_rate": sent / send_elapsed,
+        "throughput": len(latencies) / elapsed,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_max_ms": latencies[-1] * 1000 if latencies else None,
+        "cpu_percent": cpu / elapsed * 100,
+        "rss_mb": current_rss_mb(),
+        "max_rss_mb": usage_end.ru_maxrss / 1024,
+        **extra_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("app", "receiver"), default="app")
+    parser.add_argument("--transport", choices=("direct", "broker"), default="direct")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=10.0, help="mensagens por segundo por dispositivo (0 = sem limite)")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--format", choices=("json", "struct"), default="json")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    parser.add_argument("--verbose", action="store_true", help="exibir os logs do alvo (por padrão vão para /dev/null)")
+    args = parser.parse_args()
+
+    # Os logs continuam sendo formatados (custo real do caminho), mas não poluem a saída
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr if args.verbose else open(os.devnull, "w"))
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Alvo: {result['target']} ({result['transport']}, {result['format']}), {result['devices']} dispositivos")
+    print(f"Mensagens enviadas:     {result['sent']} ({result['send_rate']:.0f} msg/s)")
+    print(f"Mensagens processadas:  {result['processed']} ({result['throughput']:.0f} msg/s)")
+    if result["latency_p50_ms"] is not None:
+        print(f"Latência p50/p99/máx:   {result['latency_p50_ms']:.2f} / {result['latency_p99_ms']:.2f} / "
+              f"{result['latency_max_ms']:.2f} ms")
+    print(f"CPU:                    {result['cpu_percent']:.0f}%")
+    rss = result["rss_mb"]
+    print(f"RSS atual/máximo:       {rss:.1f} / {result['max_rss_mb']:.1f} MB" if rss is not None
+          else f"RSS máximo:             {result['max_rss_mb']:.1f} MB")
+    if "ingest" in result:
+        ingest = result["ingest"]
+        print(f"Fila de ingestão:       máx. {ingest['max_depth']} mensagens, {ingest['dropped']} descartadas")
+
+
+if __name__ == "__main__":
+    main()
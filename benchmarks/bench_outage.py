@@ -0,0 +1,196 @@
+"""Benchmark de quedas do broker: tempo de recuperação e perda de mensagens.
+
+Um sensor simulado publica leituras numeradas a uma taxa fixa e um receptor
+as assina, ambos com `MqttSession` (src/interface/mqtt_session.py) ligados ao
+broker local (benchmarks/mini_broker.py). Durante a execução o broker derruba
+e recusa os clientes por alguns segundos (`MiniBroker.partition`), várias
+vezes. Cada modo é executado em sequência:
+
+- `qos0`: QoS 0, sessão limpa e sem spool (comportamento anterior)
+- `qos1`: QoS 1, sessão persistente no broker e spool em disco no sensor
+
+Relata mensagens enviadas, recebidas, perdidas e duplicadas, quantas
+passaram pelo spool e o tempo de recuperação (duração medida das quedas
+menos a duração simulada). `--scope receiver` derruba apenas o receptor (o
+broker guarda as mensagens da sessão persistente); `--scope all` derruba
+também o sensor (as publicações vão para o spool).
+
+Uso: python benchmarks/bench_outage.py [--mode qos0|qos1|both] [--scope receiver|all]
+         [--rate MSG/S] [--outages N] [--outage-seconds S] [--json]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src", "interface"))
+sys.path.insert(0, BENCH_DIR)
+
+import paho.mqtt.client as mqtt  # noqa: E402
+
+from mini_broker import MiniBroker  # noqa: E402
+from mqtt_session import Backoff, MqttSession, Spool  # noqa: E402
+
+TOPIC = "bench-outage/vibration"
+SENSOR_ID = "bench-sensor"
+RECEIVER_ID = "bench-receiver"
+
+# Espera entre tentativas de reconexão (segundos); menor que a dos componentes para agilizar a execução
+RECONNECT_MIN = 0.2
+RECONNECT_MAX = 2.0
+
+# Configuração de cada modo: QoS, sessão limpa e uso do spool
+MODES = {
+    "qos0": {"qos": 0, "clean_session": True, "spool": False},
+    "qos1": {"qos": 1, "clean_session": False, "spool": True},
+}
+
+
+class Receiver:
+    """Assinante que registra os números de sequência recebidos."""
+
+    def __init__(self, qos, clean_session):
+        self.qos = qos
+        self.received = set()
+        self.duplicates = 0
+        self.lock = threading.Lock()
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, RECEIVER_ID, clean_session=clean_session)
+        client.on_connect = self.on_connect
+        client.on_message = self.on_message
+        self.session = MqttSession(client, qos=qos, backoff=Backoff(RECONNECT_MIN, RECONNECT_MAX))
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(TOPIC, qos=self.qos)
+
+    def on_message(self, client, userdata, msg):
+        sequence = json.loads(msg.payload)["seq"]
+        with self.lock:
+            if sequence in self.received:
+                self.duplicates += 1
+            else:
+                self.received.add(sequence)
+
+
+# Função para executar o laço de um MqttSession em uma thread e esperar a primeira conexão
+def start_session(session, port):
+    thread = threading.Thread(target=session.run_forever, args=("127.0.0.1", port, 10), daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while not session.connected and time.time() < deadline:
+        time.sleep(0.01)
+    return thread
+
+
+def run_mode(mode, args):
+    config = MODES[mode]
+    broker = MiniBroker()
+    port = broker.start()
+    spool_dir = tempfile.mkdtemp(prefix="bench-spool-")
+
+    receiver = Receiver(config["qos"], config["clean_session"])
+    start_session(receiver.session, port)
+    time.sleep(0.2)  # Esperar o SUBACK
+
+    sensor_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, SENSOR_ID, clean_session=config["clean_session"])
+    spool = Spool(os.path.join(spool_dir, "sensor.sqlite")) if config["spool"] else None
+    sensor = MqttSession(sensor_client, qos=config["qos"], spool=spool,
+                         backoff=Backoff(RECONNECT_MIN, RECONNECT_MAX))
+    start_session(sensor, port)
+
+    # Quedas distribuídas ao longo da execução, com um período estável no início e no fim
+    interval = args.duration / (args.outages + 1)
+    outage_times = [interval * (index + 1) for index in range(args.outages)]
+    prefix = RECEIVER_ID if args.scope == "receiver" else ""
+
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= args.duration:
+            break
+        if outage_times and elapsed >= outage_times[0]:
+            outage_times.pop(0)
+            broker.partition(args.outage_seconds, prefix)
+        due = int(elapsed * args.rate)
+        while sent < due:
+            sent += 1
+            sensor.publish(TOPIC, json.dumps({"seq": sent}))
+        time.sleep(0.001)
+
+    # Esperar as mensagens guardadas (broker, paho e spool) chegarem
+    deadline = time.time() + args.drain
+    while len(receiver.received) < sent and time.time() < deadline:
+        time.sleep(0.05)
+
+    sensor_stats = sensor.stats()
+    receiver_stats = receiver.session.stats()
+    sensor.stop()
+    receiver.session.stop()
+    broker.stop()
+
+    outages = receiver_stats["outages"]
+    measured = receiver_stats["outage_seconds_total"] / outages if outages else None
+    received = len(receiver.received)
+    return {
+        "mode": mode,
+        "scope": args.scope,
+        "qos": config["qos"],
+        "clean_session": config["clean_session"],
+        "sent": sent,
+        "received": received,
+        "lost": sent - received,
+        "loss_percent": (sent - received) / sent * 100 if sent else 0.0,
+        "duplicates": receiver.duplicates,
+        "spooled": sensor_stats["spooled"],
+        "sensor_lost": sensor_stats["lost"],
+        "outages": outages,
+        "outage_seconds_mean": measured,
+        "recovery_seconds_mean": measured - args.outage_seconds if measured is not None else None,
+        "broker_queued": broker.messages_queued,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("qos0", "qos1", "both"), default="both")
+    parser.add_argument("--scope", choices=("receiver", "all"), default="all",
+                        help="clientes derrubados nas quedas: só o receptor ou todos")
+    parser.add_argument("--rate", type=float, default=200.0, help="mensagens por segundo do sensor")
+    parser.add_argument("--duration", type=float, default=12.0)
+    parser.add_argument("--outages", type=int, default=2)
+    parser.add_argument("--outage-seconds", type=float, default=2.0)
+    parser.add_argument("--drain", type=float, default=10.0,
+                        help="tempo máximo de espera pelas mensagens atrasadas após o envio (segundos)")
+    parser.add_argument("--json", action="store_true", help="imprimir o resultado em JSON")
+    parser.add_argument("--verbose", action="store_true", help="exibir os logs das sessões")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s',
+                        stream=sys.stderr if args.verbose else open(os.devnull, "w"))
+
+    modes = ("qos0", "qos1") if args.mode == "both" else (args.mode,)
+    results = [run_mode(mode, args) for mode in modes]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"Modo {result['mode']} (QoS {result['qos']}, sessão {'limpa' if result['clean_session'] else 'persistente'}), "
+              f"quedas de {args.outage_seconds:.1f}s em: {result['scope']}")
+        print(f"Mensagens enviadas:     {result['sent']}")
+        print(f"Mensagens recebidas:    {result['received']} ({result['duplicates']} duplicadas)")
+        print(f"Mensagens perdidas:     {result['lost']} ({result['loss_percent']:.1f}%)")
+        print(f"Guardadas no spool:     {result['spooled']}; guardadas no broker: {result['broker_queued']}")
+        if result["outage_seconds_mean"] is not None:
+            print(f"Quedas do receptor:     {result['outages']}, duração média {result['outage_seconds_mean']:.2f}s "
+                  f"(recuperação {result['recovery_seconds_mean']:.2f}s após o fim da queda)")
+        print()
+
+
+if __name__ == "__main__":
+    main()
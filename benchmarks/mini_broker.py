@@ -0,0 +1,341 @@
+"""Broker MQTT 3.1.1 mínimo, em memória, para benchmarks e testes locais.
+
+Implementa apenas o necessário para o dashboard e o receptor: CONNECT,
+PUBLISH com QoS 0 e 1 (entregue com o menor QoS entre publicação e
+assinatura), SUBSCRIBE com curingas `+` e `#`, sessões persistentes (clean
+session = 0: assinaturas mantidas e mensagens QoS 1 guardadas enquanto o
+cliente está fora), mensagens retidas, last will, PINGREQ e DISCONNECT.
+Não há autenticação, persistência em disco nem QoS 2. `partition()` simula
+quedas, derrubando e recusando clientes por alguns segundos.
+
+Uso: python benchmarks/mini_broker.py [--host 127.0.0.1] [--port 1883]
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+# Código do CONNACK para "servidor indisponível"
+CONNACK_UNAVAILABLE = 3
+
+
+# Função para verificar se um tópico corresponde a um filtro com curingas
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(text):
+    data = text.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+def publish_packet(topic, payload, retain=False, qos=0, packet_id=None):
+    body = encode_string(topic) + (struct.pack("!H", packet_id) if qos else b"") + payload
+    flags = (qos << 1) | (1 if retain else 0)
+    return bytes([(PUBLISH << 4) | flags]) + encode_length(len(body)) + body
+
+
+class _Session:
+    def __init__(self, client_id, clean=True):
+        self.client_id = client_id
+        self.clean = clean
+        self.writer = None  # None enquanto o cliente está desconectado
+        self.subscriptions = {}  # filtro -> QoS concedido
+        self.will = None  # (tópico, payload, retain)
+        self.queued = collections.deque()  # (tópico, payload) QoS 1 guardadas enquanto desconectado
+        self.inflight = {}  # id do pacote -> (tópico, payload), aguardando PUBACK
+        self._last_packet_id = 0
+
+    def next_packet_id(self):
+        self._last_packet_id = self._last_packet_id % 65535 + 1
+        return self._last_packet_id
+
+
+class MiniBroker:
+    """Broker executado em uma thread própria (loop asyncio dedicado)."""
+
+    def __init__(self, host="127.0.0.1", port=0, max_queued=100000):
+        self.host = host
+        self.port = port
+        self.max_queued = max_queued
+        self._sessions = {}  # client id -> _Session (conectadas e persistentes)
+        self._retained = {}
+        self._blocked = {}  # prefixo do client id -> instante (monotônico) até o qual é recusado
+        self._anonymous = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+        # Métricas
+        self.messages_in = 0
+        self.messages_out = 0
+        self.messages_queued = 0
+        self.messages_dropped = 0
+
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header[0], body
+
+    def _deliver(self, session, topic, payload, qos):
+        if qos:
+            packet_id = session.next_packet_id()
+            session.inflight[packet_id] = (topic, payload)
+            session.writer.write(publish_packet(topic, payload, qos=1, packet_id=packet_id))
+        else:
+            session.writer.write(publish_packet(topic, payload))
+        self.messages_out += 1
+
+    def _route(self, topic, payload, retain=False, qos=0):
+        if retain:
+            if payload:
+                self._retained[topic] = payload
+            else:
+                self._retained.pop(topic, None)
+        for session in self._sessions.values():
+            granted = [sub_qos for topic_filter, sub_qos in session.subscriptions.items()
+                       if topic_matches(topic_filter, topic)]
+            if not granted:
+                continue
+            delivery_qos = min(qos, max(granted))
+            if session.writer is not None:
+                self._deliver(session, topic, payload, delivery_qos)
+            elif delivery_qos:
+                # Sessão persistente desconectada: guardar para a reconexão
+                if len(session.queued) >= self.max_queued:
+                    session.queued.popleft()
+                    self.messages_dropped += 1
+                session.queued.append((topic, payload))
+                self.messages_queued += 1
+
+    def _is_blocked(self, client_id):
+        now = time.monotonic()
+        return any(client_id.startswith(prefix) and until > now for prefix, until in self._blocked.items())
+
+    def _handle_connect(self, writer, body):
+        protocol_length = struct.unpack_from("!H", body)[0]
+        offset = 2 + protocol_length + 1  # nome do protocolo e nível
+        flags = body[offset]
+        offset += 3  # flags e keep alive
+
+        def read_string(position):
+            size = struct.unpack_from("!H", body, position)[0]
+            return body[position + 2:position + 2 + size], position + 2 + size
+
+        client_id, offset = read_string(offset)
+        client_id = client_id.decode()
+        if not client_id:
+            self._anonymous += 1
+            client_id = f"anonimo-{self._anonymous}"
+        if self._is_blocked(client_id):
+            writer.write(bytes([CONNACK << 4, 2, 0, CONNACK_UNAVAILABLE]))
+            return None
+
+        clean = bool(flags & 0x02)
+        session = self._sessions.get(client_id)
+        if session is not None and session.writer is not None:
+            # Mesmo client id conectado em outra conexão: a antiga é derrubada
+            session.writer.transport.abort()
+            self._end_connection(session)
+        present = session is not None and not clean
+        if not present:
+            session = _Session(client_id, clean)
+            self._sessions[client_id] = session
+        session.clean = clean
+        session.writer = writer
+        session.will = None
+        if flags & 0x04:
+            will_topic, offset = read_string(offset)
+            will_payload, offset = read_string(offset)
+            session.will = (will_topic.decode(), will_payload, bool(flags & 0x20))
+        writer.write(bytes([CONNACK << 4, 2, 1 if present else 0, 0]))
+        while session.queued:
+            self._deliver(session, *session.queued.popleft(), 1)
+        return session
+
+    def _end_connection(self, session):
+        session.writer = None
+        if session.clean:
+            self._sessions.pop(session.client_id, None)
+        else:
+            # Mensagens sem PUBACK voltam para a fila da sessão
+            session.queued.extendleft(reversed(list(session.inflight.values())))
+        session.inflight.clear()
+
+    def _handle_publish(self, session, flags, body):
+        topic_length = struct.unpack_from("!H", body)[0]
+        topic = body[2:2 + topic_length].decode()
+        offset = 2 + topic_length
+        qos = (flags >> 1) & 0x03
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            session.writer.write(bytes([PUBACK << 4, 2]) + packet_id)
+        self.messages_in += 1
+        self._route(topic, body[offset:], retain=bool(flags & 0x01), qos=min(qos, 1))
+
+    def _handle_subscribe(self, session, body):
+        packet_id = body[:2]
+        offset = 2
+        granted = bytearray()
+        new_filters = []
+        while offset < len(body):
+            size = struct.unpack_from("!H", body, offset)[0]
+            topic_filter = body[offset + 2:offset + 2 + size].decode()
+            qos = min(body[offset + 2 + size], 1)
+            offset += 3 + size  # filtro e QoS pedido
+            session.subscriptions[topic_filter] = qos
+            new_filters.append(topic_filter)
+            granted.append(qos)
+        payload = packet_id + bytes(granted)
+        session.writer.write(bytes([SUBACK << 4]) + encode_length(len(payload)) + payload)
+        for topic, retained in self._retained.items():
+            if any(topic_matches(topic_filter, topic) for topic_filter in new_filters):
+                session.writer.write(publish_packet(topic, retained, retain=True))
+
+    def _handle_unsubscribe(self, session, body):
+        packet_id = body[:2]
+        offset = 2
+        while offset < len(body):
+            size = struct.unpack_from("!H", body, offset)[0]
+            session.subscriptions.pop(body[offset + 2:offset + 2 + size].decode(), None)
+            offset += 2 + size
+        session.writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+
+    async def _serve(self, reader, writer):
+        session = None
+        clean = False
+        try:
+            header, body = await self._read_packet(reader)
+            if header >> 4 != CONNECT:
+                return
+            session = self._handle_connect(writer, body)
+            if session is None:
+                await writer.drain()
+                return
+            while True:
+                header, body = await self._read_packet(reader)
+                packet_type, flags = header >> 4, header & 0x0F
+                if session.writer is not writer:
+                    # Conexão substituída por outra com o mesmo client id
+                    return
+                if packet_type == PUBLISH:
+                    self._handle_publish(session, flags, body)
+                elif packet_type == PUBACK:
+                    session.inflight.pop(struct.unpack_from("!H", body)[0], None)
+                elif packet_type == SUBSCRIBE:
+                    self._handle_subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    self._handle_unsubscribe(session, body)
+                elif packet_type == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif packet_type == DISCONNECT:
+                    clean = True
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if session is not None and session.writer is writer:
+                will = session.will
+                self._end_connection(session)
+                if not clean and will is not None:
+                    self._route(*will)
+            writer.close()
+
+    def partition(self, seconds, client_prefix=""):
+        """Simula uma queda: derruba os clientes cujo client id começa com
+        `client_prefix` (todos, por padrão) e recusa suas conexões por `seconds` segundos."""
+        def apply():
+            self._blocked[client_prefix] = time.monotonic() + seconds
+            for session in list(self._sessions.values()):
+                if session.writer is not None and session.client_id.startswith(client_prefix):
+                    session.writer.transport.abort()
+
+        self._loop.call_soon_threadsafe(apply)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._shutdown())
+        self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        for session in list(self._sessions.values()):
+            if session.writer is not None:
+                session.writer.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def start(self):
+        """Inicia o broker; retorna a porta em uso (útil com port=0)."""
+        self._thread = threading.Thread(target=self._run, name="mini-broker", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    broker = MiniBroker(args.host, args.port)
+    port = broker.start()
+    logging.warning(f"Broker local escutando em {args.host}:{port}")
+    try:
+        broker._thread.join()
+    except KeyboardInterrupt:
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,57 +3,293 @@ import threading
 import time
 import os
 import signal
+import socket
 import sys
+import json
 import logging
+import argparse
+import urllib.request
 
-# Configuração de logs
-logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configuração de logs: os registros dos componentes chegam com o nome de cada um
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - [%(name)s] %(message)s')
+logger = logging.getLogger("main")
 
-def run_web_interface():
-    """Executa a interface web em um processo separado"""
-    print("Iniciando interface web...")
-    return subprocess.Popen(["python", "src/interface/app.py"],
-                          stdout=subprocess.PIPE,
-                          stderr=subprocess.STDOUT,
-                          text=True)
+# Porta da interface web (compartilhada pelos workers no modo com vários processos)
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 5000
 
-def log_output(process, name):
-    """Função para capturar e exibir a saída do processo"""
-    for line in process.stdout:
-        # Filtra mensagens de warning/error para exibir
-        if "WARNING" in line or "ERROR" in line or "Conectado" in line:
-            print(f"[{name}] {line.strip()}")
+# Endereços de verificação de saúde de cada componente
+DASHBOARD_HEALTH_URL = "http://127.0.0.1:5000/health"
+RECEIVER_HEALTH_URL = "http://127.0.0.1:9100/health"
+INGEST_HEALTH_URL = "http://127.0.0.1:9101/health"
+WORKER_HEALTH_PORT = 9110  # + número do worker
+
+# Verificações de saúde: intervalo, tempo limite de cada uma e falhas seguidas até reiniciar (segundos)
+HEALTH_INTERVAL = 2
+HEALTH_TIMEOUT = 1
+HEALTH_FAILURES = 3
+# Intervalo entre verificações enquanto o componente inicia (define a precisão do tempo de inicialização)
+STARTUP_PROBE_INTERVAL = 0.25
+# Tempo máximo para um componente ficar pronto após iniciar (segundos)
+STARTUP_TIMEOUT = 60
+# Espera antes de reiniciar: dobra a cada falha seguida, até o máximo; volta ao mínimo
+# depois de BACKOFF_RESET segundos pronto (segundos)
+RESTART_BACKOFF_MIN = 1
+RESTART_BACKOFF_MAX = 60
+BACKOFF_RESET = 60
+# Tempo para um componente encerrar antes de ser finalizado à força (segundos)
+STOP_TIMEOUT = 10
+# Intervalo do laço do supervisor (segundos)
+SUPERVISE_INTERVAL = 0.25
+
+# Variáveis de ambiente repassadas aos componentes
+BUS_AUTHKEY_ENV = "IOT_BUS_AUTHKEY"
+LOG_FORMAT_ENV = "IOT_LOG_FORMAT"
+RECORD_DIR_ENV = "IOT_RECORD_DIR"
+
+def forward_logs(stream, name, raw_level):
+    """Repassa ao logging do supervisor os registros de log (JSON, um por linha) de um componente"""
+    component_logger = logging.getLogger(name)
+    for line in stream:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            level = logging.getLevelName(data["level"])
+            if not component_logger.isEnabledFor(level):
+                continue
+            record = component_logger.makeRecord(name, level, "", 0, data["message"], None, None)
+            record.created = data["ts"]
+            record.msecs = (data["ts"] % 1) * 1000
+            if "exc" in data:
+                record.exc_text = data["exc"]
+        except (ValueError, KeyError, TypeError):
+            # Linha fora do formato JSON (print, traceback não tratado)
+            if not component_logger.isEnabledFor(raw_level):
+                continue
+            record = component_logger.makeRecord(name, raw_level, "", 0, line, None, None)
+        component_logger.handle(record)
+
+def create_listen_socket(host, port):
+    """Cria o socket de escuta herdado por todos os workers web"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+class Component:
+    """Processo gerenciado pelo supervisor: início, verificação de saúde e reinício com espera exponencial"""
+
+    def __init__(self, name, command, health_url, env, **popen_args):
+        self.name = name
+        self.command = command
+        self.health_url = health_url
+        self.env = env
+        self.popen_args = popen_args
+        self.process = None
+        self.state = "parado"
+        self.failed_checks = []
+        self.started_at = None
+        self.ready_at = None
+        self.startup_time = None  # Segundos até a primeira verificação de saúde bem-sucedida
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_MIN
+        self.restart_at = None
+        self.failures = 0
+        self.next_probe = 0.0
+
+    def start(self):
+        if os.name != "nt":
+            # Grupo de processos próprio: o Ctrl+C do terminal chega apenas ao supervisor
+            self.popen_args.setdefault("start_new_session", True)
+        self.process = subprocess.Popen([sys.executable] + self.command,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        text=True,
+                                        bufsize=1,
+                                        env=self.env,
+                                        **self.popen_args)
+        threading.Thread(target=forward_logs, args=(self.process.stdout, self.name, logging.INFO),
+                         daemon=True).start()
+        threading.Thread(target=forward_logs, args=(self.process.stderr, self.name, logging.ERROR),
+                         daemon=True).start()
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.restart_at = None
+        self.failures = 0
+        self.next_probe = self.started_at
+        self.state = "iniciando"
+
+    def probe(self):
+        """Consulta /health; retorna os dados da resposta ou None se o componente não respondeu"""
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=HEALTH_TIMEOUT) as response:
+                return json.loads(response.read())
+        except (OSError, ValueError):
+            return None
+
+    def set_state(self, state, failed_checks=()):
+        failed_checks = list(failed_checks)
+        if state == self.state and failed_checks == self.failed_checks:
+            return
+        if state == "degradado":
+            logger.warning(f"{self.name} degradado: falha em {', '.join(failed_checks)}")
+        elif state == "pronto" and self.state in ("degradado", "sem resposta"):
+            logger.warning(f"{self.name} recuperado")
+        self.state = state
+        self.failed_checks = failed_checks
+
+    def check(self, now):
+        """Executado periodicamente pelo supervisor"""
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is not None:
+            self.schedule_restart(now, f"processo terminou (código {code})")
+            return
+        if now < self.next_probe:
+            return
+        self.next_probe = now + (HEALTH_INTERVAL if self.ready_at is not None else STARTUP_PROBE_INTERVAL)
+        data = self.probe()
+        if data is None:
+            if self.ready_at is None:
+                if now - self.started_at > STARTUP_TIMEOUT:
+                    self.schedule_restart(now, f"não ficou pronto em {STARTUP_TIMEOUT}s")
+                return
+            self.failures += 1
+            if self.failures >= HEALTH_FAILURES:
+                self.schedule_restart(now, f"sem resposta em {self.failures} verificações seguidas")
+            else:
+                self.set_state("sem resposta")
+            return
+        self.failures = 0
+        if self.ready_at is None:
+            self.ready_at = now
+            self.startup_time = now - self.started_at
+            restart = f" (reinício {self.restarts})" if self.restarts else ""
+            logger.warning(f"{self.name} pronto em {self.startup_time:.2f}s{restart}")
+        elif now - self.ready_at >= BACKOFF_RESET:
+            self.backoff = RESTART_BACKOFF_MIN
+        failed = sorted(name for name, ok in data.get("checks", {}).items() if not ok)
+        self.set_state("degradado" if failed else "pronto", failed)
+
+    def schedule_restart(self, now, reason):
+        logger.error(f"{self.name}: {reason}; reiniciando em {self.backoff}s")
+        self.stop()
+        self.restart_at = now + self.backoff
+        self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        self.restarts += 1
+        self.state = "aguardando reinício"
+
+    def signal_stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        if os.name == "nt":
+            self.process.terminate()
+        else:
+            # SIGINT: os componentes tratam KeyboardInterrupt e gravam os dados pendentes
+            self.process.send_signal(signal.SIGINT)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        self.signal_stop()
+        self.wait(timeout)
+
+    def wait(self, timeout):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.error(f"{self.name} não encerrou em {timeout}s; finalizando")
+            self.process.kill()
+            self.process.wait()
+
+def build_components(workers, receiver, record_dir=None):
+    """Monta a lista de componentes; no modo com workers, também o socket de escuta compartilhado"""
+    env = dict(os.environ)
+    env[LOG_FORMAT_ENV] = "json"
+    if record_dir:
+        # Cada componente que recebe MQTT grava o seu tráfego em <record_dir>/<componente>-<data>.iotrec
+        env[RECORD_DIR_ENV] = os.path.abspath(record_dir)
+    components = []
+    listen_socket = None
+    if receiver:
+        components.append(Component("receiver", ["src/mqtt-connection.py"], RECEIVER_HEALTH_URL, env))
+    if workers > 0:
+        # Ingestão em um processo e HTTP/WebSocket em N workers
+        env[BUS_AUTHKEY_ENV] = os.urandom(16).hex()
+        listen_socket = create_listen_socket(WEB_HOST, WEB_PORT)
+        fd = listen_socket.fileno()
+        components.append(Component("ingest", ["src/interface/cluster.py", "ingest"], INGEST_HEALTH_URL, env))
+        for worker in range(1, workers + 1):
+            components.append(Component(f"web-{worker}",
+                                        ["src/interface/cluster.py", "web", "--fd", str(fd), "--worker", str(worker)],
+                                        f"http://127.0.0.1:{WORKER_HEALTH_PORT + worker}/health", env,
+                                        pass_fds=(fd,)))
+    else:
+        components.append(Component("dashboard", ["src/interface/app.py"], DASHBOARD_HEALTH_URL, env))
+    return components, listen_socket
+
+def print_banner(components):
+    """Mensagem para o usuário, com o tempo de inicialização de cada componente"""
+    print("\n" + "="*60)
+    print("   Sistema de Monitoramento IoT iniciado com sucesso!")
+    print("   Interface web disponível em: http://localhost:5000")
+    print("   Recebendo dados dos sensores via MQTT")
+    for component in components:
+        print(f"   {component.name:<12} pronto em {component.startup_time:.2f}s")
+    print("   Pressione Ctrl+C para encerrar o sistema")
+    print("="*60 + "\n")
 
 def main():
-    """Função principal que inicia todos os componentes"""
+    """Função principal que inicia e supervisiona todos os componentes"""
+    parser = argparse.ArgumentParser(description="Sistema de Monitoramento IoT")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="número de workers web; 0 executa a interface em um único processo (padrão)")
+    parser.add_argument("--no-receiver", action="store_true",
+                        help="não iniciar o receptor MQTT (src/mqtt-connection.py)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="gravar o tráfego MQTT recebido em DIR para reprodução (src/interface/traffic.py)")
+    args = parser.parse_args()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    # Tratar o Ctrl+C mesmo se herdado como ignorado (ex.: em segundo plano); assim os
+    # componentes também o recebem com o comportamento padrão e podem encerrar limpos
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    components, listen_socket = build_components(args.workers, not args.no_receiver, args.record)
     try:
-        # Iniciar interface web
-        web_process = run_web_interface()
-        # Thread para capturar a saída do processo da interface web
-        web_log_thread = threading.Thread(target=log_output, args=(web_process, "WEB"), daemon=True)
-        web_log_thread.start()
-        
-        # Mensagem para o usuário
-        print("\n" + "="*60)
-        print("   Sistema de Monitoramento IoT iniciado com sucesso!")
-        print("   Interface web disponível em: http://localhost:5000")
-        print("   Recebendo dados dos sensores via MQTT")
-        print("   Pressione Ctrl+C para encerrar o sistema")
-        print("="*60 + "\n")
-        
-        # Esperar até que o usuário interrompa com Ctrl+C
-        while True:
-            time.sleep(1)
-            
+        for component in components:
+            print(f"Iniciando {component.name}...")
+            component.start()
+
+        announced = False
+        while not stopping.wait(SUPERVISE_INTERVAL):
+            now = time.monotonic()
+            for component in components:
+                component.check(now)
+            if not announced and all(component.ready_at is not None for component in components):
+                print_banner(components)
+                announced = True
+
     except KeyboardInterrupt:
-        print("\nEncerrando aplicação...")
+        pass
     finally:
-        # Encerrar processos ao sair
-        if 'web_process' in locals():
-            print("Encerrando interface web...")
-            web_process.terminate()
-            web_process.wait(timeout=5)
-        
+        print("\nEncerrando aplicação...")
+        # Sinalizar todos antes de esperar, para que encerrem em paralelo
+        for component in components:
+            component.signal_stop()
+        for component in components:
+            component.wait(STOP_TIMEOUT)
+        if listen_socket is not None:
+            listen_socket.close()
+
         print("\nSistema encerrado.")
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import collections
+import heapq
+import json
+import logging
+import string
+import threading
+
+# Gravidade dos níveis de alerta (o mais grave prevalece entre regras do mesmo tipo)
+LEVELS = {"info": 0, "warning": 1, "danger": 2}
+
+# Tempo padrão (segundos) que um alerta permanece ativo após a última amostra que o disparou
+DEFAULT_HOLD = 60.0
+
+
+class Rule:
+    """Regra base: compara o campo `field` de uma série com um limite."""
+
+    # Campos disponíveis para a mensagem (contexto retornado por `update`)
+    CONTEXT_FIELDS = ("value", "threshold")
+
+    def __init__(self, definition):
+        try:
+            self.name = definition["name"]
+            self.sensor = definition["sensor"]
+            self.type = definition["type"]
+            self.message = definition["message"]
+        except KeyError as e:
+            raise ValueError(f"Regra de alerta sem o campo obrigatório {e}")
+        self.level = definition.get("level", "warning")
+        if self.level not in LEVELS:
+            raise ValueError(f"Nível desconhecido na regra {self.name}: {self.level}")
+        self.field = definition.get("field", "value")
+        self.hold = float(definition.get("hold", DEFAULT_HOLD))
+        if ("above" in definition) == ("below" in definition):
+            raise ValueError(f"A regra {self.name} precisa de exatamente um limite ('above' ou 'below')")
+        self.above = "above" in definition
+        self.threshold = float(definition["above"] if self.above else definition["below"])
+        self._check_message()
+
+    def _check_message(self):
+        # Campos da mensagem que a regra não fornece falhariam só quando o alerta disparasse
+        try:
+            names = [name for _, name, _, _ in string.Formatter().parse(self.message) if name is not None]
+        except ValueError as e:
+            raise ValueError(f"Mensagem inválida na regra {self.name}: {str(e)}")
+        for name in names:
+            field = name.split(".")[0].split("[")[0]
+            if field not in self.CONTEXT_FIELDS:
+                raise ValueError(f"A mensagem da regra {self.name} usa o campo desconhecido '{name}' "
+                                 f"(disponíveis: {', '.join(self.CONTEXT_FIELDS)})")
+
+    def format_message(self, context):
+        """Mensagem do alerta; se a formatação falhar (ex.: especificador inválido), o texto da regra."""
+        try:
+            return self.message.format(**context)
+        except (KeyError, IndexError, AttributeError, TypeError, ValueError) as e:
+            logging.error(f"Erro ao formatar a mensagem da regra {self.name}: {str(e)}")
+            return self.message
+
+    def breached(self, value, margin=0.0):
+        """Indica se o valor ultrapassa o limite (deslocado de `margin` em direção ao normal)."""
+        if self.above:
+            return value > self.threshold - margin
+        return value < self.threshold + margin
+
+    def new_state(self):
+        return {"active": False}
+
+    def update(self, state, timestamp, value):
+        """Atualiza o estado com a amostra; retorna o contexto da mensagem se a regra está ativa."""
+        raise NotImplementedError
+
+
+class ThresholdRule(Rule):
+    """Limite com histerese: dispara ao ultrapassar o limite e só volta ao
+    normal quando o valor recua `hysteresis` unidades além dele."""
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.hysteresis = float(definition.get("hysteresis", 0.0))
+
+    def update(self, state, timestamp, value):
+        if state["active"]:
+            state["active"] = self.breached(value, self.hysteresis)
+        else:
+            state["active"] = self.breached(value)
+        return {"value": value, "threshold": self.threshold} if state["active"] else None
+
+
+class RateRule(Rule):
+    """Taxa de variação (unidades por segundo) medida entre amostras separadas
+    por pelo menos `interval` segundos."""
+
+    CONTEXT_FIELDS = ("value", "rate", "threshold")
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.interval = float(definition.get("interval", 10.0))
+
+    def new_state(self):
+        return {"active": False, "ref_time": None, "ref_value": None, "rate": 0.0}
+
+    def update(self, state, timestamp, value):
+        if state["ref_time"] is None:
+            state["ref_time"], state["ref_value"] = timestamp, value
+        elif timestamp - state["ref_time"] >= self.interval:
+            state["rate"] = (value - state["ref_value"]) / (timestamp - state["ref_time"])
+            state["active"] = self.breached(state["rate"])
+            state["ref_time"], state["ref_value"] = timestamp, value
+        if not state["active"]:
+            return None
+        return {"value": value, "rate": state["rate"], "threshold": self.threshold}
+
+
+class WindowRule(Rule):
+    """Dispara quando pelo menos `count` das últimas `samples` amostras ultrapassam o limite."""
+
+    CONTEXT_FIELDS = ("value", "threshold", "count", "samples")
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.samples = int(definition.get("samples", 10))
+        self.count = int(definition.get("count", self.samples))
+        if not 0 < self.count <= self.samples:
+            raise ValueError(f"Na regra {self.name}, 'count' deve estar entre 1 e 'samples'")
+
+    def new_state(self):
+        return {"active": False, "window": collections.deque(maxlen=self.samples), "hits": 0}
+
+    def update(self, state, timestamp, value):
+        window = state["window"]
+        if len(window) == self.samples:
+            state["hits"] -= window[0]
+        hit = self.breached(value)
+        window.append(hit)
+        state["hits"] += hit
+        state["active"] = state["hits"] >= self.count
+        if not state["active"]:
+            return None
+        return {"value": value, "threshold": self.threshold, "count": state["hits"], "samples": self.samples}
+
+
+RULE_KINDS = {"threshold": ThresholdRule, "rate": RateRule, "window": WindowRule}
+
+
+# Função para carregar as regras de alerta de um arquivo JSON
+def load_rules(path):
+    """Lê `{"rules": [...]}` e retorna a lista de regras instanciadas."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    rules = []
+    for definition in config.get("rules", []):
+        kind = definition.get("kind", "threshold")
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Tipo de regra desconhecido: {kind}")
+        rules.append(RULE_KINDS[kind](definition))
+    return rules
+
+
+class Alert:
+    """Alerta ativo de um dispositivo (um por tipo)."""
+
+    __slots__ = ("device", "type", "message", "level", "timestamp")
+
+    def __init__(self, device, alert_type, message, level, timestamp):
+        self.device = device
+        self.type = alert_type
+        self.message = message
+        self.level = level
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        return {"device": self.device, "type": self.type, "message": self.message,
+                "level": self.level, "timestamp": self.timestamp}
+
+
+class AlertEngine:
+    """Avalia as regras de alerta de forma incremental.
+
+    Só as regras da série que recebeu a amostra são avaliadas, cada uma em
+    O(1) sobre o seu estado por dispositivo. Os alertas ativos ficam em
+    `device.alerts` (indexado pelo tipo, ou seja, por (dispositivo, tipo)) e
+    expiram `hold` segundos após a última amostra que os disparou, controlados
+    por um heap de expiração. `expire()` só aponta os vencidos; a remoção é
+    feita por `prune()` no worker dono do dispositivo, o único que altera
+    `device.alerts`.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._by_sensor = collections.defaultdict(list)
+        for rule in rules:
+            self._by_sensor[rule.sensor].append(rule)
+        self._states = {}
+        self._expires = {}  # (dispositivo, tipo) -> instante de expiração
+        self._heap = []     # (instante de expiração, dispositivo, tipo, estado do dispositivo)
+        self._lock = threading.Lock()
+
+    def fields(self, sensor):
+        """Campos usados pelas regras de `sensor`."""
+        return {rule.field for rule in self._by_sensor.get(sensor, ())}
+
+    def evaluate(self, device, sensor, timestamp, values):
+        """Avalia as regras de `sensor` para a amostra `values` ({campo: valor}).
+
+        Retorna True se a lista de alertas do dispositivo mudou.
+        """
+        rules = self._by_sensor.get(sensor)
+        if not rules:
+            return False
+        # Regra ativa mais grave de cada tipo de alerta
+        triggered = {}
+        for rule in rules:
+            value = values.get(rule.field)
+            if value is None:
+                continue
+            key = (device.device_id, rule.name)
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = rule.new_state()
+            context = rule.update(state, timestamp, value)
+            if context is None:
+                continue
+            current = triggered.get(rule.type)
+            if current is None or LEVELS[rule.level] > LEVELS[current[0].level]:
+                triggered[rule.type] = (rule, context)
+
+        changed = False
+        with self._lock:
+            for alert_type, (rule, context) in triggered.items():
+                changed |= self._raise(device, alert_type, rule, rule.format_message(context), timestamp)
+        return changed
+
+    def _raise(self, device, alert_type, rule, message, timestamp):
+        key = (device.device_id, alert_type)
+        expires_at = timestamp + rule.hold
+        alert = device.alerts.get(alert_type)
+        if alert is not None:
+            # Alerta existente: só renovar a expiração (o heap é reajustado ao expirar)
+            self._expires[key] = max(self._expires.get(key, expires_at), expires_at)
+            alert.timestamp = timestamp
+            if alert.message == message and alert.level == rule.level:
+                return False
+            alert.message = message
+            alert.level = rule.level
+            return True
+        device.alerts[alert_type] = Alert(device.device_id, alert_type, message, rule.level, timestamp)
+        self._expires[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, device.device_id, alert_type, device))
+        logging.warning(f"Novo alerta gerado para {device.device_id}: {message} (nível: {rule.level})")
+        return True
+
+    def expire(self, now):
+        """Retira do heap os alertas vencidos; retorna [(dispositivo, tipos)] para `prune()`."""
+        due = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, device_id, alert_type, device = heapq.heappop(self._heap)
+                key = (device_id, alert_type)
+                expires_at = self._expires.get(key)
+                if expires_at is None:
+                    continue
+                if expires_at > now:
+                    # Renovado desde que entrou no heap
+                    heapq.heappush(self._heap, (expires_at, device_id, alert_type, device))
+                    continue
+                due.setdefault(device_id, (device, []))[1].append(alert_type)
+        return list(due.values())
+
+    def prune(self, device, alert_types, now):
+        """Remove os alertas vencidos de `device`; retorna True se a lista mudou.
+
+        Um alerta renovado depois de `expire()` volta para o heap.
+        """
+        changed = False
+        with self._lock:
+            for alert_type in alert_types:
+                key = (device.device_id, alert_type)
+                expires_at = self._expires.get(key)
+                if expires_at is None:
+                    continue
+                if expires_at > now:
+                    heapq.heappush(self._heap, (expires_at, device.device_id, alert_type, device))
+                    continue
+                del self._expires[key]
+                device.alerts.pop(alert_type, None)
+                changed = True
+        return changed
+
+    def active_count(self):
+        return len(self._expires)
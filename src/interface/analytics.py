@@ -0,0 +1,115 @@
+import numpy as np
+
+# Faixas padrão do espectro, como frações da frequência de Nyquist
+# (a taxa de amostragem depende do intervalo de publicação do firmware)
+DEFAULT_BANDS = {
+    "baixa": (0.0, 0.25),
+    "media": (0.25, 0.5),
+    "alta": (0.5, 1.0),
+}
+
+
+class VibrationAnalytics:
+    """Métricas de vibração sobre uma janela deslizante das últimas `window` amostras.
+
+    As amostras ficam em um buffer circular NumPy de tamanho fixo, então cada
+    cálculo é O(window) vetorizado, sem copiar o histórico. RMS, pico a pico e
+    fator de crista são calculados sobre a componente alternada (sem a média,
+    que no MPU6050 inclui a gravidade). O espectro (FFT) é recalculado a cada
+    `hop` amostras novas.
+    """
+
+    def __init__(self, window=256, hop=32, bands=None):
+        self.window = window
+        self.hop = hop
+        self.bands = dict(bands or DEFAULT_BANDS)
+        self._times = np.zeros(window, dtype=np.float64)
+        self._values = np.zeros(window, dtype=np.float64)
+        self._head = 0  # Posição da próxima escrita
+        self._size = 0
+        self._since_spectrum = 0
+        self._metrics = None
+        self._spectrum = None
+
+    def __len__(self):
+        return self._size
+
+    def add(self, timestamp, value):
+        self._times[self._head] = timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.window
+        if self._size < self.window:
+            self._size += 1
+        self._metrics = None
+        self._since_spectrum += 1
+        if self._since_spectrum >= self.hop:
+            self._spectrum = None
+
+    def _ordered(self):
+        """Janela em ordem cronológica (cópia do tamanho da janela)."""
+        if self._size < self.window:
+            return self._times[:self._size], self._values[:self._size]
+        return np.roll(self._times, -self._head), np.roll(self._values, -self._head)
+
+    def sample_rate(self):
+        """Taxa de amostragem estimada pela duração da janela (Hz), ou None."""
+        if self._size < 2:
+            return None
+        times = self._times[:self._size]
+        span = times.max() - times.min()
+        return (self._size - 1) / span if span > 0 else None
+
+    def metrics(self):
+        """Retorna {rms, peak_to_peak, crest_factor, mean, samples, sample_rate, bandas...}."""
+        if self._metrics is not None:
+            return self._metrics
+        if self._size == 0:
+            return {"samples": 0}
+        values = self._values[:self._size]
+        mean = values.mean()
+        ac = values - mean
+        rms = float(np.sqrt(np.mean(ac * ac)))
+        peak = float(np.abs(ac).max())
+        metrics = {
+            "samples": self._size,
+            "sample_rate": self.sample_rate(),
+            "mean": float(mean),
+            "rms": rms,
+            "peak_to_peak": float(values.max() - values.min()),
+            "crest_factor": peak / rms if rms > 0 else None,
+        }
+        for name, energy in self.spectrum()["bands"].items():
+            metrics[f"band_{name}"] = energy
+        self._metrics = metrics
+        return metrics
+
+    def spectrum(self):
+        """Espectro de amplitude da janela e energia por faixa.
+
+        Retorna {"frequencies", "amplitudes", "bands": {nome: energia}}, com
+        frequências e amplitudes em arrays NumPy; as frequências estão em Hz se
+        a taxa de amostragem for conhecida, senão em ciclos por amostra.
+        """
+        if self._spectrum is not None:
+            return self._spectrum
+        if self._size < 4:
+            return {"frequencies": np.zeros(0), "amplitudes": np.zeros(0),
+                    "bands": {name: 0.0 for name in self.bands}}
+        self._since_spectrum = 0
+        _, values = self._ordered()
+        ac = values - values.mean()
+        # Janela de Hann para reduzir o vazamento espectral
+        fft = np.fft.rfft(ac * np.hanning(len(ac)))
+        power = (fft.real ** 2 + fft.imag ** 2) / len(ac)
+        fractions = np.fft.rfftfreq(len(ac)) * 2.0  # Fração da frequência de Nyquist
+        bands = {}
+        for name, (low, high) in self.bands.items():
+            mask = (fractions >= low) & ((fractions < high) if high < 1.0 else (fractions <= high))
+            bands[name] = float(power[mask].sum())
+        rate = self.sample_rate()
+        self._spectrum = {
+            "frequencies": fractions * (rate / 2.0 if rate else 0.5),
+            "amplitudes": np.abs(fft) * 2.0 / len(ac),
+            "bands": bands,
+        }
+        return self._spectrum
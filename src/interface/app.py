@@ -6,386 +6,670 @@ import threading
 import time
 import random
 import logging
-from flask_socketio import SocketIO
-import math
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import os
+from delta import DeltaBuilder
+from devices import DeviceRegistry
+from broadcast import BroadcastScheduler
+from storage import HistoryStore
+from downsample import RangeReducer, downsample_indices
+from decoder import decode_object
+from ingest import IngestQueue
+from alerts import AlertEngine, load_rules
+from metrics import Registry
+from logs import configure_logging
+from pipeline import ALERT_RULES_FILE, ANALYTICS_WINDOW, IngestPipeline, make_point
+from mqtt_session import MqttSession, Spool, stable_client_id
+from commands import CommandTracker, CommandError, public_record
+from snapshots import CachedBody, SnapshotCache
+from deadlines import DeadlineTracker
+from rooms import RoomFanout, parse_subscription, decimate_points
+from export import EXPORT_FORMATS, ExportStream, export_rows, format_chunks, parquet_available
+from traffic import recorder_from_env
 
 # Configuração de logs - reduzindo nível para WARNING para remover mensagens de debug
-logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging(logging.WARNING)
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Dados em memória
-sensor_data = {
-    "vibration": [],
-    "temperature": [],
-    "humidity": [],
-    "status": "desconhecido",
-    "last_update": None,
-    "last_data_received": 0,  # Timestamp da última recepção de dados
-    "alerts": []  # Lista para armazenar alertas ativos
+# Limite de pontos nos gráficos
+MAX_DATA_POINTS = 60
+# Capacidade do histórico em memória por série (pontos)
+HISTORY_CAPACITY = {
+    "vibration": 6 * 60 * 60 * 10,   # 6 horas a 10 Hz
+    "temperature": 7 * 24 * 60 * 6,  # 7 dias a uma leitura a cada 10 s
+    "humidity": 7 * 24 * 60 * 6,
+}
+
+# Compressão do histórico em memória: blocos fechados de HISTORY_BLOCK_SIZE pontos guardados com
+# timestamps em delta-of-delta e valores em XOR (como no Gorilla), com poucos bytes por amostra em vez
+# de 16-24; ativa, permite aumentar HISTORY_CAPACITY para dias de dados com pouca memória
+HISTORY_COMPRESSION = False
+HISTORY_BLOCK_SIZE = 1024
+
+# Camadas de agregação mantidas em memória: nome -> (largura do balde em segundos, capacidade em baldes)
+ROLLUP_TIERS = {
+    "1s": (1, 6 * 60 * 60),        # 6 horas
+    "10s": (10, 7 * 24 * 60 * 6),  # 7 dias
+    "1m": (60, 30 * 24 * 60),      # 30 dias
 }
+# Número padrão de pontos das consultas reduzidas (parâmetro 'points')
+DEFAULT_DOWNSAMPLE_POINTS = 500
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+# Histórico persistente em disco (segmentos SQLite diários)
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "history")
+HISTORY_RETENTION_DAYS = 30
+# Intervalo padrão de /api/history quando 'from' não é informado (segundos)
+HISTORY_DEFAULT_RANGE = 3600
+# Máximo de pontos brutos por resposta de /api/history (sem 'points')
+HISTORY_MAX_ROWS = 100000
+history_store = HistoryStore(HISTORY_DIR, retention_days=HISTORY_RETENTION_DAYS)
+
+# Número máximo de dispositivos acompanhados (protege a memória contra tópicos inesperados)
+MAX_DEVICES = 1000
+
+# Dados em memória, um estado por dispositivo
+registry = DeviceRegistry(HISTORY_CAPACITY, ROLLUP_TIERS, max_devices=MAX_DEVICES,
+                          analytics_window=ANALYTICS_WINDOW,
+                          block_size=HISTORY_BLOCK_SIZE if HISTORY_COMPRESSION else None)
+
+# Deltas guardados para as consultas '/api/data?since=<seq>' (a 10 quadros/s, cerca de 1 minuto)
+DELTA_HISTORY = 600
+
+# Mudanças pendentes para o protocolo incremental (eventos 'data_delta')
+delta_builder = DeltaBuilder(history=DELTA_HISTORY)
+
+# Snapshots serializados (e comprimidos acima de SNAPSHOT_COMPRESS_MIN_SIZE bytes) reutilizados
+# entre requisições até a próxima mudança
+SNAPSHOT_CACHE_ENTRIES = 64
+SNAPSHOT_COMPRESS_MIN_SIZE = 1024
+snapshot_cache = SnapshotCache(max_entries=SNAPSHOT_CACHE_ENTRIES, compress_min_size=SNAPSHOT_COMPRESS_MIN_SIZE)
+
+# Salas de assinatura do dashboard: cada quadro é filtrado e serializado uma vez por sala
+room_fanout = RoomFanout()
+
+# Métricas expostas em /metrics (formato texto do Prometheus)
+metrics = Registry()
+METRIC_MESSAGES = metrics.counter("iot_mqtt_messages_total", "Mensagens MQTT recebidas", ("sensor",))
+METRIC_EXPORT_ROWS = metrics.counter("iot_export_rows_total", "Linhas enviadas pelas exportações do histórico", ("format",))
+METRIC_EMIT_SECONDS = metrics.histogram("iot_socketio_emit_seconds", "Tempo de envio de um quadro Socket.IO")
+METRIC_WS_CLIENTS = metrics.gauge("iot_websocket_clients", "Clientes WebSocket conectados")
+METRIC_MQTT_CONNECTS = metrics.counter("iot_mqtt_connects_total", "Conexões (e reconexões) ao broker MQTT")
+METRIC_MQTT_DISCONNECTS = metrics.counter("iot_mqtt_disconnects_total", "Desconexões do broker MQTT", ("reason",))
+metrics.gauge("iot_devices", "Dispositivos registrados", function=lambda: len(registry))
+metrics.gauge("iot_websocket_rooms", "Salas de assinatura com clientes", function=lambda: room_fanout.stats()["rooms"])
+metrics.counter("iot_room_frames_total", "Quadros enviados às salas de assinatura", function=lambda: room_fanout.frames)
+
+# Gravação do tráfego MQTT recebido, para reprodução posterior (traffic.py); ativada pela
+# variável IOT_RECORD_DIR (main.py --record DIR)
+traffic_recorder = recorder_from_env("dashboard")
+if traffic_recorder is not None:
+    metrics.counter("iot_traffic_recorded_total", "Mensagens gravadas pelo gravador de tráfego",
+                    function=lambda: traffic_recorder.recorded)
+    metrics.counter("iot_traffic_dropped_total", "Mensagens descartadas pelo gravador de tráfego",
+                    function=lambda: traffic_recorder.dropped)
 
 # Configuração do Broker MQTT
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
-CLIENT_ID = f"python-mqtt-dashboard-{random.randint(0, 1000)}"
+# Identificador estável e sessão persistente: o broker guarda as mensagens QoS 1 enquanto a interface está fora
+CLIENT_ID = stable_client_id("python-mqtt-dashboard")
+MQTT_QOS = 1
+MQTT_CLEAN_SESSION = False
+# Publicações feitas sem conexão ficam em disco até a reconexão
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "spool")
 
-# Tópicos
-TOPIC_VIBRATION = "sensorGS2025FIAPLEOOO_XYZ_0987654321/vibration"
-TOPIC_TEMPERATURE = "sensorGS2025FIAPLEOOO_XYZ_0987654321/temperature" 
-TOPIC_HUMIDITY = "sensorGS2025FIAPLEOOO_XYZ_0987654321/humidity"
-TOPIC_STATUS = "sensorGS2025FIAPLEOOO_XYZ_0987654321/status"
+# Tópicos: o primeiro nível identifica o dispositivo ('+' assina todos)
+DEVICE_WILDCARD = "+"
+TOPIC_VIBRATION = f"{DEVICE_WILDCARD}/vibration"
+TOPIC_TEMPERATURE = f"{DEVICE_WILDCARD}/temperature"
+TOPIC_HUMIDITY = f"{DEVICE_WILDCARD}/humidity"
+TOPIC_STATUS = f"{DEVICE_WILDCARD}/status"
+# Comandos são publicados em <dispositivo>/commands e respondidos em <dispositivo>/responses, com o mesmo 'id'
+TOPIC_COMMAND_RESPONSES = f"{DEVICE_WILDCARD}/responses"
 
-# Limite de pontos nos gráficos
-MAX_DATA_POINTS = 60
-# Tempo máximo sem dados para considerar offline (segundos)
-OFFLINE_THRESHOLD = 15
-
-# Limites para alertas
-TEMPERATURE_MAX = 50.0  # Temperatura máxima em °C
-HUMIDITY_MAX = 85.0     # Umidade máxima em %
-VIBRATION_THRESHOLD = 4.0  # Valor de magnitude considerado alto (antes do remapeamento)
-
-# Valor máximo de magnitude do sensor (para remapeamento)
-VIBRATION_MAX_SENSOR = 3.464102
-VIBRATION_MAX_SCALE = 9.0  # Escala máxima desejada
-
-# Função para adicionar dados ao histórico com verificação de duplicatas
-def add_data_to_history(sensor_type, value, time_str):
-    # Verificar se temos uma lista válida para este tipo de sensor
-    if sensor_type not in sensor_data or not isinstance(sensor_data[sensor_type], list):
-        logging.error(f"Tipo de sensor inválido ou lista não inicializada: {sensor_type}")
-        return
+# Dispositivo usado quando uma requisição não informa o ID
+DEFAULT_DEVICE = "sensorGS2025FIAPLEOOO_XYZ_0987654321"
+
+# Fila entre o cliente MQTT e o processamento: capacidade (mensagens), workers e
+# política quando cheia ('drop-oldest', 'block' ou 'sample')
+INGEST_QUEUE_SIZE = 10000
+INGEST_WORKERS = 2
+INGEST_OVERFLOW_POLICY = "drop-oldest"
+
+# Taxa máxima de quadros enviados ao dashboard (por segundo) e atraso máximo de uma mudança (segundos)
+BROADCAST_FRAME_RATE = 10.0
+BROADCAST_MAX_LATENCY = 0.2
+# Transportes Socket.IO oferecidos ao navegador (o modo com vários workers usa apenas websocket)
+SOCKET_TRANSPORTS = ["polling", "websocket"]
+# Espera máxima entre verificações de dispositivos offline (segundos); a verificação também roda
+# assim que vence o prazo de um dispositivo. Não deve passar de OFFLINE_THRESHOLD (pipeline.py):
+# um prazo novo nunca vence antes da próxima verificação
+OFFLINE_CHECK_INTERVAL = 5
+
+# Comandos: prazo padrão para a resposta, máximo de pendentes, espera máxima de 'wait'
+# nas requisições REST e intervalo da verificação de prazos (segundos)
+COMMAND_TIMEOUT = 10
+MAX_PENDING_COMMANDS = 1000
+COMMAND_MAX_WAIT = 30
+COMMAND_CHECK_INTERVAL = 0.5
+# Limites do histograma de ida e volta dos comandos (segundos)
+COMMAND_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Regras de alerta (limites com histerese, taxa de variação e janelas N de M, em ALERT_RULES_FILE)
+alert_engine = AlertEngine(load_rules(ALERT_RULES_FILE))
+
+# Instante em que cada dispositivo fica offline se nada mais chegar (renovado a cada mensagem)
+device_deadlines = DeadlineTracker()
+
+# Caminho de ingestão (pipeline.py) sobre o estado do dashboard. A fila de ingestão e o agendador
+# de quadros são lidos a cada uso, pois cluster.py e server_async.py os substituem
+pipeline = IngestPipeline(registry, delta_builder, history_store, alert_engine, device_deadlines, metrics,
+                          submit=lambda key, function, *args: ingest_queue.submit(key, function, *args),
+                          notify=lambda: broadcast_scheduler.notify())
+handle_message = pipeline.handle_message
+get_device = pipeline.get_device
+check_offline_devices = pipeline.check_offline_devices
+
+# Função para converter arrays (timestamps + colunas) na lista de pontos usada pelo dashboard
+def arrays_to_points(times, columns):
+    fields = tuple(columns)
+    value_lists = [columns[name].tolist() for name in fields]
+    return [make_point(fields, timestamp, values)
+            for timestamp, values in zip(times.tolist(), zip(*value_lists))]
+
+# Função para converter um buffer de histórico na lista de pontos usada pelo dashboard
+def history_to_points(history, limit=MAX_DATA_POINTS):
+    return arrays_to_points(*history.tail(limit))
+
+# Função para reduzir uma série do intervalo pedido a no máximo `points` pontos
+def select_series(device, sensor_type, start_time, end_time, points, method="lttb", require_coverage=False):
+    # Retorna (timestamps, colunas, resolução) ou None se a memória não cobre o intervalo
+    history = device.history[sensor_type]
+    first = history.first()
+    raw_covers = first is not None and (first[0] <= start_time or not (require_coverage or history.is_full()))
+    if raw_covers:
+        times, columns = history.range(start_time, end_time)
+        if len(times) <= points:
+            return times, columns, "raw"
     
-    # Validar o valor
-    if not isinstance(value, (int, float)) or math.isnan(value):
-        logging.error(f"Valor inválido para adicionar ao histórico: {value}")
-        return
+    # Muitos pontos brutos: usar a camada de agregação mais fina que caiba no pedido
+    rollups = device.rollups[sensor_type]
+    tier_name = rollups.choose(start_time, end_time, points, require_coverage)
+    resolution = None
+    if tier_name is not None:
+        # Camada escolhida sem baldes no intervalo: tentar as mais finas, depois os pontos brutos
+        width = rollups.tiers[tier_name].width
+        finer = sorted((item for item in rollups.tiers.items() if item[1].width <= width),
+                       key=lambda item: item[1].width, reverse=True)
+        for name, tier in finer:
+            tier_times, aggregates = tier.range(start_time, end_time)
+            if len(tier_times):
+                times = tier_times
+                columns = {"value": aggregates["mean"], "min": aggregates["min"], "max": aggregates["max"]}
+                resolution = name
+                break
+    if resolution is None:
+        if not raw_covers:
+            return None
+        resolution = "raw"
     
-    # Verificar se já temos dados para este timestamp específico para evitar duplicatas
-    for item in sensor_data[sensor_type]:
-        if item["time"] == time_str:
-            # Atualizar o valor existente em vez de adicionar um novo
-            item["value"] = value
-            socketio.emit('data_update', sensor_data)
-            return
-            
-    # Se não existir, adicionar novo ponto
-    if len(sensor_data[sensor_type]) >= MAX_DATA_POINTS:
-        sensor_data[sensor_type].pop(0)  # Remover o ponto mais antigo
-        
-    sensor_data[sensor_type].append({"time": time_str, "value": value})
+    if len(times) > points:
+        indices = downsample_indices(times, columns["value"], points, method)
+        times = times[indices]
+        columns = {name: values[indices] for name, values in columns.items()}
+    return times, columns, resolution
+
+# Função para gerar a representação JSON do estado de um dispositivo
+# (lido sob o lock do dispositivo, enquanto o worker da fila de ingestão pode estar gravando)
+def serialize_device(device, window=None, points=None, method="lttb"):
+    with device.lock:
+        data = {
+            "device": device.device_id,
+            "status": device.status,
+            "last_update": device.last_update,
+            "last_data_received": device.last_data_received,
+            "alerts": [alert.to_dict() for alert in device.alerts.values()],
+        }
+        if window is None:
+            # Padrão do dashboard: últimos MAX_DATA_POINTS pontos brutos
+            for sensor_type, history in device.history.items():
+                data[sensor_type] = history_to_points(history)
+            return data
     
-    # Garantir que estamos sempre enviando atualizações via WebSocket
-    socketio.emit('data_update', sensor_data)
+        # Visão ampliada: últimos `window` segundos reduzidos a `points` pontos
+        end_time = time.time()
+        start_time = end_time - window
+        data["resolution"] = {}
+        for sensor_type in device.history:
+            selected = select_series(device, sensor_type, start_time, end_time, points, method)
+            if selected is None:
+                # Série sem dados
+                data[sensor_type] = []
+                data["resolution"][sensor_type] = "raw"
+                continue
+            times, columns, resolution = selected
+            data[sensor_type] = arrays_to_points(times, columns)
+            data["resolution"][sensor_type] = resolution
+        return data
+
+# Função para ler os parâmetros de redução ('window', 'points', 'method') de uma requisição
+def parse_downsample_args(args):
+    window = args.get('window')
+    points = args.get('points')
+    method = args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Método inválido: {method}")
+    window = float(window) if window else None
+    points = int(points) if points else DEFAULT_DOWNSAMPLE_POINTS
+    if points < 3:
+        raise ValueError("'points' deve ser pelo menos 3")
+    return window, points, method
+
+# Função para escolher o dispositivo de uma requisição (padrão: DEFAULT_DEVICE ou o primeiro conhecido)
+def resolve_device_id(device_id=None):
+    if device_id:
+        return device_id
+    if DEFAULT_DEVICE in registry or len(registry) == 0:
+        return DEFAULT_DEVICE
+    return registry.ids()[0]
+
+# Função para gerar o snapshot completo usado na (re)sincronização dos clientes
+# ('sensors' e 'resolution' restringem o snapshot à assinatura do cliente)
+def build_snapshot(device_id=None, window=None, points=None, method="lttb", sensors=None, resolution="raw"):
+    # Enviar antes as mudanças pendentes para que o snapshot e o próximo delta não se sobreponham
+    broadcast_scheduler.flush()
+    # Sequência lida antes do estado: tudo o que os deltas até ela trazem já está no estado lido a seguir.
+    # Lida depois, um quadro enviado no meio da leitura ficaria marcado como incluído sem estar
+    # (mudanças de deltas posteriores que já apareçam aqui são ignoradas pelo cliente)
+    seq = delta_builder.current_seq()
+    device_id = resolve_device_id(device_id)
+    device = registry.get(device_id)
+    if device is not None:
+        data = serialize_device(device, window, points, method)
+    else:
+        # Dispositivo ainda sem dados: snapshot vazio
+        data = {"device": device_id, "status": "desconhecido", "last_update": None,
+                "last_data_received": 0, "alerts": [],
+                "vibration": [], "temperature": [], "humidity": []}
+    if sensors is not None:
+        subscription = parse_subscription({"sensors": sensors, "resolution": resolution}, device_id, HISTORY_CAPACITY)
+        for sensor_type in HISTORY_CAPACITY:
+            if sensor_type not in subscription.sensors:
+                data.pop(sensor_type, None)
+            elif window is None and subscription.width and device is not None:
+                # Um ponto por intervalo: os últimos MAX_DATA_POINTS intervalos
+                with device.lock:
+                    end_time = time.time()
+                    points_in_range = arrays_to_points(*device.history[sensor_type].range(
+                        end_time - MAX_DATA_POINTS * subscription.width, end_time))
+                data[sensor_type] = decimate_points(points_in_range, subscription.width)[0][-MAX_DATA_POINTS:]
+        data["subscription"] = subscription.to_dict()
+    data["devices"] = registry.ids()
+    data["seq"] = seq
+    data["max_points"] = MAX_DATA_POINTS
+    return data
+
+# Função para enviar aos clientes um quadro com as mudanças acumuladas:
+# cada sala de assinatura recebe apenas o que exibe
+def send_delta(delta):
+    start = time.perf_counter()
+    for room, frame in room_fanout.split(delta):
+        socketio.emit('data_delta', frame, to=room)
+    METRIC_EMIT_SECONDS.observe(time.perf_counter() - start)
+
+# Agrupa as mudanças em quadros enviados a no máximo BROADCAST_FRAME_RATE por segundo
+broadcast_scheduler = BroadcastScheduler(delta_builder.build, send_delta,
+                                         frame_rate=BROADCAST_FRAME_RATE,
+                                         max_latency=BROADCAST_MAX_LATENCY)
+
+# Estado da conexão com o broker (informado em /health)
+mqtt_connected = False
 
 # Callbacks MQTT
 def on_connect(client, userdata, flags, rc):
+    global mqtt_connected
     if rc == 0:
+        mqtt_connected = True
+        METRIC_MQTT_CONNECTS.inc()
         logging.warning("Interface web conectada ao broker MQTT!")
         # Inscrever nos tópicos
-        client.subscribe(TOPIC_VIBRATION)
-        client.subscribe(TOPIC_TEMPERATURE)
-        client.subscribe(TOPIC_HUMIDITY)
-        client.subscribe(TOPIC_STATUS)
+        client.subscribe(TOPIC_VIBRATION, MQTT_QOS)
+        client.subscribe(TOPIC_TEMPERATURE, MQTT_QOS)
+        client.subscribe(TOPIC_HUMIDITY, MQTT_QOS)
+        client.subscribe(TOPIC_STATUS, MQTT_QOS)
+        client.subscribe(TOPIC_COMMAND_RESPONSES, MQTT_QOS)
         
-        # Definir status como "desconhecido" no início
-        sensor_data["status"] = "desconhecido"
+        # Definir status como "desconhecido" no início (pelo worker de cada dispositivo)
+        for device in registry.devices():
+            ingest_queue.submit(device.device_id, pipeline.reset_status, device)
     else:
         logging.error(f"Falha na conexão, código de retorno: {rc}")
 
+# Apenas enfileira a mensagem: o processamento roda nos workers da fila de ingestão,
+# sem bloquear a thread de rede do cliente MQTT
 def on_message(client, userdata, msg):
-    topic = msg.topic
-    try:
-        # Atualizar timestamp de última recepção de dados
-        sensor_data["last_data_received"] = time.time()
-        
-        # Assumir que o dispositivo está online se recebemos qualquer dado
-        if sensor_data["status"] != "online":
-            sensor_data["status"] = "online"
-            logging.warning("Status atualizado para 'online' devido a recepção de dados")
-        
-        # Registra a hora atual
-        current_time = time.strftime("%H:%M:%S")
-        
-        # Processar o payload com base no tópico
-        if topic == TOPIC_VIBRATION:
-            process_vibration_data(msg.payload, current_time)
-            
-        elif topic == TOPIC_TEMPERATURE:
-            process_temperature_data(msg.payload, current_time)
-            
-        elif topic == TOPIC_HUMIDITY:
-            process_humidity_data(msg.payload, current_time)
-            
-        elif topic == TOPIC_STATUS:
-            process_status_data(msg.payload)
-        
-        # Atualiza a hora da última atualização
-        sensor_data["last_update"] = current_time
-        
-        # Verificar se é necessário gerar alertas
-        check_alerts()
-        
-        # Enviar dados atualizados via WebSocket
-        socketio.emit('data_update', sensor_data)
-    
-    except Exception as e:
-        logging.error(f"Erro ao processar mensagem do tópico {topic}: {str(e)}")
-
-# Função para remapear valores de vibração para a escala 0-9
-def remap_vibration(value):
-    # Garantir que o valor está dentro do intervalo esperado
-    value = max(0, min(value, VIBRATION_MAX_SENSOR))
-    # Aplicar regra de três para remapear
-    return (value / VIBRATION_MAX_SENSOR) * VIBRATION_MAX_SCALE
-
-# Função para processar dados de vibração
-def process_vibration_data(payload, current_time):
-    # Tentar extrair o valor do payload
-    try:
-        # Tentar como JSON primeiro
-        data = json.loads(payload.decode())
-        
-        # Detectar formato do JSON e extrair valor
-        if isinstance(data, dict):
-            # Priorizar valores específicos
-            if "magnitude" in data:
-                raw_value = data["magnitude"]
-            elif "level" in data:
-                raw_value = data["level"]
-            elif "current_magnitude" in data:
-                raw_value = data["current_magnitude"]
-            elif "vibration_level" in data:
-                raw_value = data["vibration_level"]
-            else:
-                # Usar o primeiro campo numérico encontrado
-                for key, val in data.items():
-                    if isinstance(val, (int, float)) and key != "timestamp":
-                        raw_value = val
-                        break
-                else:
-                    raw_value = 0.0
-        else:
-            raw_value = float(data)
-            
-    except (json.JSONDecodeError, ValueError):
-        # Se não for JSON, tentar como float ou string
-        try:
-            raw_value = float(payload.decode().strip())
-        except ValueError:
-            raw_value = 0.0
-    
-    # Remapear o valor para a escala 0-9
-    remapped_value = remap_vibration(raw_value)
-    
-    # Adicionar dados ao histórico
-    if len(sensor_data["vibration"]) >= MAX_DATA_POINTS:
-        sensor_data["vibration"].pop(0)
-        
-    sensor_data["vibration"].append({
-        "time": current_time, 
-        "value": remapped_value, 
-        "raw_value": raw_value
-    })
-    
-    logging.warning(f"Dado de magnitude processado: valor original={raw_value}, remapeado={remapped_value:.2f}")
-
-# Função para processar dados de temperatura
-def process_temperature_data(payload, current_time):
-    # Tentar extrair o valor do payload
-    try:
-        # Tentar como JSON primeiro
-        data = json.loads(payload.decode())
-        
-        # Detectar formato do JSON e extrair valor
-        if isinstance(data, dict):
-            if "temperature" in data:
-                value = float(data["temperature"])
-            else:
-                # Usar o primeiro campo numérico encontrado
-                for key, val in data.items():
-                    if isinstance(val, (int, float)) and key != "timestamp":
-                        value = float(val)
-                        break
-                else:
-                    logging.error("Não foi possível encontrar valor de temperatura válido no payload")
-                    return
-        else:
-            value = float(data)
-            
-    except (json.JSONDecodeError, ValueError) as e:
-        # Se não for JSON, tentar como float ou string
-        try:
-            value = float(payload.decode().strip())
-        except ValueError:
-            logging.error(f"Erro ao processar dados de temperatura: {str(e)}")
-            return
-    
-    # Validar valor
-    if not isinstance(value, (int, float)) or math.isnan(value):
-        logging.error(f"Valor de temperatura inválido: {value}")
+    received_at = time.time()
+    if traffic_recorder is not None:
+        traffic_recorder.record(msg.topic, msg.payload, received_at)
+    # A chave da fila é o dispositivo, para manter a ordem das mensagens de cada um
+    device_id, _, sensor = msg.topic.rpartition("/")
+    METRIC_MESSAGES.inc(sensor)
+    if sensor == "responses":
+        # Respostas a comandos: o instante é o da recepção, para não somar a espera da fila à latência
+        # medida; a resposta é tratada no worker do dispositivo, à frente das mensagens na fila
+        ingest_queue.submit(device_id, handle_command_response, msg.payload, time.monotonic())
         return
-    
-    # Adicionar dados ao histórico usando a função de verificação de duplicatas
-    add_data_to_history("temperature", value, current_time)
-    
-    logging.warning(f"Dado de temperatura recebido: {value}°C (Total: {len(sensor_data['temperature'])} pontos)")
+    ingest_queue.put(device_id, msg.topic, msg.payload, received_at)
 
-# Função para processar dados de umidade
-def process_humidity_data(payload, current_time):
-    # Tentar extrair o valor do payload
-    try:
-        # Tentar como JSON primeiro
-        data = json.loads(payload.decode())
-        
-        # Detectar formato do JSON e extrair valor
-        if isinstance(data, dict):
-            if "humidity" in data:
-                value = float(data["humidity"])
-            else:
-                # Usar o primeiro campo numérico encontrado
-                for key, val in data.items():
-                    if isinstance(val, (int, float)) and key != "timestamp":
-                        value = float(val)
-                        break
-                else:
-                    logging.error("Não foi possível encontrar valor de umidade válido no payload")
-                    return
-        else:
-            value = float(data)
-            
-    except (json.JSONDecodeError, ValueError) as e:
-        # Se não for JSON, tentar como float ou string
-        try:
-            value = float(payload.decode().strip())
-        except ValueError:
-            logging.error(f"Erro ao processar dados de umidade: {str(e)}")
-            return
-    
-    # Validar valor
-    if not isinstance(value, (int, float)) or math.isnan(value):
-        logging.error(f"Valor de umidade inválido: {value}")
-        return
-    
-    # Adicionar dados ao histórico usando a função de verificação de duplicatas
-    add_data_to_history("humidity", value, current_time)
-    
-    logging.warning(f"Dado de umidade recebido: {value}% (Total: {len(sensor_data['humidity'])} pontos)")
+ingest_queue = IngestQueue(handle_message, maxsize=INGEST_QUEUE_SIZE, workers=INGEST_WORKERS,
+                           policy=INGEST_OVERFLOW_POLICY)
 
-# Função para processar dados de status
-def process_status_data(payload):
-    try:
-        # Tentar como JSON primeiro
-        data = json.loads(payload.decode())
-        
-        if isinstance(data, dict) and "status" in data:
-            sensor_data["status"] = data["status"]
-        elif isinstance(data, str):
-            sensor_data["status"] = data
-            
-    except (json.JSONDecodeError, ValueError):
-        # Se não for JSON, usar como string
-        try:
-            sensor_data["status"] = payload.decode().strip()
-        except:
-            pass
-    
-    logging.warning(f"Status atualizado explicitamente: {sensor_data['status']}")
-
-# Função para verificar e gerar alertas com base nos dados dos sensores
-def check_alerts():
-    # Limpar alertas antigos
-    current_time = time.time()
-    sensor_data["alerts"] = [alert for alert in sensor_data["alerts"] 
-                           if current_time - alert["timestamp"] < 60]  # Remover alertas com mais de 60 segundos
-    
-    # Verificar temperatura
-    if sensor_data["temperature"] and len(sensor_data["temperature"]) > 0:
-        temp_value = sensor_data["temperature"][-1]["value"]
-        if isinstance(temp_value, (int, float)) and temp_value > TEMPERATURE_MAX:
-            add_alert("temperatura", f"Temperatura crítica: {temp_value:.1f}°C", "danger")
-    
-    # Verificar umidade
-    if sensor_data["humidity"] and len(sensor_data["humidity"]) > 0:
-        humidity_value = sensor_data["humidity"][-1]["value"]
-        if isinstance(humidity_value, (int, float)) and humidity_value > HUMIDITY_MAX:
-            add_alert("umidade", f"Umidade crítica: {humidity_value:.1f}%", "warning")
-    
-    # Verificar vibração
-    if sensor_data["vibration"] and len(sensor_data["vibration"]) > 0:
-        vib_data = sensor_data["vibration"][-1]
-        raw_value = vib_data.get("raw_value", 0)
-        remapped_value = vib_data["value"]
-        
-        if isinstance(remapped_value, (int, float)) and remapped_value > 4.0:
-            # Alerta de deslizamentos extremos quando a magnitude for maior que 4.0
-            add_alert("magnitude", f"ALERTA DE DESLIZAMENTOS EXTREMOS: {remapped_value:.1f}/9.0", "danger")
-        elif isinstance(remapped_value, (int, float)) and remapped_value > 3.0:
-            # Vibração moderada, alerta menos grave
-            add_alert("magnitude", f"Magnitude elevada: {remapped_value:.1f}/9.0", "warning")
-
-# Função para adicionar um novo alerta
-def add_alert(type, message, level):
-    # Verificar se já existe um alerta similar recente
-    for alert in sensor_data["alerts"]:
-        if alert["type"] == type and time.time() - alert["timestamp"] < 30:
-            # Atualizar alerta existente em vez de criar novo
-            alert["message"] = message
-            alert["timestamp"] = time.time()
-            return
-    
-    # Adicionar novo alerta
-    sensor_data["alerts"].append({
-        "type": type,
-        "message": message,
-        "level": level,
-        "timestamp": time.time()
-    })
-    logging.warning(f"Novo alerta gerado: {message} (nível: {level})")
+# Métricas lidas dos componentes no momento da coleta
+metrics.gauge("iot_ingest_queue_depth", "Mensagens aguardando processamento", function=lambda: ingest_queue.depth())
+metrics.counter("iot_ingest_dropped_total", "Mensagens descartadas pela fila de ingestão", function=lambda: ingest_queue.dropped)
+metrics.counter("iot_broadcast_frames_total", "Quadros enviados ao dashboard", function=lambda: broadcast_scheduler.frames_sent)
+metrics.counter("iot_broadcast_updates_coalesced_total", "Atualizações agrupadas em quadros já pendentes",
+                function=lambda: broadcast_scheduler.updates_coalesced)
+metrics.counter("iot_storage_samples_written_total", "Amostras gravadas no histórico em disco",
+                function=lambda: history_store.samples_written)
+metrics.counter("iot_storage_samples_dropped_total", "Amostras descartadas pela fila de gravação",
+                function=lambda: history_store.samples_dropped)
+metrics.gauge("iot_active_alerts", "Alertas ativos", function=lambda: alert_engine.active_count())
+metrics.counter("iot_snapshot_cache_hits_total", "Snapshots servidos do cache", function=lambda: snapshot_cache.hits)
+metrics.counter("iot_snapshot_cache_misses_total", "Snapshots montados e serializados", function=lambda: snapshot_cache.misses)
 
 def on_disconnect(client, userdata, rc):
+    global mqtt_connected
+    mqtt_connected = False
+    METRIC_MQTT_DISCONNECTS.inc("unexpected" if rc != 0 else "requested")
     logging.warning("Interface web desconectada do broker MQTT")
     if rc != 0:
         logging.warning("Desconexão inesperada. Tentando reconectar...")
 
-# Função para verificar periodicamente o status online/offline
+# Função para verificar o status online/offline: acorda quando vence o prazo mais próximo
+# (ou a cada OFFLINE_CHECK_INTERVAL segundos, para a expiração dos alertas)
 def check_online_status():
     while True:
-        current_time = time.time()
-        last_received = sensor_data["last_data_received"]
-        
-        # Se não recebemos dados há mais de OFFLINE_THRESHOLD segundos e não estamos offline
-        if last_received > 0 and (current_time - last_received) > OFFLINE_THRESHOLD and sensor_data["status"] != "offline":
-            sensor_data["status"] = "offline"
-            logging.warning(f"Status atualizado para 'offline' - sem dados há {int(current_time - last_received)} segundos")
-            # Enviar atualização via WebSocket
-            socketio.emit('data_update', sensor_data)
-        
-        time.sleep(5)  # Verificar a cada 5 segundos
+        check_offline_devices(time.time())
+        device_deadlines.wait(OFFLINE_CHECK_INTERVAL)
 
 # Configuração do cliente MQTT
-mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, CLIENT_ID)
+mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, CLIENT_ID, clean_session=MQTT_CLEAN_SESSION)
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 mqtt_client.on_disconnect = on_disconnect
+# Reconexão com espera aleatorizada, spool em disco e medição das quedas
+mqtt_session = MqttSession(mqtt_client, qos=MQTT_QOS, spool=Spool(os.path.join(SPOOL_DIR, f"{CLIENT_ID}.sqlite")))
+metrics.counter("iot_mqtt_outages_total", "Quedas da conexão com o broker", function=lambda: mqtt_session.outages)
+metrics.counter("iot_mqtt_outage_seconds_total", "Tempo total sem conexão com o broker após uma queda",
+                function=lambda: mqtt_session.outage_seconds_total)
+metrics.gauge("iot_mqtt_spool_depth", "Publicações aguardando a reconexão no spool em disco",
+              function=lambda: mqtt_session.spool.depth())
 
-# Rotas da aplicação web
-@app.route('/')
-def index():
-    return render_template('index.html')
+# Comandos aguardando resposta, indexados pelo id de correlação e pelo prazo
+command_tracker = CommandTracker(timeout=COMMAND_TIMEOUT, max_pending=MAX_PENDING_COMMANDS)
+METRIC_COMMANDS = metrics.counter("iot_commands_total", "Comandos enviados aos dispositivos e seus resultados",
+                                  ("command", "result"))
+METRIC_COMMAND_SECONDS = metrics.histogram("iot_command_roundtrip_seconds",
+                                           "Tempo entre o envio de um comando e a resposta do dispositivo",
+                                           ("device", "command"), buckets=COMMAND_LATENCY_BUCKETS)
+metrics.gauge("iot_commands_pending", "Comandos aguardando resposta", function=lambda: command_tracker.stats()["pending"])
 
-@app.route('/api/data')
-def get_data():
-    return jsonify(sensor_data)
+# Função para enviar um comando a um dispositivo; retorna o registro com o id de correlação
+# (`requester`: cliente WebSocket que receberá o resultado)
+def send_command(device_id, command_type, params=None, timeout=None, requester=None):
+    record = command_tracker.start(device_id, command_type, params, timeout, requester)
+    payload = json.dumps({"id": record["id"], "type": command_type, "params": record["params"],
+                          "timestamp": record["sent_at"]})
+    # Sem conexão, o comando fica no spool e é publicado na reconexão (o prazo continua valendo)
+    record["published"] = mqtt_session.publish(f"{device_id}/commands", payload)
+    METRIC_COMMANDS.inc(command_type, "sent")
+    return record
 
-# Rota para enviar dados de teste (apenas para fins de depuração durante desenvolvimento)
-@app.route('/api/test/send')
-def send_test_data():
+# Função para enviar o resultado de um comando (resposta ou prazo esgotado) ao cliente que o enviou
+# ou, se veio pela API REST, aos clientes que exibem o dispositivo
+def emit_command_result(result, requester=None):
+    if requester is not None:
+        socketio.emit('command_result', result, to=requester)
+        return
+    for room in room_fanout.device_rooms(result["device"]):
+        socketio.emit('command_result', result, to=room)
+
+# Função para processar a resposta de um comando (tópico <dispositivo>/responses)
+def handle_command_response(payload, received_at):
+    response = decode_object(payload)
+    if response is None or not response.get("id"):
+        logging.error("Resposta de comando sem 'id' de correlação")
+        return
+    record = command_tracker.complete(response["id"], response, received_at)
+    if record is None:
+        logging.warning(f"Resposta para comando desconhecido ou expirado: {response['id']}")
+        return
+    METRIC_COMMANDS.inc(record["type"], "completed")
+    METRIC_COMMAND_SECONDS.observe(record["latency"], record["device"], record["type"])
+    emit_command_result(public_record(record), record["_requester"])
+
+# Função para marcar os comandos sem resposta no prazo
+def expire_commands():
+    for record in command_tracker.expire():
+        METRIC_COMMANDS.inc(record["type"], "timeout")
+        logging.warning(f"Comando {record['type']} para {record['device']} sem resposta em {record['timeout']}s")
+        emit_command_result(public_record(record), record["_requester"])
+
+# Função para verificar periodicamente os prazos dos comandos
+def check_command_timeouts():
+    while True:
+        expire_commands()
+        time.sleep(COMMAND_CHECK_INTERVAL)
+
+# Função para obter o snapshot padrão de um dispositivo já serializado, do cache enquanto não há mudanças
+# (sem forçar o envio das pendentes: o conteúdo pode atrasar até um quadro, como no WebSocket).
+# A entrada fica com a sequência do snapshot gerado, posterior ao envio das pendentes, e não com a
+# consultada antes dele: a próxima consulta sem mudanças a encontra
+def cached_snapshot(device_id=None):
+    device_id = resolve_device_id(device_id)
+
+    def build():
+        data = build_snapshot(device_id)
+        return data, data["seq"]
+
+    return snapshot_cache.get(("snapshot", device_id), delta_builder.current_seq(), build)
+
+# Função para responder a '/api/data?since=<seq>': 304 sem mudanças, os deltas desde `since`
+# enquanto estão guardados, ou o snapshot completo
+def changes_since(since, device_id=None):
+    deltas = delta_builder.since(since)
+    if deltas == []:
+        return None, 304
+    if deltas is None:
+        return cached_snapshot(device_id), 200
+    version = deltas[-1]["seq"]
+    return snapshot_cache.get(("since", since), version, lambda: ({"seq": version, "deltas": deltas}, version)), 200
+
+# Lógica das rotas da API: recebem os parâmetros da requisição (objeto com .get)
+# e retornam (dados, código HTTP), para serem usadas também pelo servidor assíncrono
+
+# Parâmetros opcionais: window (segundos), points (máximo por série) e method (lttb|minmax);
+# since (número de sequência) retorna apenas os deltas posteriores
+def api_data(args):
+    try:
+        window, points, method = parse_downsample_args(args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    since = args.get('since')
+    if since:
+        try:
+            return changes_since(int(since), args.get('device'))
+        except ValueError:
+            return {"error": "'since' deve ser um número de sequência"}, 400
+    if window is None:
+        return cached_snapshot(args.get('device')), 200
+    return build_snapshot(args.get('device'), window, points, method), 200
+
+# Lista de dispositivos conhecidos
+def api_devices(args):
+    return [registry.get(device_id).summary() for device_id in registry.ids()], 200
+
+# Snapshot de um dispositivo específico
+def api_device_data(args, device_id):
+    if device_id not in registry:
+        return {"error": f"Dispositivo desconhecido: {device_id}"}, 404
+    try:
+        window, points, method = parse_downsample_args(args)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if window is None:
+        return cached_snapshot(device_id), 200
+    return build_snapshot(device_id, window, points, method), 200
+
+# Métricas de vibração da janela deslizante (spectrum=1 inclui o espectro completo)
+def api_device_analytics(args, device_id):
+    device = registry.get(device_id)
+    if device is None:
+        return {"error": f"Dispositivo desconhecido: {device_id}"}, 404
+    result = {"device": device_id, "window": device.analytics.window}
+    with device.lock:
+        result.update(device.analytics.metrics())
+        spectrum = device.analytics.spectrum() if args.get('spectrum') in ('1', 'true') else None
+    if spectrum is not None:
+        result["spectrum"] = {
+            "frequencies": spectrum["frequencies"].tolist(),
+            "amplitudes": spectrum["amplitudes"].tolist(),
+        }
+    return result, 200
+
+# Consulta ao histórico persistente: device, sensor, from, to e limit
+# Com 'points', a série é reduzida (method=lttb|minmax), usando as camadas em memória quando cobrem o intervalo
+def api_history(args):
+    device_id = resolve_device_id(args.get('device'))
+    sensor = args.get('sensor', 'temperature')
+    if sensor not in HISTORY_CAPACITY:
+        return {"error": f"Sensor inválido: {sensor}"}, 400
+    try:
+        end_time = float(args.get('to', time.time()))
+        start_time = float(args.get('from', end_time - HISTORY_DEFAULT_RANGE))
+        limit = args.get('limit')
+        limit = int(limit) if limit else None
+        _, points, method = parse_downsample_args(args)
+    except ValueError:
+        return {"error": "Parâmetros 'from', 'to', 'limit' e 'points' devem ser numéricos"}, 400
+    
+    result = {"device": device_id, "sensor": sensor, "from": start_time, "to": end_time}
+    if 'points' in args:
+        # Primeiro tentar as camadas em memória; senão, reduzir os dados do disco
+        device = registry.get(device_id)
+        selected = None
+        if device is not None:
+            with device.lock:
+                selected = select_series(device, sensor, start_time, end_time, points, method,
+                                         require_coverage=True)
+        if selected is None:
+            selected = reduce_stored_series(device_id, sensor, start_time, end_time, points, method, limit)
+        times, columns, resolution = selected
+        result.update({"count": len(times), "resolution": resolution, "t": times.tolist()})
+        for name, values in columns.items():
+            result[name] = values.tolist()
+        return result, 200
+    
+    # Sem 'points', a resposta traz os pontos brutos: limitada a HISTORY_MAX_ROWS
+    limit = HISTORY_MAX_ROWS if limit is None else min(limit, HISTORY_MAX_ROWS)
+    times, values, raw_values = history_store.query(device_id, sensor, start_time, end_time, limit)
+    result.update({"count": len(times), "t": times, "value": values})
+    if sensor == "vibration":
+        result["raw_value"] = raw_values
+    if len(times) == limit:
+        # Continuar com 'from' logo após o último timestamp
+        result["truncated"] = True
+    return result, 200
+
+# Função para reduzir a série do disco lendo o intervalo em lotes (sem carregá-lo inteiro na memória)
+def reduce_stored_series(device_id, sensor, start_time, end_time, points, method, limit=None):
+    fields = ("value", "raw_value") if sensor == "vibration" else ("value",)
+    # Mínimo e máximo por intervalo; para LTTB, mais candidatos que o pedido
+    buckets = max(1, points // 2) if method == "minmax" else points * 2
+    reducer = RangeReducer(start_time, end_time, buckets, fields)
+    for rows in history_store.iter_range(device_id, sensor, start_time, end_time):
+        if limit is not None:
+            rows = rows[:limit - reducer.count]
+        reducer.add(rows)
+        if limit is not None and reducer.count >= limit:
+            break
+    times, columns = reducer.result()
+    if len(times) > points:
+        indices = downsample_indices(times, columns["value"], points, method)
+        times = times[indices]
+        columns = {name: values[indices] for name, values in columns.items()}
+    return times, columns, "raw"
+
+# Função para contar as linhas exportadas à medida que os lotes são lidos
+def count_export_rows(batches, export_format):
+    for sensor, rows in batches:
+        METRIC_EXPORT_ROWS.inc(export_format, amount=len(rows))
+        yield sensor, rows
+
+# Exportação em fluxo do histórico persistente: format (csv|ndjson|parquet), sensors, from, to,
+# after e after_sensor (continuação após a última linha recebida) e header (CSV, padrão 1)
+# O corpo é gerado enquanto é enviado, em memória constante; gzip conforme o Accept-Encoding
+def api_export(args, device_id):
+    export_format = args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return {"error": f"Formato inválido: {export_format}"}, 400
+    if export_format == 'parquet' and not parquet_available():
+        return {"error": "Exportação em Parquet requer o pacote pyarrow"}, 501
+    sensors = args.get('sensors')
+    sensors = sensors.split(',') if sensors else list(HISTORY_CAPACITY)
+    unknown = [sensor for sensor in sensors if sensor not in HISTORY_CAPACITY]
+    if unknown:
+        return {"error": f"Sensores inválidos: {', '.join(unknown)}"}, 400
+    try:
+        end_time = float(args.get('to', time.time()))
+        start_time = float(args.get('from', 0))
+        after = args.get('after')
+        after = float(after) if after is not None else None
+    except ValueError:
+        return {"error": "Parâmetros 'from', 'to' e 'after' devem ser numéricos"}, 400
+    after_sensor = args.get('after_sensor')
+    if after is not None and after_sensor is None:
+        if len(sensors) > 1:
+            return {"error": "'after' com vários sensores requer 'after_sensor'"}, 400
+        after_sensor = sensors[0]
+    
+    batches = count_export_rows(export_rows(history_store, device_id, sensors, start_time, end_time,
+                                            after, after_sensor), export_format)
+    chunks = format_chunks(export_format, device_id, batches, header=args.get('header', '1') != '0')
+    return ExportStream(chunks, export_format, f"{device_id}.{export_format}"), 200
+
+# Métricas internas do servidor
+def api_stats(args):
+    return {
+        "ingest": ingest_queue.stats(),
+        "broadcast": broadcast_scheduler.stats(),
+        "storage": history_store.stats(),
+        "mqtt": mqtt_session.stats(),
+        "commands": command_tracker.stats(),
+        "snapshot_cache": snapshot_cache.stats(),
+        "offline_detection": device_deadlines.stats(),
+        "history": registry.history_stats(),
+        "rooms": room_fanout.stats(),
+        "recorder": traffic_recorder.stats() if traffic_recorder is not None else None,
+    }, 200
+
+# Estado do serviço para o supervisor (main.py): responde enquanto o servidor atende,
+# com as verificações de dependências em 'checks'
+def api_health(args):
+    return {"ready": True, "checks": {"mqtt": mqtt_connected}, "devices": len(registry)}, 200
+
+# Envio de dados de teste (apenas para fins de depuração durante desenvolvimento)
+def api_test_send(args):
+    device = get_device(args.get('device', DEFAULT_DEVICE))
+    if device is None:
+        return {"success": False, "error": "Limite de dispositivos atingido"}, 503
+    
     # Simular recebimento de dados de temperatura
-    topic = TOPIC_TEMPERATURE
-    temperature = request.args.get('temp', None)
+    temperature = args.get('temp', None)
     
     if temperature:
         temperature = float(temperature)
@@ -395,13 +679,12 @@ def send_test_data():
     # Criar payload
     payload = json.dumps({"temperature": temperature}).encode()
     
-    # Processar como se fosse um evento MQTT
-    current_time = time.strftime("%H:%M:%S")
-    process_temperature_data(payload, current_time)
+    # Processar como se fosse um evento MQTT (pela fila, como as mensagens reais)
+    now = time.time()
+    ingest_queue.put(device.device_id, f"{device.device_id}/temperature", payload, now)
     
     # Simular recebimento de dados de umidade
-    topic = TOPIC_HUMIDITY
-    humidity = request.args.get('hum', None)
+    humidity = args.get('hum', None)
     
     if humidity:
         humidity = float(humidity)
@@ -412,30 +695,192 @@ def send_test_data():
     payload = json.dumps({"humidity": humidity}).encode()
     
     # Processar como se fosse um evento MQTT
-    process_humidity_data(payload, current_time)
-    
-    # Atualizar status e timestamp
-    sensor_data["status"] = "online"
-    sensor_data["last_update"] = current_time
-    sensor_data["last_data_received"] = time.time()
-    
-    # Enviar dados via WebSocket
-    socketio.emit('data_update', sensor_data)
+    ingest_queue.put(device.device_id, f"{device.device_id}/humidity", payload, now)
     
-    return jsonify({"success": True, "temperature": temperature, "humidity": humidity})
+    return {"success": True, "device": device.device_id, "temperature": temperature, "humidity": humidity}, 200
 
-# Evento de conexão do WebSocket
+# Envio de comando a um dispositivo: type, params (objeto), timeout (segundos) e wait
+# Sem 'wait', responde 202 com o id; com 'wait', espera a resposta por até 'wait' segundos
+# (200 respondido, 504 prazo esgotado, 202 ainda pendente)
+def api_send_command(args, device_id, requester=None):
+    if device_id not in registry:
+        return {"error": f"Dispositivo desconhecido: {device_id}"}, 404
+    params = args.get('params')
+    try:
+        if isinstance(params, str):
+            params = json.loads(params)
+        timeout = args.get('timeout')
+        wait = args.get('wait')
+        wait = min(float(wait), COMMAND_MAX_WAIT) if wait else 0
+        record = send_command(device_id, args.get('type'), params, float(timeout) if timeout else None, requester)
+    except CommandError as e:
+        return {"error": str(e)}, 400
+    except ValueError:
+        return {"error": "Parâmetros 'params' (JSON), 'timeout' e 'wait' inválidos"}, 400
+    if wait > 0:
+        record = command_tracker.wait(record["id"], wait)
+    status = {"completed": 200, "timeout": 504}.get(record["status"], 202)
+    return public_record(record), status
+
+# Estado de um comando pelo id de correlação
+def api_command(args, command_id):
+    record = command_tracker.get(command_id)
+    if record is None:
+        return {"error": f"Comando desconhecido: {command_id}"}, 404
+    return public_record(record), 200
+
+# Comandos pendentes, resultados recentes e latência de ida e volta por dispositivo e tipo
+def api_commands(args):
+    try:
+        limit = int(args.get('limit', 50))
+    except ValueError:
+        return {"error": "'limit' deve ser numérico"}, 400
+    return {
+        "stats": command_tracker.stats(),
+        "pending": [public_record(record) for record in command_tracker.pending()],
+        "recent": [public_record(record) for record in command_tracker.recent(limit)],
+        "latency": command_tracker.latency_stats(),
+    }, 200
+
+# Função para juntar os parâmetros da query string e do corpo JSON de uma requisição
+def request_params():
+    params = request.args.to_dict()
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        params.update(body)
+    return params
+
+# Função para converter o resultado de uma rota da API em resposta Flask
+# (None: resposta sem corpo; CachedBody: bytes prontos, com ETag e compressão;
+# ExportStream: corpo gerado em blocos durante o envio)
+def respond(result):
+    data, status = result
+    if data is None:
+        return app.response_class(status=status)
+    if isinstance(data, CachedBody):
+        if data.matches(request.headers.get('If-None-Match')):
+            return app.response_class(status=304, headers=data.headers(None))
+        body, encoding = data.select(request.headers.get('Accept-Encoding'))
+        return app.response_class(body, status=status, content_type="application/json",
+                                  headers=data.headers(encoding))
+    if isinstance(data, ExportStream):
+        chunks, encoding = data.select(request.headers.get('Accept-Encoding'))
+        return app.response_class(chunks, status=status, content_type=data.content_type,
+                                  headers=data.headers(encoding))
+    return jsonify(data), status
+
+# Rotas da aplicação web
+@app.route('/')
+def index():
+    return render_template('index.html', socket_transports=SOCKET_TRANSPORTS)
+
+@app.route('/api/data')
+def get_data():
+    return respond(api_data(request.args))
+
+@app.route('/api/devices')
+def get_devices():
+    return respond(api_devices(request.args))
+
+@app.route('/api/devices/<device_id>/data')
+def get_device_data(device_id):
+    return respond(api_device_data(request.args, device_id))
+
+@app.route('/api/devices/<device_id>/analytics')
+def get_device_analytics(device_id):
+    return respond(api_device_analytics(request.args, device_id))
+
+@app.route('/api/history')
+def get_history():
+    return respond(api_history(request.args))
+
+@app.route('/api/devices/<device_id>/export')
+def get_device_export(device_id):
+    return respond(api_export(request.args, device_id))
+
+@app.route('/api/stats')
+def get_stats():
+    return respond(api_stats(request.args))
+
+@app.route('/health')
+def get_health():
+    return respond(api_health(request.args))
+
+# Rota de métricas no formato texto do Prometheus
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(metrics.render(), content_type=Registry.CONTENT_TYPE)
+
+@app.route('/api/test/send')
+def send_test_data():
+    return respond(api_test_send(request.args))
+
+@app.route('/api/devices/<device_id>/commands', methods=['POST'])
+def post_command(device_id):
+    return respond(api_send_command(request_params(), device_id))
+
+@app.route('/api/commands')
+def get_commands():
+    return respond(api_commands(request.args))
+
+@app.route('/api/commands/<command_id>')
+def get_command(command_id):
+    return respond(api_command(request.args, command_id))
+
+# Função para (re)inscrever o cliente atual na sala da sua assinatura e enviar o snapshot
+# ('device', 'sensors' e 'resolution'; sem eles, o dispositivo padrão com todas as séries em resolução bruta)
+def subscribe_client(args):
+    device_id = resolve_device_id(args.get('device'))
+    try:
+        subscription = parse_subscription(args, device_id, HISTORY_CAPACITY)
+    except ValueError as e:
+        emit('subscribe_error', {"error": str(e)})
+        return
+    previous = room_fanout.join(request.sid, subscription)
+    if previous is not None and previous != subscription.room:
+        leave_room(previous)
+    join_room(subscription.room)
+    # Snapshot apenas para este cliente; os deltas seguintes chegam pela sala
+    emit('data_snapshot', build_snapshot(device_id, sensors=subscription.sensors,
+                                         resolution=subscription.resolution))
+
+# Evento de conexão do WebSocket (a assinatura inicial vem nos parâmetros da conexão)
 @socketio.on('connect')
 def handle_connect():
-    # Enviar dados atuais quando um cliente se conecta
-    socketio.emit('data_update', sensor_data)
+    METRIC_WS_CLIENTS.inc()
+    subscribe_client(request.args)
+
+# Evento de desconexão do WebSocket
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    METRIC_WS_CLIENTS.dec()
+    room_fanout.leave(request.sid)
+
+# Troca da assinatura: dispositivo, séries e resolução exibidos
+@socketio.on('subscribe')
+def handle_subscribe(data=None):
+    subscribe_client(data if isinstance(data, dict) else {})
+
+# Evento de ressincronização: o cliente detectou uma lacuna na sequência de deltas
+# (traz a assinatura atual, como 'subscribe')
+@socketio.on('resync')
+def handle_resync(data=None):
+    subscribe_client(data if isinstance(data, dict) else {})
+
+# Envio de comando pelo WebSocket: a confirmação (ack) traz o id; o resultado chega
+# depois no evento 'command_result', enviado apenas a este cliente
+@socketio.on('send_command')
+def handle_send_command(data=None):
+    data = dict(data) if isinstance(data, dict) else {}
+    data.pop('wait', None)
+    result, status = api_send_command(data, resolve_device_id(data.pop('device', None)), request.sid)
+    return dict(result, code=status)
 
 # Inicialização do cliente MQTT em uma thread separada
 def start_mqtt_client():
     try:
         logging.warning(f"Conectando interface web ao broker {MQTT_BROKER}:{MQTT_PORT}...")
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_forever()
+        mqtt_session.run_forever(MQTT_BROKER, MQTT_PORT, 60)
     except Exception as e:
         logging.error(f"Erro na conexão MQTT da interface: {str(e)}")
 
@@ -450,5 +895,33 @@ if __name__ == '__main__':
     status_thread.daemon = True
     status_thread.start()
     
-    # Iniciar aplicação Flask com SocketIO
-    socketio.run(app, debug=False, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Iniciar thread para verificação dos prazos dos comandos
+    command_thread = threading.Thread(target=check_command_timeouts)
+    command_thread.daemon = True
+    command_thread.start()
+    
+    # Iniciar o envio periódico de quadros para o dashboard
+    broadcast_scheduler.start(socketio.start_background_task)
+    
+    # Iniciar a gravação do histórico em disco
+    history_store.start()
+    
+    # Iniciar os workers da fila de ingestão
+    ingest_queue.start()
+    
+    # Iniciar a gravação do tráfego MQTT, se ativada
+    if traffic_recorder is not None:
+        traffic_recorder.start()
+    
+    try:
+        # Iniciar aplicação Flask com SocketIO
+        # allow_unsafe_werkzeug: sob o supervisor (main.py) o processo não tem terminal,
+        # e o Flask-SocketIO recusaria o servidor do Werkzeug
+        socketio.run(app, debug=False, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
+    finally:
+        # Processar as mensagens na fila e gravar as amostras pendentes antes de sair
+        mqtt_session.stop()
+        ingest_queue.stop(timeout=5)
+        history_store.stop()
+        if traffic_recorder is not None:
+            traffic_recorder.stop() 
\ No newline at end of file
@@ -0,0 +1,185 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+
+class BroadcastScheduler:
+    """Agrupa as atualizações do dashboard em quadros enviados a uma taxa fixa.
+
+    As rotinas de ingestão apenas chamam `notify()` depois de registrar suas
+    mudanças; uma thread de fundo monta o quadro com `build_frame()` e o envia
+    com `send_frame(frame)` no máximo `frame_rate` vezes por segundo. Uma
+    mudança nunca espera mais que `max_latency` segundos (por padrão, o
+    próprio intervalo entre quadros); se `max_latency` for menor que esse
+    intervalo, a latência tem prioridade sobre a taxa.
+    """
+
+    def __init__(self, build_frame, send_frame, frame_rate=10.0, max_latency=None):
+        if frame_rate <= 0:
+            raise ValueError("frame_rate deve ser positiva")
+        self.build_frame = build_frame
+        self.send_frame = send_frame
+        self.frame_interval = 1.0 / frame_rate
+        self.max_latency = self.frame_interval if max_latency is None else max_latency
+
+        self._condition = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._running = False
+        self._first_pending = None  # Instante (monotônico) da mudança mais antiga não enviada
+        self._pending_updates = 0
+        self._last_frame = 0.0
+
+        # Métricas
+        self.updates_received = 0
+        self.updates_coalesced = 0
+        self.frames_sent = 0
+        self.max_frame_latency = 0.0
+
+    def notify(self):
+        """Sinaliza que há mudanças pendentes para o próximo quadro."""
+        with self._condition:
+            self.updates_received += 1
+            self._pending_updates += 1
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+                self._condition.notify()
+
+    def _take_pending(self):
+        first_pending, count = self._first_pending, self._pending_updates
+        self._first_pending = None
+        self._pending_updates = 0
+        return first_pending, count
+
+    def _send(self, first_pending, count):
+        with self._send_lock:
+            frame = self.build_frame()
+            if frame is not None:
+                self.send_frame(frame)
+            now = time.monotonic()
+        with self._condition:
+            self._last_frame = now
+            if frame is None:
+                return
+            self.frames_sent += 1
+            if count > 1:
+                self.updates_coalesced += count - 1
+            if first_pending is not None:
+                self.max_frame_latency = max(self.max_frame_latency, now - first_pending)
+
+    def flush(self):
+        """Envia imediatamente as mudanças pendentes (ex.: antes de um snapshot)."""
+        with self._condition:
+            first_pending, count = self._take_pending()
+        self._send(first_pending, count)
+
+    def run(self):
+        """Laço da thread de envio; termina após `stop()`."""
+        while True:
+            with self._condition:
+                while self._running and self._first_pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                deadline = min(self._last_frame + self.frame_interval,
+                               self._first_pending + self.max_latency)
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                first_pending, count = self._take_pending()
+            self._send(first_pending, count)
+
+    def start(self, spawn=None):
+        """Inicia o laço de envio; `spawn` permite usar o iniciador de tarefas do servidor."""
+        self._running = True
+        if spawn is not None:
+            return spawn(self.run)
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "frame_rate": 1.0 / self.frame_interval,
+                "max_latency": self.max_latency,
+                "updates_received": self.updates_received,
+                "updates_coalesced": self.updates_coalesced,
+                "frames_sent": self.frames_sent,
+                "pending_updates": self._pending_updates,
+                "max_frame_latency": self.max_frame_latency,
+            }
+
+
+class AsyncBroadcastScheduler(BroadcastScheduler):
+    """Versão para asyncio: o próximo quadro é agendado com um timer do laço
+    de eventos (`loop.call_later`) em vez de uma thread de envio.
+
+    `notify()` deve ser chamado na thread do laço; `flush()` chamado de outra
+    thread (ex.: rota executada no executor) repassa o envio ao laço e espera
+    por ele. `send_frame` não pode bloquear (tipicamente cria uma tarefa que
+    faz o envio).
+    """
+
+    def __init__(self, build_frame, send_frame, frame_rate=10.0, max_latency=None):
+        super().__init__(build_frame, send_frame, frame_rate, max_latency)
+        self._loop = None
+        self._loop_thread = None
+        self._timer = None
+
+    def notify(self):
+        super().notify()
+        if self._running and self._timer is None:
+            self._schedule()
+
+    def _schedule(self):
+        deadline = min(self._last_frame + self.frame_interval, self._first_pending + self.max_latency)
+        self._timer = self._loop.call_later(max(0.0, deadline - time.monotonic()), self._fire)
+
+    def _fire(self):
+        self._timer = None
+        with self._condition:
+            if self._first_pending is None:
+                return
+            first_pending, count = self._take_pending()
+        self._send(first_pending, count)
+
+    def flush(self):
+        if self._loop is None or threading.get_ident() == self._loop_thread:
+            super().flush()
+            return
+        # Fora do laço, `send_frame` não encontraria o laço em execução: o quadro é montado e enviado nele
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                super(AsyncBroadcastScheduler, self).flush()
+                future.set_result(None)
+            except BaseException as e:
+                future.set_exception(e)
+
+        self._loop.call_soon_threadsafe(run)
+        future.result()
+
+    def start(self, loop=None):
+        """Associa o agendador ao laço de eventos (por padrão, o laço em execução).
+
+        Deve ser chamado na thread do laço.
+        """
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._running = True
+        if self._first_pending is not None:
+            self._schedule()
+
+    def stop(self):
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
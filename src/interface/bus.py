@@ -0,0 +1,269 @@
+import itertools
+import logging
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+# Tipos de mensagem trocados pelo barramento
+EVENT, CALL, REPLY, REPORT = "event", "call", "reply", "report"
+
+
+class BusError(Exception):
+    """Falha de comunicação com o processo de ingestão."""
+
+
+class _Peer:
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()  # Envios de threads diferentes não podem se intercalar
+        self.name = None
+        self.values = {}
+
+    def send(self, payload):
+        with self.lock:
+            self.connection.send_bytes(payload)
+
+
+class BusServer:
+    """Barramento local do lado do processo de ingestão.
+
+    Os workers web se conectam por `multiprocessing.connection` (com chave de
+    autenticação). O servidor envia a todos os eventos publicados, serializados
+    uma única vez, e atende chamadas às funções registradas em `handlers`
+    (nome -> função) em um pool de threads. As respostas e os eventos de um
+    worker saem pela mesma conexão, na ordem em que foram produzidos.
+    """
+
+    def __init__(self, address, authkey, handlers, call_threads=8):
+        self.address = address
+        self.authkey = authkey
+        self.handlers = handlers
+        self._listener = None
+        self._executor = ThreadPoolExecutor(max_workers=call_threads, thread_name_prefix="bus-call")
+        self._peers = set()
+        self._lock = threading.Lock()
+        self._running = False
+
+        # Métricas
+        self.events_published = 0
+        self.calls = 0
+        self.call_errors = 0
+
+    def start(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self._running = True
+        thread = threading.Thread(target=self._accept_loop, name="bus-accept", daemon=True)
+        thread.start()
+        return thread
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._running:
+                    logging.error("Falha ao aceitar conexão no barramento local")
+                    continue
+                return
+            except Exception as e:
+                # Chave de autenticação inválida ou handshake interrompido
+                logging.error(f"Conexão recusada no barramento local: {str(e)}")
+                continue
+            peer = _Peer(connection)
+            with self._lock:
+                self._peers.add(peer)
+            threading.Thread(target=self._serve, args=(peer,), name="bus-peer", daemon=True).start()
+
+    def _serve(self, peer):
+        try:
+            while True:
+                message = pickle.loads(peer.connection.recv_bytes())
+                kind = message[0]
+                if kind == CALL:
+                    self._executor.submit(self._call, peer, *message[1:])
+                elif kind == REPORT:
+                    peer.name, peer.values = message[1], message[2]
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._drop(peer)
+            if peer.name is not None:
+                logging.warning(f"Worker {peer.name} desconectado do barramento local")
+
+    def _call(self, peer, call_id, name, args):
+        self.calls += 1
+        try:
+            result = (True, self.handlers[name](*args))
+        except Exception as e:
+            self.call_errors += 1
+            logging.error(f"Erro na chamada remota {name}: {str(e)}")
+            result = (False, f"{type(e).__name__}: {str(e)}")
+        try:
+            peer.send(pickle.dumps((REPLY, call_id, result), pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            self._drop(peer)
+
+    def _drop(self, peer):
+        with self._lock:
+            self._peers.discard(peer)
+        peer.connection.close()
+
+    def publish(self, topic, data):
+        """Envia um evento a todos os workers conectados."""
+        payload = pickle.dumps((EVENT, topic, data), pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            peers = list(self._peers)
+        for peer in peers:
+            try:
+                peer.send(payload)
+            except OSError:
+                self._drop(peer)
+        self.events_published += 1
+
+    def report_total(self, key):
+        """Soma de um valor informado pelos workers (ex.: clientes conectados)."""
+        with self._lock:
+            return sum(peer.values.get(key, 0) for peer in self._peers)
+
+    def stop(self):
+        self._running = False
+        if self._listener is not None:
+            self._listener.close()
+        with self._lock:
+            peers = list(self._peers)
+        for peer in peers:
+            self._drop(peer)
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            workers = sorted(str(peer.name) for peer in self._peers)
+        return {
+            "workers": workers,
+            "events_published": self.events_published,
+            "calls": self.calls,
+            "call_errors": self.call_errors,
+        }
+
+
+class BusClient:
+    """Barramento local do lado de um worker web.
+
+    Mantém a conexão com o processo de ingestão (reconectando a cada
+    `retry_interval` segundos), entrega os eventos recebidos a
+    `on_event(topic, data)` e faz chamadas síncronas com `call()`.
+    Após cada (re)conexão, `on_event("connected", None)` é chamado.
+    """
+
+    def __init__(self, address, authkey, name, on_event, call_timeout=10.0, retry_interval=1.0):
+        self.address = address
+        self.authkey = authkey
+        self.name = name
+        self.on_event = on_event
+        self.call_timeout = call_timeout
+        self.retry_interval = retry_interval
+        self._peer = None
+        self._pending = {}  # id da chamada -> [evento, resultado]
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._running = False
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def start(self):
+        self._running = True
+        thread = threading.Thread(target=self._run, name="bus-client", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while self._running:
+            try:
+                peer = _Peer(Client(self.address, authkey=self.authkey))
+            except OSError:
+                time.sleep(self.retry_interval)
+                continue
+            self._peer = peer
+            self._connected.set()
+            logging.warning(f"Worker {self.name} conectado ao barramento local")
+            self.on_event("connected", None)
+            try:
+                while True:
+                    message = pickle.loads(peer.connection.recv_bytes())
+                    if message[0] == EVENT:
+                        self.on_event(message[1], message[2])
+                    elif message[0] == REPLY:
+                        self._resolve(message[1], message[2])
+            except (EOFError, OSError):
+                pass
+            self._connected.clear()
+            self._peer = None
+            peer.connection.close()
+            self._fail_pending()
+            if self._running:
+                logging.error(f"Worker {self.name} perdeu a conexão com o processo de ingestão")
+
+    def _resolve(self, call_id, result):
+        with self._lock:
+            pending = self._pending.pop(call_id, None)
+        if pending is not None:
+            pending[1] = result
+            pending[0].set()
+
+    def _fail_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for entry in pending.values():
+            entry[1] = (False, "conexão com o processo de ingestão perdida")
+            entry[0].set()
+
+    def _send(self, message):
+        peer = self._peer
+        if peer is None:
+            raise BusError("processo de ingestão indisponível")
+        try:
+            peer.send(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            raise BusError(f"falha ao enviar ao processo de ingestão: {str(e)}")
+
+    def call(self, name, *args, timeout=None):
+        """Executa `name(*args)` no processo de ingestão e retorna o resultado.
+
+        `timeout` substitui `call_timeout` nesta chamada.
+        """
+        call_id = next(self._ids)
+        entry = [threading.Event(), None]
+        with self._lock:
+            self._pending[call_id] = entry
+        try:
+            self._send((CALL, call_id, name, args))
+        except BusError:
+            with self._lock:
+                self._pending.pop(call_id, None)
+            raise
+        if not entry[0].wait(self.call_timeout if timeout is None else timeout):
+            with self._lock:
+                self._pending.pop(call_id, None)
+            raise BusError(f"tempo esgotado na chamada {name}")
+        ok, value = entry[1]
+        if not ok:
+            raise BusError(value)
+        return value
+
+    def report(self, **values):
+        """Informa valores deste worker ao processo de ingestão (ex.: clientes conectados)."""
+        try:
+            self._send((REPORT, self.name, values))
+        except BusError:
+            pass
+
+    def stop(self):
+        self._running = False
+        peer = self._peer
+        if peer is not None:
+            peer.connection.close()
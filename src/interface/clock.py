@@ -0,0 +1,44 @@
+import collections
+
+
+class ClockSync:
+    """Conversão do relógio de um dispositivo (millis) para o relógio do servidor.
+
+    Cada mensagem com timestamp gera uma medida `recebido - timestamp`: a
+    diferença entre os relógios mais o atraso de rede e do broker, que é
+    sempre positivo. A estimativa da diferença é a menor medida entre as
+    últimas `window` mensagens (filtro de atraso mínimo), mantida em uma
+    fila monotônica, com custo O(1) amortizado por mensagem. Um timestamp
+    menor que o anterior (dispositivo reiniciado ou volta do contador millis,
+    a cada ~49 dias) descarta as medidas anteriores.
+    """
+
+    def __init__(self, window=64):
+        self.window = window
+        self._measures = collections.deque()  # (número da medida, medida), medidas crescentes
+        self._count = 0
+        self._last_device_time = None
+        self.offset = None  # Segundos a somar ao relógio do dispositivo
+
+        # Métricas
+        self.resets = 0
+
+    def observe(self, device_time, received_at):
+        """Registra uma mensagem enviada em `device_time` (segundos do dispositivo) e recebida em `received_at`."""
+        if self._last_device_time is not None and device_time < self._last_device_time:
+            self._measures.clear()
+            self.resets += 1
+        self._last_device_time = device_time
+        measure = received_at - device_time
+        self._count += 1
+        while self._measures and self._measures[-1][1] >= measure:
+            self._measures.pop()
+        self._measures.append((self._count, measure))
+        while self._measures[0][0] <= self._count - self.window:
+            self._measures.popleft()
+        self.offset = self._measures[0][1]
+        return self.offset
+
+    def to_server(self, device_time):
+        """Converte um instante do dispositivo (segundos) para o relógio do servidor."""
+        return device_time + self.offset
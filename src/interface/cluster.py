@@ -0,0 +1,226 @@
+"""Modo com vários processos: um processo de ingestão e N workers web.
+
+- ingestão (`cluster.py ingest`): único dono do cliente MQTT, do histórico, do
+  registro de dispositivos e dos alertas; publica os quadros incrementais no
+  barramento local e atende as consultas dos workers
+- web (`cluster.py web --fd N --worker I`): serve HTTP e WebSocket no socket de
+  escuta herdado (compartilhado por todos os workers), repassa as rotas da API
+  e os snapshots ao processo de ingestão e reenvia os quadros aos seus clientes,
+  divididos pelas salas de assinatura dos clientes conectados a ele
+
+Os processos são iniciados e supervisionados por main.py (`--workers N`), que
+cria o socket de escuta e a chave do barramento (variável IOT_BUS_AUTHKEY).
+Como cada conexão pode cair em um worker diferente, os workers aceitam apenas
+o transporte WebSocket (o long-polling exigiria sessões fixas).
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+
+# Transporte WebSocket no servidor do Werkzeug, obrigatório nos workers web
+try:
+    import simple_websocket
+except ImportError:
+    simple_websocket = None
+
+import app as dashboard
+from broadcast import BroadcastScheduler
+from bus import BusClient, BusError, BusServer
+from metrics import Registry, serve_metrics
+
+BUS_ADDRESS = ("127.0.0.1", 5100)
+BUS_AUTHKEY_ENV = "IOT_BUS_AUTHKEY"
+BUS_CALL_TIMEOUT = 10
+
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 5000
+
+# Portas locais com /health e /metrics de cada processo (workers: WORKER_HEALTH_PORT + número)
+INGEST_HEALTH_PORT = 9101
+WORKER_HEALTH_PORT = 9110
+
+# Intervalo (segundos) em que cada worker informa seus clientes conectados
+REPORT_INTERVAL = 5
+
+# Funções de app.py executadas no processo de ingestão a pedido dos workers
+# (a exportação, `api_export`, não passa pelo barramento: cada worker lê os segmentos em disco)
+REMOTE_API = ("api_data", "api_devices", "api_device_data", "api_device_analytics",
+              "api_history", "api_stats", "api_test_send", "api_send_command", "api_command", "api_commands")
+
+
+# Função para executar o processo de ingestão (MQTT, histórico, estado e alertas)
+def run_ingest(authkey):
+    handlers = {name: getattr(dashboard, name) for name in REMOTE_API}
+    handlers["build_snapshot"] = dashboard.build_snapshot
+    handlers["resolve_device_id"] = dashboard.resolve_device_id
+    handlers["metrics"] = dashboard.metrics.render
+    bus = BusServer(BUS_ADDRESS, authkey, handlers)
+
+    def api_stats(args):
+        data, status = dashboard.api_stats(args)
+        data["bus"] = bus.stats()
+        return data, status
+
+    handlers["api_stats"] = api_stats
+
+    # Os quadros vão para o barramento, que os repassa a todos os workers
+    def publish_delta(delta):
+        start = time.perf_counter()
+        bus.publish('data_delta', delta)
+        dashboard.METRIC_EMIT_SECONDS.observe(time.perf_counter() - start)
+
+    dashboard.broadcast_scheduler = BroadcastScheduler(dashboard.delta_builder.build, publish_delta,
+                                                       frame_rate=dashboard.BROADCAST_FRAME_RATE,
+                                                       max_latency=dashboard.BROADCAST_MAX_LATENCY)
+    dashboard.METRIC_WS_CLIENTS.function = lambda: bus.report_total("clients")
+    # Os resultados dos comandos também passam pelo barramento; cada worker os envia ao cliente
+    # que enviou o comando (se estiver conectado a ele) ou às suas salas que exibem o dispositivo
+    dashboard.emit_command_result = lambda result, requester=None: bus.publish(
+        'command_result', {"result": result, "requester": requester})
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    bus.start()
+    serve_metrics(dashboard.metrics, "127.0.0.1", INGEST_HEALTH_PORT, health=lambda: dashboard.api_health({}))
+    threading.Thread(target=dashboard.start_mqtt_client, daemon=True).start()
+    threading.Thread(target=dashboard.check_online_status, daemon=True).start()
+    threading.Thread(target=dashboard.check_command_timeouts, daemon=True).start()
+    dashboard.broadcast_scheduler.start()
+    dashboard.history_store.start()
+    if dashboard.traffic_recorder is not None:
+        dashboard.traffic_recorder.start()
+    dashboard.ingest_queue.start()
+    logging.warning(f"Processo de ingestão pronto; barramento local em {BUS_ADDRESS[0]}:{BUS_ADDRESS[1]}")
+
+    try:
+        while not stopping.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.mqtt_session.stop()
+        bus.stop()
+        dashboard.broadcast_scheduler.stop()
+        # Processar as mensagens na fila e gravar as amostras pendentes antes de sair
+        dashboard.ingest_queue.stop(timeout=5)
+        dashboard.history_store.stop()
+        if dashboard.traffic_recorder is not None:
+            dashboard.traffic_recorder.stop()
+
+
+# Função para executar um worker web sobre o socket de escuta herdado
+def run_web(authkey, fd, worker):
+    from werkzeug.serving import make_server
+
+    if simple_websocket is None:
+        # Sem o pacote, o Engine.IO recusaria todos os clientes (o worker não oferece long-polling)
+        raise SystemExit("Os workers web requerem o pacote simple-websocket (pip install -r requirements.txt)")
+
+    socketio = dashboard.socketio
+    name = f"web-{worker}"
+    first_connection = [True]
+
+    def on_event(topic, data):
+        if topic == "connected":
+            # Após reiniciar a ingestão a sequência de deltas recomeça: os clientes pedem novo snapshot
+            if not first_connection[0]:
+                socketio.emit('resync_required')
+            first_connection[0] = False
+            return
+        if topic == "data_delta":
+            # As salas são de cada worker: o quadro completo é dividido aqui
+            dashboard.send_delta(data)
+            return
+        if topic == "command_result":
+            dashboard.emit_command_result(data["result"], data["requester"])
+            return
+        socketio.emit(topic, data)
+
+    bus = BusClient(BUS_ADDRESS, authkey, name, on_event, call_timeout=BUS_CALL_TIMEOUT)
+
+    def remote_api(function_name):
+        def call(args, *rest):
+            args = args.to_dict() if hasattr(args, "to_dict") else dict(args)
+            # O envio de comando com 'wait' pode esperar a resposta do dispositivo além do prazo normal
+            timeout = BUS_CALL_TIMEOUT + dashboard.COMMAND_MAX_WAIT if function_name == "api_send_command" else None
+            try:
+                return bus.call(function_name, args, *rest, timeout=timeout)
+            except BusError as e:
+                return {"error": f"Processo de ingestão indisponível: {str(e)}"}, 503
+        return call
+
+    def remote_snapshot(device_id=None, window=None, points=None, method="lttb", sensors=None, resolution="raw"):
+        return bus.call("build_snapshot", device_id, window, points, method, sensors, resolution)
+
+    # O registro de dispositivos fica no processo de ingestão: sem 'device', ele escolhe o dispositivo
+    def remote_resolve_device_id(device_id=None):
+        if device_id:
+            return device_id
+        return bus.call("resolve_device_id", None)
+
+    def remote_metrics():
+        try:
+            return dashboard.app.response_class(bus.call("metrics"), content_type=Registry.CONTENT_TYPE)
+        except BusError as e:
+            return dashboard.jsonify({"error": f"Processo de ingestão indisponível: {str(e)}"}), 503
+
+    # O worker está pronto enquanto atende; a conexão com a ingestão aparece em 'checks'
+    def worker_health(args):
+        return {"ready": True, "checks": {"bus": bus.connected}, "worker": name}, 200
+
+    # As rotas e eventos de app.py passam a consultar o processo de ingestão
+    for function_name in REMOTE_API:
+        setattr(dashboard, function_name, remote_api(function_name))
+    dashboard.api_health = worker_health
+    dashboard.build_snapshot = remote_snapshot
+    dashboard.resolve_device_id = remote_resolve_device_id
+    dashboard.app.view_functions['get_metrics'] = remote_metrics
+    dashboard.SOCKET_TRANSPORTS = ["websocket"]
+    socketio.server.eio.transports = ["websocket"]
+
+    def report_clients():
+        while True:
+            bus.report(clients=dashboard.METRIC_WS_CLIENTS.value())
+            time.sleep(REPORT_INTERVAL)
+
+    bus.start()
+    threading.Thread(target=report_clients, daemon=True).start()
+    serve_metrics(dashboard.metrics, "127.0.0.1", WORKER_HEALTH_PORT + worker, health=lambda: worker_health({}))
+    # Sem log de acesso por requisição (o servidor do Werkzeug registra cada uma em INFO)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(WEB_HOST, WEB_PORT, dashboard.app, threaded=True, fd=fd)
+    logging.warning(f"Worker {name} atendendo em {WEB_HOST}:{WEB_PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard em vários processos (ingestão + workers web)")
+    parser.add_argument("role", choices=("ingest", "web"))
+    parser.add_argument("--fd", type=int, help="descritor do socket de escuta herdado (workers web)")
+    parser.add_argument("--worker", type=int, default=0, help="número do worker web")
+    args = parser.parse_args()
+
+    authkey = os.environ.get(BUS_AUTHKEY_ENV)
+    if not authkey:
+        logging.error(f"Defina {BUS_AUTHKEY_ENV} com a chave do barramento local (feito por main.py)")
+        raise SystemExit(2)
+
+    if args.role == "ingest":
+        run_ingest(authkey.encode())
+    else:
+        if args.fd is None:
+            parser.error("o worker web requer --fd")
+        run_web(authkey.encode(), args.fd, args.worker)
+
+
+if __name__ == "__main__":
+    main()
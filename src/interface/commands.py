@@ -0,0 +1,169 @@
+import collections
+import heapq
+import re
+import threading
+import time
+import uuid
+
+# Tipos de comando aceitos: letras, números, '_' e '-'
+COMMAND_TYPE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Latências guardadas por dispositivo e tipo de comando para os percentis de /api/commands
+LATENCY_WINDOW = 256
+
+
+class CommandError(ValueError):
+    """Comando inválido ou recusado (limite de pendentes atingido)."""
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class CommandTracker:
+    """Comandos enviados aos dispositivos aguardando resposta.
+
+    Cada comando recebe um identificador de correlação (`id`), que o
+    dispositivo (ou o receptor) devolve na resposta. Os pendentes ficam em um
+    dicionário pelo id e em um heap pelo prazo, de modo que `expire()` só
+    examina os comandos vencidos. Os concluídos (respondidos ou expirados)
+    ficam disponíveis em `get()` até serem substituídos pelos mais recentes.
+    """
+
+    def __init__(self, timeout=10.0, max_pending=1000, keep_results=500):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._pending = {}  # id -> registro do comando
+        self._heap = []  # (prazo monotônico, id)
+        self._results = collections.OrderedDict()  # id -> registro concluído (mais recentes no fim)
+        self._keep_results = keep_results
+        self._latencies = {}  # (dispositivo, tipo) -> deque das últimas latências
+        self._condition = threading.Condition()
+
+        # Métricas
+        self.sent = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.late = 0  # Respostas que chegaram após o prazo (ou com id desconhecido)
+
+    def start(self, device_id, command_type, params=None, timeout=None, requester=None):
+        """Registra um novo comando pendente; retorna o registro (com o `id` a enviar).
+
+        `requester` identifica quem enviou (ex.: o cliente WebSocket), para receber o resultado.
+        """
+        if not isinstance(command_type, str) or not COMMAND_TYPE_PATTERN.match(command_type):
+            raise CommandError(f"Tipo de comando inválido: {command_type}")
+        if params is not None and not isinstance(params, dict):
+            raise CommandError("'params' deve ser um objeto")
+        timeout = self.timeout if timeout is None else float(timeout)
+        if not 0 < timeout <= 300:
+            raise CommandError("'timeout' deve estar entre 0 e 300 segundos")
+        record = {
+            "id": uuid.uuid4().hex,
+            "device": device_id,
+            "type": command_type,
+            "params": params or {},
+            "status": "pending",
+            "sent_at": time.time(),
+            "timeout": timeout,
+        }
+        started = time.monotonic()
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                raise CommandError(f"Limite de {self.max_pending} comandos pendentes atingido")
+            record["_started"] = started
+            record["_requester"] = requester
+            self._pending[record["id"]] = record
+            heapq.heappush(self._heap, (started + timeout, record["id"]))
+            self.sent += 1
+        return record
+
+    def _finish(self, record, status):
+        # Chamado com o lock: move o registro para os concluídos e acorda quem espera
+        del self._pending[record["id"]]
+        record["status"] = status
+        self._results[record["id"]] = record
+        while len(self._results) > self._keep_results:
+            self._results.popitem(last=False)
+        self._condition.notify_all()
+
+    def complete(self, command_id, response, received_at=None):
+        """Registra a resposta de um comando; retorna o registro concluído ou None se não estava pendente."""
+        received_at = time.monotonic() if received_at is None else received_at
+        with self._condition:
+            record = self._pending.get(command_id)
+            if record is None:
+                self.late += 1
+                return None
+            record["latency"] = received_at - record["_started"]
+            record["response"] = response
+            self._finish(record, "completed")
+            key = (record["device"], record["type"])
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = collections.deque(maxlen=LATENCY_WINDOW)
+            latencies.append(record["latency"])
+            self.completed += 1
+            return record
+
+    def expire(self, now=None):
+        """Marca como expirados os comandos sem resposta no prazo; retorna os registros."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                _, command_id = heapq.heappop(self._heap)
+                record = self._pending.get(command_id)
+                if record is None:
+                    # Já respondido
+                    continue
+                self._finish(record, "timeout")
+                self.timed_out += 1
+                expired.append(record)
+        return expired
+
+    def wait(self, command_id, timeout):
+        """Espera até `timeout` segundos pela conclusão; retorna o registro (pendente se o tempo acabou)."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while command_id in self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._results.get(command_id) or self._pending.get(command_id)
+
+    def get(self, command_id):
+        with self._condition:
+            return self._results.get(command_id) or self._pending.get(command_id)
+
+    def pending(self):
+        with self._condition:
+            return list(self._pending.values())
+
+    def recent(self, limit=50):
+        with self._condition:
+            return list(self._results.values())[-limit:]
+
+    def latency_stats(self):
+        """Resumo das últimas latências por dispositivo e tipo de comando (segundos)."""
+        with self._condition:
+            snapshot = {key: sorted(values) for key, values in self._latencies.items()}
+        return [{"device": device_id, "type": command_type, "count": len(values),
+                 "p50": _percentile(values, 0.50), "p95": _percentile(values, 0.95), "max": values[-1]}
+                for (device_id, command_type), values in sorted(snapshot.items())]
+
+    def stats(self):
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "sent": self.sent,
+                "completed": self.completed,
+                "timed_out": self.timed_out,
+                "late": self.late,
+            }
+
+
+# Função para gerar a representação pública de um registro (sem os campos internos)
+def public_record(record):
+    return {key: value for key, value in record.items() if not key.startswith("_")}
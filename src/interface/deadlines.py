@@ -0,0 +1,91 @@
+import heapq
+import threading
+import time
+
+
+class DeadlineTracker:
+    """Prazos por chave (ex.: o instante em que um dispositivo fica offline).
+
+    `touch()` (re)define o prazo de uma chave e `expire()` retorna as chaves
+    vencidas, que deixam de ser acompanhadas até o próximo `touch()`. O heap
+    guarda no máximo uma entrada válida por chave: adiar um prazo (o caso
+    comum, a cada mensagem recebida) só atualiza o dicionário, e a entrada
+    antiga é reposta com o prazo atual quando chega ao topo do heap. Assim,
+    cada atualização custa O(1) (O(log n) quando o prazo é antecipado) e
+    `expire()` só examina as chaves cujo prazo registrado já passou.
+    """
+
+    def __init__(self):
+        self._deadlines = {}  # chave -> prazo atual
+        self._armed = {}  # chave -> prazo da sua entrada válida no heap
+        self._heap = []  # (prazo, chave)
+        self._condition = threading.Condition()
+
+        # Métricas
+        self.expired = 0
+
+    def touch(self, key, deadline):
+        """Define o prazo de `key` (substitui o anterior)."""
+        with self._condition:
+            self._deadlines[key] = deadline
+            armed = self._armed.get(key)
+            if armed is not None and armed <= deadline:
+                # A entrada existente vence antes e será reposta com o novo prazo
+                return
+            self._armed[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+            if self._heap[0][1] == key:
+                # Novo prazo mais próximo: acordar quem espera em wait()
+                self._condition.notify_all()
+
+    def cancel(self, key):
+        """Deixa de acompanhar `key` (a entrada no heap é descartada quando chegar ao topo)."""
+        with self._condition:
+            self._deadlines.pop(key, None)
+
+    def expire(self, now=None):
+        """Retorna as chaves cujo prazo passou (prazo <= `now`)."""
+        now = time.time() if now is None else now
+        expired = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                if self._armed.get(key) != deadline:
+                    # Entrada substituída por um prazo mais próximo
+                    continue
+                del self._armed[key]
+                current = self._deadlines.get(key)
+                if current is None:
+                    # Cancelada
+                    continue
+                if current > now:
+                    # Prazo adiado depois que a entrada foi criada
+                    self._armed[key] = current
+                    heapq.heappush(self._heap, (current, key))
+                    continue
+                del self._deadlines[key]
+                expired.append(key)
+            self.expired += len(expired)
+        return expired
+
+    def next_deadline(self):
+        """Prazo mais próximo registrado no heap (pode ser de uma entrada adiada), ou None."""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def wait(self, timeout, now=None):
+        """Espera até o próximo prazo, um prazo mais próximo ser registrado ou `timeout` segundos."""
+        with self._condition:
+            if self._heap:
+                now = time.time() if now is None else now
+                timeout = min(timeout, max(0.0, self._heap[0][0] - now))
+            if timeout > 0:
+                self._condition.wait(timeout)
+
+    def __len__(self):
+        with self._condition:
+            return len(self._deadlines)
+
+    def stats(self):
+        with self._condition:
+            return {"tracked": len(self._deadlines), "heap": len(self._heap), "expired": self.expired}
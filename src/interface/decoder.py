@@ -0,0 +1,259 @@
+import json
+import math
+import struct
+
+# Backend JSON mais rápido, se instalado
+try:
+    import orjson
+
+    def json_loads(payload):
+        return orjson.loads(payload)
+
+    JSON_BACKEND = "orjson"
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    def json_loads(payload):
+        return json.loads(payload.decode() if isinstance(payload, (bytes, bytearray)) else payload)
+
+    JSON_BACKEND = "json"
+    JSONDecodeError = json.JSONDecodeError
+
+# MessagePack é opcional
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Campos priorizados na extração do valor de cada tópico (na ordem de preferência)
+SCHEMAS = {
+    "vibration": ("magnitude", "level", "current_magnitude", "vibration_level"),
+    "temperature": ("temperature",),
+    "humidity": ("humidity",),
+}
+
+# Formato binário fixo (little-endian): versão, código do sensor, timestamp (millis, uint32), valor (float32)
+BINARY_VERSION = 0x01
+BINARY_LAYOUT = struct.Struct("<BBIf")
+SENSOR_CODES = {"vibration": 1, "temperature": 2, "humidity": 3}
+SENSOR_NAMES = {code: name for name, code in SENSOR_CODES.items()}
+
+# Lote binário (little-endian): versão, código do sensor, quantidade (uint16), timestamp da
+# primeira amostra (millis, uint32) e intervalo entre amostras (ms, uint16), seguidos dos valores (float32)
+BATCH_VERSION = 0x02
+BATCH_HEADER = struct.Struct("<BBHIH")
+
+
+class DecodeError(ValueError):
+    """Payload que não pôde ser interpretado."""
+
+
+# Função para detectar o formato do payload pelo primeiro byte
+def detect_format(payload):
+    if not payload:
+        return "empty"
+    first = payload[0]
+    if first in (0x7B, 0x5B, 0x22):  # '{', '[', '"'
+        return "json"
+    if first == BINARY_VERSION and len(payload) == BINARY_LAYOUT.size:
+        return "struct"
+    if first == BATCH_VERSION and is_binary_batch(payload):
+        return "batch"
+    # Mapas (fixmap, map16, map32) e listas (fixarray, array16, array32), ex.: um lote de amostras
+    if msgpack is not None and (0x80 <= first <= 0x9F or first in (0xDC, 0xDD, 0xDE, 0xDF)):
+        return "msgpack"
+    return "text"
+
+
+# Função para verificar se o tamanho do payload corresponde ao cabeçalho de um lote binário
+def is_binary_batch(payload):
+    if len(payload) < BATCH_HEADER.size:
+        return False
+    count = BATCH_HEADER.unpack_from(payload)[2]
+    return len(payload) == BATCH_HEADER.size + 4 * count
+
+
+# Função para ler um lote binário: (código do sensor, timestamp da primeira amostra, intervalo, valores)
+def unpack_batch(payload):
+    _, code, count, timestamp, interval = BATCH_HEADER.unpack_from(payload)
+    return code, timestamp, interval, struct.unpack_from(f"<{count}f", payload, BATCH_HEADER.size)
+
+
+# Função para converter o payload em estrutura Python (dict, número ou texto)
+def parse_payload(payload):
+    """Retorna (formato, dados) sem aplicar o esquema do tópico."""
+    payload_format = detect_format(payload)
+    if payload_format == "json":
+        try:
+            return payload_format, json_loads(payload)
+        except (JSONDecodeError, ValueError) as e:
+            raise DecodeError(f"JSON inválido: {str(e)}")
+    if payload_format == "struct":
+        _, code, timestamp, value = BINARY_LAYOUT.unpack(payload)
+        return payload_format, {"sensor": SENSOR_NAMES.get(code), "timestamp": timestamp, "value": value}
+    if payload_format == "batch":
+        code, timestamp, interval, values = unpack_batch(payload)
+        return payload_format, {"sensor": SENSOR_NAMES.get(code), "timestamp": timestamp,
+                                "interval": interval, "values": list(values)}
+    if payload_format == "msgpack":
+        try:
+            return payload_format, msgpack.unpackb(payload, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise DecodeError(f"MessagePack inválido: {str(e)}")
+    try:
+        text = payload.decode().strip()
+    except UnicodeDecodeError as e:
+        raise DecodeError(f"Payload não é texto: {str(e)}")
+    try:
+        return payload_format, float(text)
+    except ValueError:
+        pass
+    if "," in text:
+        # Lote em texto: valores separados por vírgula (CSV), sem timestamps
+        try:
+            return payload_format, [float(item) for item in text.split(",")]
+        except ValueError:
+            pass
+    return payload_format, text
+
+
+# Função para extrair o valor de um dicionário usando o esquema do tópico
+def extract_value(sensor, data):
+    for key in SCHEMAS.get(sensor, ()):
+        if key in data:
+            return float(data[key])
+    if "value" in data and isinstance(data["value"], (int, float)):
+        return float(data["value"])
+    # Usar o primeiro campo numérico encontrado
+    for key, val in data.items():
+        if isinstance(val, (int, float)) and key != "timestamp":
+            return float(val)
+    return None
+
+
+# Função para ler um campo numérico opcional (ex.: timestamp, intervalo); retorna o número ou None
+def numeric_field(sensor, data, name):
+    value = data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+        raise DecodeError(f"Campo '{name}' não numérico no payload de {sensor}")
+    return value
+
+
+# Função para interpretar uma amostra já convertida (dict ou número); retorna (valor, timestamp)
+def sample_from_data(sensor, data):
+    timestamp = None
+    if isinstance(data, dict):
+        timestamp = numeric_field(sensor, data, "timestamp")
+        try:
+            value = extract_value(sensor, data)
+        except (TypeError, ValueError):
+            raise DecodeError(f"Valor não numérico no payload de {sensor}")
+    else:
+        try:
+            value = float(data)
+        except (TypeError, ValueError):
+            raise DecodeError(f"Payload de {sensor} sem valor numérico")
+    if value is not None and math.isnan(value):
+        raise DecodeError(f"Valor NaN no payload de {sensor}")
+    return value, timestamp
+
+
+# Função para identificar um lote já convertido; retorna a lista de amostras ou None
+def samples_from_batch(sensor, data):
+    if isinstance(data, list):
+        return [sample_from_data(sensor, item) for item in data]
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get("samples"), list):
+        return [sample_from_data(sensor, item) for item in data["samples"]]
+    values = data.get("values")
+    if not isinstance(values, list):
+        return None
+    # Valores igualmente espaçados: "timestamp" é o da primeira amostra e "interval" o espaçamento (ms)
+    start = numeric_field(sensor, data, "timestamp")
+    interval = numeric_field(sensor, data, "interval")
+    samples = []
+    for index, value in enumerate(values):
+        value, _ = sample_from_data(sensor, value)
+        timestamp = start + index * interval if start is not None and interval is not None else None
+        samples.append((value, timestamp))
+    return samples
+
+
+def decode_sample(sensor, payload):
+    """Decodifica uma amostra de sensor.
+
+    Retorna (valor, timestamp do dispositivo em millis ou None); o valor é
+    None se o payload não contém um número utilizável. Levanta DecodeError
+    para payloads malformados. Para um lote, retorna a última amostra.
+    """
+    # Caminho rápido: formato binário fixo, sem montar dicionário
+    if len(payload) == BINARY_LAYOUT.size and payload[0] == BINARY_VERSION:
+        _, _, timestamp, value = BINARY_LAYOUT.unpack(payload)
+        if math.isnan(value):
+            raise DecodeError(f"Valor NaN no payload de {sensor}")
+        return value, timestamp
+
+    samples = decode_samples(sensor, payload)
+    return samples[-1] if samples else (None, None)
+
+
+def decode_samples(sensor, payload):
+    """Decodifica uma ou mais amostras de sensor (amostra única ou lote).
+
+    Lotes aceitos: o formato binário de lote, uma lista JSON/MessagePack de
+    amostras, um objeto com "samples" (lista de amostras), um objeto com
+    "values" (valores igualmente espaçados a partir de "timestamp", a cada
+    "interval" ms) ou valores em texto separados por vírgula. Retorna a lista de (valor, timestamp do dispositivo em
+    millis ou None), na ordem de envio. Levanta DecodeError para payloads
+    malformados.
+    """
+    # Caminho rápido: formatos binários, sem montar dicionário
+    if len(payload) == BINARY_LAYOUT.size and payload[0] == BINARY_VERSION:
+        return [decode_sample(sensor, payload)]
+    if payload and payload[0] == BATCH_VERSION and is_binary_batch(payload):
+        _, timestamp, interval, values = unpack_batch(payload)
+        if any(math.isnan(value) for value in values):
+            raise DecodeError(f"Valor NaN no lote de {sensor}")
+        return [(value, timestamp + index * interval) for index, value in enumerate(values)]
+
+    _, data = parse_payload(payload)
+    samples = samples_from_batch(sensor, data)
+    if samples is not None:
+        return samples
+    return [sample_from_data(sensor, data)]
+
+
+def decode_status(payload):
+    """Decodifica uma mensagem de status; retorna o texto do status ou None."""
+    try:
+        _, data = parse_payload(payload)
+    except DecodeError:
+        return None
+    if isinstance(data, dict):
+        status = data.get("status")
+        return str(status) if status is not None else None
+    if isinstance(data, str):
+        return data
+    return str(data)
+
+
+def decode_object(payload):
+    """Decodifica um payload estruturado (ex.: comandos); retorna dict ou None."""
+    try:
+        _, data = parse_payload(payload)
+    except DecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def encode_struct(sensor, value, timestamp=0):
+    """Codifica uma amostra no formato binário fixo (10 bytes)."""
+    return BINARY_LAYOUT.pack(BINARY_VERSION, SENSOR_CODES[sensor], int(timestamp) & 0xFFFFFFFF, value)
+
+
+def encode_batch(sensor, values, timestamp=0, interval=0):
+    """Codifica amostras igualmente espaçadas no formato binário de lote (10 + 4 bytes por valor)."""
+    header = BATCH_HEADER.pack(BATCH_VERSION, SENSOR_CODES[sensor], len(values), int(timestamp) & 0xFFFFFFFF, int(interval))
+    return header + struct.pack(f"<{len(values)}f", *values)
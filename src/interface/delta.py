@@ -0,0 +1,76 @@
+import collections
+import threading
+
+
+class DeltaBuilder:
+    """Acumula as mudanças de estado para o protocolo incremental do dashboard.
+
+    Cada delta emitido recebe um número de sequência crescente; o cliente
+    compara com o último recebido e pede um snapshot completo se houver lacuna.
+    Um delta contém, por dispositivo, apenas os pontos novos de cada série e
+    os campos escalares (status, alertas, última atualização) que mudaram
+    desde o delta anterior, além de campos globais como a lista de dispositivos.
+
+    Os últimos `history` deltas emitidos ficam guardados para `since()`.
+    """
+
+    def __init__(self, history=0):
+        self._lock = threading.Lock()
+        self.seq = 0
+        self._devices = {}
+        self._fields = {}
+        self._history = collections.deque(maxlen=history)
+
+    def _device_changes(self, device_id):
+        changes = self._devices.get(device_id)
+        if changes is None:
+            changes = self._devices[device_id] = {"points": {}}
+        return changes
+
+    def add_point(self, device_id, series, point):
+        """Registra um ponto novo da série."""
+        with self._lock:
+            self._device_changes(device_id)["points"].setdefault(series, []).append(point)
+
+    def set_field(self, device_id, name, value):
+        """Registra o novo valor de um campo escalar do dispositivo (status, alerts, last_update...)."""
+        with self._lock:
+            self._device_changes(device_id)[name] = value
+
+    def set_global_field(self, name, value):
+        """Registra um campo que não pertence a um dispositivo (ex.: lista de dispositivos)."""
+        with self._lock:
+            self._fields[name] = value
+
+    def has_changes(self):
+        with self._lock:
+            return bool(self._devices or self._fields)
+
+    def build(self):
+        """Retorna o delta pendente com o próximo número de sequência, ou None se vazio."""
+        with self._lock:
+            if not self._devices and not self._fields:
+                return None
+            self.seq += 1
+            delta = {"seq": self.seq, "devices": self._devices}
+            delta.update(self._fields)
+            self._devices = {}
+            self._fields = {}
+            self._history.append(delta)
+            return delta
+
+    def since(self, seq):
+        """Deltas emitidos depois de `seq`, ou None se já não estão todos guardados."""
+        with self._lock:
+            if seq > self.seq:
+                # Sequência de antes de um reinício
+                return None
+            if seq == self.seq:
+                return []
+            if not self._history or self._history[0]["seq"] > seq + 1:
+                return None
+            return [delta for delta in self._history if delta["seq"] > seq]
+
+    def current_seq(self):
+        with self._lock:
+            return self.seq
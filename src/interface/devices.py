@@ -0,0 +1,124 @@
+import threading
+from timeseries import CompressedSeries, RingBuffer
+from downsample import Rollups
+from analytics import VibrationAnalytics
+from clock import ClockSync
+
+# Colunas de cada série além do timestamp
+HISTORY_FIELDS = {
+    "vibration": ("value", "raw_value"),
+    "temperature": ("value",),
+    "humidity": ("value",),
+}
+
+
+class DeviceState:
+    """Estado em memória de um dispositivo: históricos, status e alertas.
+
+    Só o worker de ingestão responsável pelo dispositivo o altera (as mudanças
+    pedidas por outras threads são repassadas a ele, ver `IngestQueue.submit`).
+    O worker altera e os leitores (rotas HTTP, snapshots) copiam o estado com
+    `lock`, um por dispositivo: a leitura de um dispositivo não bloqueia a
+    ingestão dos demais.
+    """
+
+    __slots__ = ("device_id", "history", "rollups", "analytics", "status", "last_update",
+                 "last_data_received", "alerts", "clock", "lock")
+
+    def __init__(self, device_id, capacities, rollup_tiers, analytics_window=256, block_size=None):
+        self.device_id = device_id
+        # Com `block_size`, os históricos guardam os blocos fechados comprimidos
+        self.history = {
+            sensor_type: (RingBuffer(capacities[sensor_type], fields) if block_size is None
+                          else CompressedSeries(capacities[sensor_type], fields, block_size))
+            for sensor_type, fields in HISTORY_FIELDS.items()
+        }
+        # Agregados por camada (1s/10s/1m...) do valor principal de cada série
+        self.rollups = {sensor_type: Rollups(rollup_tiers) for sensor_type in HISTORY_FIELDS}
+        # Métricas da janela deslizante de vibração (magnitude bruta)
+        self.analytics = VibrationAnalytics(analytics_window)
+        self.status = "desconhecido"
+        self.last_update = None
+        self.last_data_received = 0  # Timestamp da última recepção de dados
+        self.alerts = {}  # Alertas ativos (alerts.Alert) indexados pelo tipo
+        # Diferença entre o relógio do dispositivo (millis) e o do servidor
+        self.clock = ClockSync()
+        self.lock = threading.Lock()
+
+    def summary(self):
+        """Resumo leve do dispositivo (sem históricos)."""
+        with self.lock:
+            return {
+                "device": self.device_id,
+                "status": self.status,
+                "last_update": self.last_update,
+                "last_data_received": self.last_data_received,
+                "alerts": len(self.alerts),
+            }
+
+
+class DeviceRegistry:
+    """Registro de dispositivos indexado pelo ID extraído do tópico MQTT.
+
+    A busca é um acesso a dicionário, então o custo por mensagem não depende
+    do número de dispositivos; a memória cresce linearmente, já que cada
+    buffer começa pequeno e só cresce com os dados recebidos.
+    """
+
+    def __init__(self, capacities, rollup_tiers, max_devices=None, analytics_window=256, block_size=None):
+        self.capacities = capacities
+        self.rollup_tiers = rollup_tiers
+        self.analytics_window = analytics_window
+        self.block_size = block_size
+        self.max_devices = max_devices
+        # Copiados a cada novo dispositivo (raro): as leituras não precisam de lock
+        self._devices = {}
+        self._ids = ()
+        self._lock = threading.Lock()  # Apenas entre criações concorrentes
+
+    def __len__(self):
+        return len(self._devices)
+
+    def __contains__(self, device_id):
+        return device_id in self._devices
+
+    def get(self, device_id):
+        return self._devices.get(device_id)
+
+    def get_or_create(self, device_id):
+        """Retorna o estado do dispositivo, criando-o se necessário.
+
+        Retorna None se o limite de dispositivos foi atingido.
+        """
+        device = self._devices.get(device_id)
+        if device is not None:
+            return device
+        with self._lock:
+            device = self._devices.get(device_id)
+            if device is None:
+                if self.max_devices is not None and len(self._devices) >= self.max_devices:
+                    return None
+                device = DeviceState(device_id, self.capacities, self.rollup_tiers, self.analytics_window,
+                                     self.block_size)
+                devices = dict(self._devices)
+                devices[device_id] = device
+                # Dicionário antes da lista: quem vê o ID na lista já o encontra em get()
+                self._devices = devices
+                self._ids = tuple(sorted(devices))
+            return device
+
+    def ids(self):
+        return list(self._ids)
+
+    def devices(self):
+        return list(self._devices.values())
+
+    def history_stats(self):
+        """Pontos e memória ocupada (bytes) pelos históricos de todos os dispositivos."""
+        points = nbytes = 0
+        for device in self.devices():
+            with device.lock:
+                for history in device.history.values():
+                    points += len(history)
+                    nbytes += history.nbytes()
+        return {"points": points, "bytes": nbytes}
@@ -0,0 +1,216 @@
+import numpy as np
+from timeseries import RingBuffer
+
+# Campos guardados por balde de agregação
+ROLLUP_FIELDS = ("min", "max", "mean", "count")
+
+
+# Função para escolher pontos com o algoritmo Largest-Triangle-Three-Buckets
+def lttb_indices(times, values, count):
+    """Retorna os índices dos `count` pontos que melhor preservam a forma da série."""
+    size = len(times)
+    if count >= size or count < 3:
+        return np.arange(size) if count >= size else np.linspace(0, size - 1, max(count, 0)).astype(np.int64)
+
+    x = np.asarray(times, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    # Primeiro e último pontos são sempre mantidos; o restante é dividido em count - 2 baldes
+    edges = np.linspace(1, size - 1, count - 1).astype(np.int64)
+    selected = np.empty(count, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(count - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Média do balde seguinte (ou o último ponto) como terceiro vértice do triângulo
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x = x[next_start:next_end].mean()
+            next_y = y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+# Função para escolher, em cada balde, os pontos de mínimo e máximo
+def minmax_indices(times, values, count):
+    """Retorna até `count` índices (mínimo e máximo de count/2 baldes), em ordem."""
+    size = len(times)
+    if count >= size:
+        return np.arange(size)
+    buckets = max(1, count // 2)
+    y = np.asarray(values, dtype=np.float64)
+    starts = np.linspace(0, size, buckets + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(starts, size)))
+    # Ordenar por (balde, valor) e pegar o primeiro e o último de cada balde
+    order = np.lexsort((y, bucket_of))
+    counts = np.bincount(bucket_of, minlength=buckets)
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    last = first + counts - 1
+    return np.unique(np.concatenate((order[first], order[last])))
+
+
+# Função para escolher os índices de acordo com o método pedido
+def downsample_indices(times, values, count, method="lttb"):
+    if method == "minmax":
+        return minmax_indices(times, values, count)
+    if method == "lttb":
+        return lttb_indices(times, values, count)
+    raise ValueError(f"Método de redução desconhecido: {method}")
+
+
+class RangeReducer:
+    """Reduz uma série lida em lotes a até dois pontos (mínimo e máximo) por intervalo de tempo.
+
+    Divide [start_time, end_time] em `buckets` intervalos iguais; cada lote
+    de linhas (ts, campos...) só atualiza os extremos guardados, então a
+    memória usada depende do número de intervalos e não do de amostras.
+    """
+
+    def __init__(self, start_time, end_time, buckets, fields=("value",)):
+        self.start_time = start_time
+        self.buckets = max(1, int(buckets))
+        self.width = max(end_time - start_time, 1e-9) / self.buckets
+        self.fields = tuple(fields)
+        self.count = 0
+        self._low = np.full(self.buckets, np.inf)
+        self._high = np.full(self.buckets, -np.inf)
+        self._low_rows = np.empty((self.buckets, len(self.fields) + 1))
+        self._high_rows = np.empty((self.buckets, len(self.fields) + 1))
+
+    def add(self, rows):
+        """Acrescenta um lote de linhas (ts, campos...); colunas a mais são ignoradas e None vira NaN."""
+        if not len(rows):
+            return
+        data = np.array(rows, dtype=np.float64)[:, :len(self.fields) + 1]
+        self.count += len(data)
+        bucket = np.clip(((data[:, 0] - self.start_time) / self.width).astype(np.int64), 0, self.buckets - 1)
+        values = data[:, 1]
+        # Ordenar por (intervalo, valor): o primeiro e o último de cada intervalo são os extremos do lote
+        order = np.lexsort((values, bucket))
+        sorted_buckets = bucket[order]
+        firsts = np.flatnonzero(np.concatenate(([True], sorted_buckets[1:] != sorted_buckets[:-1])))
+        lasts = np.concatenate((firsts[1:], [len(order)])) - 1
+        ids = sorted_buckets[firsts]
+        low, high = order[firsts], order[lasts]
+        lower = values[low] < self._low[ids]
+        self._low[ids[lower]] = values[low[lower]]
+        self._low_rows[ids[lower]] = data[low[lower]]
+        higher = values[high] > self._high[ids]
+        self._high[ids[higher]] = values[high[higher]]
+        self._high_rows[ids[higher]] = data[high[higher]]
+
+    def result(self):
+        """Retorna (timestamps, {campo: valores}) dos extremos guardados, em ordem."""
+        filled = np.isfinite(self._low)
+        low, high = self._low_rows[filled], self._high_rows[filled]
+        # Intervalo com um único valor: mínimo e máximo são a mesma linha
+        rows = np.concatenate((low, high[high[:, 0] != low[:, 0]]))
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        return rows[:, 0], {name: rows[:, index + 1] for index, name in enumerate(self.fields)}
+
+
+class RollupTier:
+    """Agregados (mín, máx, média, contagem) de uma série em baldes de largura fixa.
+
+    Atualizado incrementalmente em O(1) por amostra: o balde corrente fica em
+    variáveis e é gravado no buffer circular quando chega uma amostra de um
+    balde posterior.
+    """
+
+    def __init__(self, width, capacity):
+        self.width = width
+        self.buffer = RingBuffer(capacity, ROLLUP_FIELDS)
+        self._start = None
+        self._min = self._max = self._sum = 0.0
+        self._count = 0
+
+    def add(self, timestamp, value):
+        bucket = (timestamp // self.width) * self.width
+        if self._start is None or bucket > self._start:
+            self._seal()
+            self._start = bucket
+            self._min = self._max = value
+            self._sum = value
+            self._count = 1
+            return
+        # Amostras atrasadas entram no balde corrente
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+        self._sum += value
+        self._count += 1
+
+    def _seal(self):
+        if self._count:
+            self.buffer.append(self._start, self._min, self._max, self._sum / self._count, self._count)
+
+    def oldest(self):
+        """Início do balde mais antigo disponível, ou None."""
+        first = self.buffer.first()
+        return first[0] if first is not None else self._start
+
+    def covers(self, start_time, require_coverage=False):
+        """Indica se a camada tem os dados desde `start_time`.
+
+        Sem `require_coverage`, basta que nenhum balde tenha sido descartado
+        (a camada tem tudo o que foi recebido desde o início do processo).
+        """
+        oldest = self.oldest()
+        if oldest is None:
+            return False
+        if oldest <= start_time:
+            return True
+        return not require_coverage and not self.buffer.is_full()
+
+    def range(self, start_time=None, end_time=None):
+        """Retorna (inícios dos baldes, {campo: valores}), incluindo o balde corrente.
+
+        Um balde entra se tem alguma parte no intervalo: inclui o balde que
+        contém `start_time`, mesmo começando antes dele.
+        """
+        lower = None if start_time is None else start_time - self.width
+        times, columns = self.buffer.range(lower, end_time)
+        if lower is not None and len(times) and times[0] <= lower:
+            # Balde que termina exatamente em start_time
+            times = times[1:]
+            columns = {name: column[1:] for name, column in columns.items()}
+        if self._count and (lower is None or self._start > lower) \
+                and (end_time is None or self._start <= end_time):
+            times = np.append(times, self._start)
+            current = {"min": self._min, "max": self._max,
+                       "mean": self._sum / self._count, "count": self._count}
+            columns = {name: np.append(column, current[name]) for name, column in columns.items()}
+        return times, columns
+
+
+class Rollups:
+    """Conjunto de camadas de agregação (ex.: 1s, 10s, 1m) de uma série."""
+
+    def __init__(self, tiers):
+        # tiers: {nome: (largura em segundos, capacidade em baldes)}
+        self.tiers = {name: RollupTier(width, capacity) for name, (width, capacity) in tiers.items()}
+
+    def add(self, timestamp, value):
+        for tier in self.tiers.values():
+            tier.add(timestamp, value)
+
+    def choose(self, start_time, end_time, points, require_coverage=False):
+        """Escolhe a camada mais fina que cubra o intervalo sem exceder muito `points` baldes.
+
+        Retorna o nome da camada ou None se nenhuma cobre o início do intervalo.
+        """
+        span = max(end_time - start_time, 0.0)
+        best = None
+        for name, tier in sorted(self.tiers.items(), key=lambda item: item[1].width):
+            if not tier.covers(start_time, require_coverage):
+                continue
+            best = name
+            if span / tier.width <= points * 4:
+                return name
+        return best
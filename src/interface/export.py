@@ -0,0 +1,308 @@
+"""Exportação do histórico persistente em CSV, NDJSON ou Parquet, em fluxo.
+
+As amostras são lidas dos segmentos em lotes (`HistoryStore.iter_range`) e
+passam por uma cadeia de geradores (lotes -> formato -> gzip opcional), de
+modo que a memória usada não depende do tamanho do intervalo. A ordem é por
+sensor e, dentro de cada sensor, por timestamp; a última linha recebida
+(sensor, ts) é o cursor para continuar uma exportação interrompida
+(`after_sensor` e `after`).
+
+Usado pela rota `/api/devices/<id>/export` e também como linha de comando,
+lendo o diretório do histórico ou baixando de um servidor:
+
+    python src/interface/export.py dev1 --from 2025-01-01 --to 2025-04-01 -o dev1.csv
+    python src/interface/export.py dev1 --url http://localhost:5000 --format ndjson -o dev1.ndjson --resume
+"""
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+
+# Parquet é opcional (requer pyarrow)
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from snapshots import accepted_encodings
+from storage import HistoryStore
+
+# Formatos e tipos de conteúdo
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+COLUMNS = ("device", "sensor", "ts", "value", "raw_value")
+# Sensores exportados pela linha de comando quando --sensors não é informado
+DEFAULT_SENSORS = ("humidity", "temperature", "vibration")
+# Linhas lidas por vez de cada segmento e linhas por row group do Parquet
+EXPORT_BATCH_SIZE = 5000
+PARQUET_ROW_GROUP = 100000
+GZIP_LEVEL = 6
+
+DEFAULT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "history")
+DOWNLOAD_CHUNK = 64 * 1024
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+# Função para gerar (sensor, lote de linhas) do intervalo, a partir do cursor (after_sensor, after)
+def export_rows(store, device_id, sensors, start_time, end_time, after=None, after_sensor=None,
+                batch_size=EXPORT_BATCH_SIZE):
+    for sensor in sorted(sensors):
+        if after_sensor is not None and sensor < after_sensor:
+            continue
+        resume = after if sensor == after_sensor else None
+        for rows in store.iter_range(device_id, sensor, start_time, end_time, resume, batch_size):
+            yield sensor, rows
+
+
+# Funções que convertem os lotes em blocos de bytes de cada formato
+def csv_chunks(device_id, batches, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    for sensor, rows in batches:
+        writer.writerows((device_id, sensor, ts, value, raw_value) for ts, value, raw_value in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(device_id, batches):
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+    for sensor, rows in batches:
+        yield "".join(dumps({"device": device_id, "sensor": sensor, "ts": ts, "value": value,
+                             "raw_value": raw_value}) + "\n"
+                      for ts, value, raw_value in rows).encode()
+
+
+class _ChunkSink:
+    """Arquivo só de escrita para o ParquetWriter: guarda os bytes até `take()`."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(device_id, batches, row_group=PARQUET_ROW_GROUP):
+    if pyarrow is None:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+    schema = pyarrow.schema([("device", pyarrow.string()), ("sensor", pyarrow.string()),
+                             ("ts", pyarrow.float64()), ("value", pyarrow.float64()),
+                             ("raw_value", pyarrow.float64())])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    columns = {name: [] for name in COLUMNS}
+
+    def write_group():
+        writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+        return sink.take()
+
+    for sensor, rows in batches:
+        for ts, value, raw_value in rows:
+            columns["ts"].append(ts)
+            columns["value"].append(value)
+            columns["raw_value"].append(raw_value)
+        columns["device"].extend([device_id] * len(rows))
+        columns["sensor"].extend([sensor] * len(rows))
+        if len(columns["ts"]) >= row_group:
+            yield write_group()
+    if columns["ts"]:
+        yield write_group()
+    writer.close()
+    yield sink.take()
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: cabeçalho gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Função para gerar os blocos de bytes de uma exportação no formato pedido
+def format_chunks(export_format, device_id, batches, header=True):
+    if export_format == "csv":
+        return csv_chunks(device_id, batches, header)
+    if export_format == "ndjson":
+        return ndjson_chunks(device_id, batches)
+    return parquet_chunks(device_id, batches)
+
+
+class ExportStream:
+    """Resposta em fluxo de uma exportação (corpo gerado sob demanda, comprimido com gzip se aceito)."""
+
+    __slots__ = ("chunks", "export_format", "filename")
+
+    def __init__(self, chunks, export_format, filename):
+        self.chunks = chunks
+        self.export_format = export_format
+        self.filename = filename
+
+    @property
+    def content_type(self):
+        return EXPORT_FORMATS[self.export_format]
+
+    def select(self, accept_encoding):
+        """Retorna (blocos, codificação) conforme o Accept-Encoding (o Parquet já é comprimido)."""
+        if self.export_format != "parquet" and "gzip" in accepted_encodings(accept_encoding):
+            return gzip_chunks(self.chunks), "gzip"
+        return self.chunks, None
+
+    def headers(self, encoding):
+        headers = [("Content-Disposition", f'attachment; filename="{self.filename}"'),
+                   ("Cache-Control", "no-store"), ("Vary", "Accept-Encoding")]
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        return headers
+
+
+# Função para ler o cursor (sensor, ts) da última linha completa de um arquivo exportado,
+# descartando uma linha final incompleta; retorna None se não há linhas de dados
+def read_cursor(path, export_format):
+    with open(path, "r+b") as output:
+        size = output.seek(0, os.SEEK_END)
+        tail = b""
+        position = size
+        # Ler do fim em blocos até achar a última linha completa
+        while position > 0 and tail.count(b"\n") < 2:
+            step = min(DOWNLOAD_CHUNK, position)
+            position -= step
+            output.seek(position)
+            tail = output.read(step) + tail
+        end = tail.rfind(b"\n")
+        if end < 0:
+            output.truncate(0)
+            return None
+        output.truncate(position + end + 1)
+        line = tail[tail.rfind(b"\n", 0, end) + 1:end].decode()
+    if export_format == "csv":
+        row = next(csv.reader([line]))
+        if row == list(COLUMNS):
+            return None
+        return row[1], float(row[2])
+    row = json.loads(line)
+    return row["sensor"], row["ts"]
+
+
+# Função para converter um instante da linha de comando (segundos de época ou data ISO 8601)
+def parse_time(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).timestamp()
+
+
+# Função para baixar a exportação de um servidor (com gzip na transferência, descomprimido aqui)
+def download_chunks(url, device_id, params):
+    query = urllib.parse.urlencode({name: value for name, value in params.items() if value is not None})
+    request = urllib.request.Request(f"{url.rstrip('/')}/api/devices/{urllib.parse.quote(device_id)}/export?{query}",
+                                     headers={"Accept-Encoding": "gzip"})
+    try:
+        response = urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        raise SystemExit(f"Erro {e.code}: {e.read().decode(errors='replace')}")
+    decompressor = zlib.decompressobj(31) if response.headers.get("Content-Encoding") == "gzip" else None
+    with response:
+        while True:
+            chunk = response.read(DOWNLOAD_CHUNK)
+            if not chunk:
+                break
+            yield decompressor.decompress(chunk) if decompressor is not None else chunk
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o histórico de um dispositivo (CSV, NDJSON ou Parquet)")
+    parser.add_argument("device")
+    parser.add_argument("--sensors", help="sensores separados por vírgulas (padrão: todos)")
+    parser.add_argument("--from", dest="start", type=parse_time, default=0.0,
+                        help="início (segundos de época ou data ISO 8601; padrão: todo o histórico)")
+    parser.add_argument("--to", dest="end", type=parse_time, help="fim (padrão: agora)")
+    parser.add_argument("--format", choices=tuple(EXPORT_FORMATS), default="csv")
+    parser.add_argument("-o", "--output", help="arquivo de saída (padrão: saída padrão)")
+    parser.add_argument("--gzip", action="store_true", help="gravar a saída comprimida com gzip")
+    parser.add_argument("--resume", action="store_true",
+                        help="continuar a partir da última linha completa de --output (CSV/NDJSON sem --gzip)")
+    parser.add_argument("--url", help="baixar de um servidor (ex.: http://localhost:5000) em vez de ler o disco")
+    parser.add_argument("--data-dir", default=DEFAULT_HISTORY_DIR, help="diretório do histórico (leitura local)")
+    args = parser.parse_args()
+
+    end = time.time() if args.end is None else args.end
+    sensors = args.sensors.split(",") if args.sensors else list(DEFAULT_SENSORS)
+    cursor = None
+    if args.resume:
+        if args.output is None or args.gzip or args.format == "parquet":
+            parser.error("--resume requer --output em CSV ou NDJSON, sem --gzip")
+        if os.path.exists(args.output):
+            cursor = read_cursor(args.output, args.format)
+    appending = args.resume and args.output is not None and os.path.exists(args.output) \
+        and os.path.getsize(args.output) > 0
+    after_sensor, after = cursor if cursor is not None else (None, None)
+
+    if args.url:
+        params = {"format": args.format, "sensors": ",".join(sensors), "from": args.start, "to": end,
+                  "after": after, "after_sensor": after_sensor, "header": "0" if appending else None}
+        chunks = download_chunks(args.url, args.device, params)
+    else:
+        if args.format == "parquet" and not parquet_available():
+            raise SystemExit("Exportação em Parquet requer o pacote pyarrow")
+        store = HistoryStore(args.data_dir)
+        batches = export_rows(store, args.device, sensors, args.start, end, after, after_sensor)
+        chunks = format_chunks(args.format, args.device, batches, header=not appending)
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+
+    output = open(args.output, "ab" if appending else "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import struct
+
+# Resolução dos timestamps codificados: microssegundos (os timestamps são segundos de época em float64)
+TIME_SCALE = 1_000_000
+
+# Faixas do delta-of-delta dos timestamps: (prefixo, bits do prefixo, bits do valor);
+# a última faixa guarda o valor completo em 64 bits
+DOD_RANGES = (
+    (0b10, 2, 8),      # ±128 us
+    (0b110, 3, 14),    # ±8 ms
+    (0b1110, 4, 20),   # ±0,5 s
+)
+DOD_FULL_PREFIX = 0b1111
+MASK_64 = (1 << 64) - 1
+
+_FLOAT = struct.Struct(">d")
+_UINT = struct.Struct(">Q")
+
+
+def quantize_time(timestamp):
+    """Timestamp como será decodificado (resolução de microssegundos)."""
+    return round(timestamp * TIME_SCALE) / TIME_SCALE
+
+
+def _float_bits(value):
+    return _UINT.unpack(_FLOAT.pack(value))[0]
+
+
+def _bits_float(bits):
+    return _FLOAT.unpack(_UINT.pack(bits))[0]
+
+
+def _leading_zeros(value):
+    return 64 - value.bit_length()
+
+
+def _trailing_zeros(value):
+    return (value & -value).bit_length() - 1
+
+
+class BitWriter:
+    """Acumula valores de tamanho arbitrário (em bits) e os converte em bytes."""
+
+    def __init__(self):
+        self._output = bytearray()
+        self._accumulator = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._accumulator = (self._accumulator << bits) | value
+        self._bits += bits
+        if self._bits >= 64:
+            full = self._bits >> 3
+            remainder = self._bits & 7
+            self._output += (self._accumulator >> remainder).to_bytes(full, "big")
+            self._accumulator &= (1 << remainder) - 1
+            self._bits = remainder
+
+    def getvalue(self):
+        """Bytes escritos até aqui (o último byte é completado com zeros)."""
+        padding = -self._bits & 7
+        tail = (self._accumulator << padding).to_bytes((self._bits + padding) >> 3, "big")
+        return bytes(self._output) + tail
+
+
+class BitReader:
+    """Lê valores de tamanho arbitrário (até 64 bits) de um bloco de bytes."""
+
+    def __init__(self, data):
+        # Bytes extras no fim: toda leitura pode buscar 9 bytes a partir da posição atual
+        self._data = bytes(data) + bytes(9)
+        self._position = 0
+
+    def read(self, bits):
+        position = self._position
+        start = position >> 3
+        window = int.from_bytes(self._data[start:start + 9], "big")
+        self._position = position + bits
+        return (window >> (72 - (position & 7) - bits)) & ((1 << bits) - 1)
+
+
+def _signed(value, bits):
+    # Complemento de dois de `bits` bits para inteiro com sinal
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+
+class _ValueEncoder:
+    """Valores float64 codificados pelo XOR com o anterior (bits significativos apenas)."""
+
+    __slots__ = ("previous", "leading", "trailing")
+
+    def __init__(self, writer, first):
+        self.previous = _float_bits(first)
+        self.leading = 65  # Nenhuma janela anterior
+        self.trailing = 0
+        writer.write(self.previous, 64)
+
+    def encode(self, writer, value):
+        bits = _float_bits(value)
+        xor = bits ^ self.previous
+        self.previous = bits
+        if xor == 0:
+            writer.write(0, 1)
+            return
+        leading = min(_leading_zeros(xor), 31)
+        trailing = _trailing_zeros(xor)
+        if leading >= self.leading and trailing >= self.trailing:
+            # Cabe na janela de bits significativos anterior
+            writer.write(0b10, 2)
+            writer.write(xor >> self.trailing, 64 - self.leading - self.trailing)
+            return
+        significant = 64 - leading - trailing
+        writer.write(0b11, 2)
+        writer.write(leading, 5)
+        writer.write(significant - 1, 6)
+        writer.write(xor >> trailing, significant)
+        self.leading = leading
+        self.trailing = trailing
+
+
+def encode_block(times, columns):
+    """Codifica um bloco de pontos (timestamps e colunas de valores) em bytes.
+
+    Timestamps: o primeiro completo, o primeiro delta em 64 bits e, a partir
+    daí, o delta-of-delta em faixas de tamanho variável (um único bit quando
+    o espaçamento se repete). Valores: cada coluna pelo XOR com o valor
+    anterior da mesma coluna, guardando só os bits significativos. Os
+    timestamps têm resolução de microssegundos; os valores são exatos.
+    """
+    count = len(times)
+    if count == 0:
+        return b""
+    writer = BitWriter()
+    timestamp = round(times[0] * TIME_SCALE)
+    writer.write(timestamp & MASK_64, 64)
+    encoders = [_ValueEncoder(writer, column[0]) for column in columns]
+    previous = timestamp
+    delta = None
+    for index in range(1, count):
+        timestamp = round(times[index] * TIME_SCALE)
+        new_delta = timestamp - previous
+        previous = timestamp
+        if delta is None:
+            writer.write(new_delta & MASK_64, 64)
+        else:
+            dod = new_delta - delta
+            if dod == 0:
+                writer.write(0, 1)
+            else:
+                for prefix, prefix_bits, bits in DOD_RANGES:
+                    limit = 1 << (bits - 1)
+                    if -limit <= dod < limit:
+                        writer.write(prefix, prefix_bits)
+                        writer.write(dod & ((1 << bits) - 1), bits)
+                        break
+                else:
+                    writer.write(DOD_FULL_PREFIX, 4)
+                    writer.write(dod & MASK_64, 64)
+        delta = new_delta
+        for encoder, column in zip(encoders, columns):
+            encoder.encode(writer, column[index])
+    return writer.getvalue()
+
+
+def decode_block(data, count, columns=1):
+    """Decodifica um bloco de `encode_block`; retorna (timestamps, [valores de cada coluna]) em listas."""
+    if count == 0:
+        return [], [[] for _ in range(columns)]
+    reader = BitReader(data)
+    read = reader.read
+    timestamp = _signed(read(64), 64)
+    times = [timestamp / TIME_SCALE]
+    previous_bits = [read(64) for _ in range(columns)]
+    values = [[_bits_float(bits)] for bits in previous_bits]
+    windows = [(65, 0)] * columns
+    delta = None
+    for _ in range(1, count):
+        if delta is None:
+            delta = _signed(read(64), 64)
+        elif read(1):
+            # Prefixo 1...10 indica a faixa; 1111 é o valor completo
+            for _, _, bits in DOD_RANGES:
+                if not read(1):
+                    break
+            else:
+                bits = 64
+            delta += _signed(read(bits), bits)
+        timestamp += delta
+        times.append(timestamp / TIME_SCALE)
+        for column in range(columns):
+            if read(1):
+                if read(1):
+                    leading = read(5)
+                    significant = read(6) + 1
+                    trailing = 64 - leading - significant
+                    windows[column] = (leading, trailing)
+                else:
+                    leading, trailing = windows[column]
+                    significant = 64 - leading - trailing
+                previous_bits[column] ^= read(significant) << trailing
+            values[column].append(_bits_float(previous_bits[column]))
+    return times, values
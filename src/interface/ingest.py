@@ -0,0 +1,257 @@
+import collections
+import logging
+import threading
+import time
+
+OVERFLOW_POLICIES = ("drop-oldest", "block", "sample")
+
+# Número de latências recentes usadas no cálculo dos percentis
+LATENCY_WINDOW = 2048
+
+
+class _Shard:
+    """Fila de um worker: deque limitada protegida por uma condição.
+
+    Os contadores do lado do produtor também ficam na fila e são alterados
+    sob a mesma condição; `IngestQueue` soma os de todas as filas.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = collections.deque()
+        self.tasks = collections.deque()  # Tarefas de `submit()`: sem limite e nunca descartadas
+        self.condition = threading.Condition()
+        self.sample_counter = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+
+class IngestQueue:
+    """Fila limitada entre o callback do cliente MQTT e o processamento.
+
+    `put()` é chamado na thread de rede do paho e só enfileira a mensagem; os
+    workers chamam `handler(topic, payload, received_at)`. As mensagens são
+    distribuídas entre os workers pela chave (ID do dispositivo), então as
+    mensagens de um mesmo dispositivo são processadas em ordem e por um único
+    worker, que é o único a alterar o estado do dispositivo; outras threads
+    pedem alterações com `submit()`. Quando a fila enche, a política define o
+    comportamento:
+
+    - ``drop-oldest``: descarta a mensagem mais antiga da fila
+    - ``block``: espera até `block_timeout` segundos e descarta a nova se ainda estiver cheia
+    - ``sample``: acima de metade da capacidade aceita 1 de cada `sample_every` mensagens;
+      cheia, descarta a nova
+    """
+
+    def __init__(self, handler, maxsize=10000, workers=1, policy="drop-oldest",
+                 block_timeout=1.0, sample_every=4):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de descarte desconhecida: {policy}")
+        self.handler = handler
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.sample_every = sample_every
+        shard_size = max(1, maxsize // workers)
+        self._shards = [_Shard(shard_size) for _ in range(workers)]
+        self._threads = []
+        self._running = False
+        self._stats_lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+        # Métricas (enfileiradas, descartadas e profundidade máxima ficam em cada fila)
+        self.processed = 0
+        self.errors = 0
+
+    @property
+    def enqueued(self):
+        return sum(shard.enqueued for shard in self._shards)
+
+    @property
+    def dropped(self):
+        return sum(shard.dropped for shard in self._shards)
+
+    @property
+    def max_depth(self):
+        return max(shard.max_depth for shard in self._shards)
+
+    def put(self, key, topic, payload, received_at=None):
+        """Enfileira uma mensagem; retorna False se ela foi descartada."""
+        received_at = time.time() if received_at is None else received_at
+        shard = self._shards[hash(key) % len(self._shards)]
+        item = (topic, payload, received_at, time.monotonic())
+        with shard.condition:
+            if len(shard.items) >= shard.maxsize:
+                if self.policy == "drop-oldest":
+                    shard.items.popleft()
+                    shard.dropped += 1
+                elif self.policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(shard.items) >= shard.maxsize:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            shard.dropped += 1
+                            return False
+                        shard.condition.wait(remaining)
+                else:
+                    shard.dropped += 1
+                    return False
+            elif self.policy == "sample" and len(shard.items) >= shard.maxsize // 2:
+                shard.sample_counter += 1
+                if shard.sample_counter % self.sample_every:
+                    shard.dropped += 1
+                    return False
+            shard.items.append(item)
+            shard.enqueued += 1
+            depth = len(shard.items)
+            if depth > shard.max_depth:
+                shard.max_depth = depth
+            shard.condition.notify_all()
+        return True
+
+    def submit(self, key, function, *args):
+        """Executa `function(*args)` no worker responsável por `key`, antes das mensagens na fila."""
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.condition:
+            shard.tasks.append((function, args))
+            shard.condition.notify_all()
+
+    def _run_tasks(self, shard):
+        while True:
+            with shard.condition:
+                if not shard.tasks:
+                    return
+                function, args = shard.tasks.popleft()
+            try:
+                function(*args)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                logging.error(f"Erro em tarefa da fila de ingestão: {str(e)}")
+
+    def _worker(self, shard):
+        while True:
+            self._run_tasks(shard)
+            with shard.condition:
+                while self._running and not shard.items and not shard.tasks:
+                    shard.condition.wait()
+                if shard.tasks:
+                    continue
+                if not shard.items:
+                    return
+                topic, payload, received_at, enqueued_at = shard.items.popleft()
+                # Libera produtores bloqueados pela política 'block'
+                shard.condition.notify_all()
+            try:
+                self.handler(topic, payload, received_at)
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                logging.error(f"Erro ao processar mensagem do tópico {topic}: {str(e)}")
+            latency = time.monotonic() - enqueued_at
+            with self._stats_lock:
+                self.processed += 1
+                self._latencies.append(latency)
+
+    def start(self):
+        self._running = True
+        for index, shard in enumerate(self._shards):
+            thread = threading.Thread(target=self._worker, args=(shard,), name=f"ingest-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Para os workers depois de processar o que já está na fila."""
+        self._running = False
+        for shard in self._shards:
+            with shard.condition:
+                shard.condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def depth(self):
+        return sum(len(shard.items) for shard in self._shards)
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            processed, errors = self.processed, self.errors
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "policy": self.policy,
+            "workers": len(self._shards),
+            "capacity": sum(shard.maxsize for shard in self._shards),
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": processed,
+            "dropped": self.dropped,
+            "errors": errors,
+            "latency_p50": percentile(0.50),
+            "latency_p99": percentile(0.99),
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class InlineIngest:
+    """Processa cada mensagem na própria thread (ou laço asyncio) que a recebeu.
+
+    Mesma interface de IngestQueue, para o modo assíncrono do servidor, em que
+    o processamento roda no laço de eventos sem threads de trabalho.
+    """
+
+    policy = "inline"
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def put(self, key, topic, payload, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        start = time.monotonic()
+        self.enqueued += 1
+        try:
+            self.handler(topic, payload, received_at)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Erro ao processar mensagem do tópico {topic}: {str(e)}")
+        self.processed += 1
+        self._latencies.append(time.monotonic() - start)
+        return True
+
+    def submit(self, key, function, *args):
+        function(*args)
+
+    def start(self):
+        pass
+
+    def stop(self, timeout=None):
+        pass
+
+    def depth(self):
+        return 0
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        return {
+            "policy": self.policy,
+            "workers": 0,
+            "depth": 0,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else None,
+            "latency_max": latencies[-1] if latencies else None,
+        }
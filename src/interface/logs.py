@@ -0,0 +1,37 @@
+import json
+import logging
+import os
+import sys
+
+# Com IOT_LOG_FORMAT=json (definido pelo supervisor em main.py), cada registro
+# vira uma linha JSON, repassada pelo supervisor sem análise do texto
+LOG_FORMAT_ENV = "IOT_LOG_FORMAT"
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro de log como um objeto JSON em uma única linha."""
+
+    def format(self, record):
+        data = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+# Função para configurar os logs do processo: texto no terminal, ou JSON quando supervisionado
+def configure_logging(level=logging.WARNING):
+    if os.environ.get(LOG_FORMAT_ENV) == "json":
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        logging.basicConfig(level=level, handlers=[handler])
+        # Avisos do Python (warnings) também como registros JSON
+        logging.captureWarnings(True)
+    else:
+        logging.basicConfig(level=level, format=TEXT_FORMAT)
@@ -0,0 +1,282 @@
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# Sufixo dos identificadores de cliente (padrão: nome da máquina); permite rodar
+# duas instâncias na mesma máquina sem que uma derrube a sessão da outra
+CLIENT_SUFFIX_ENV = "IOT_MQTT_CLIENT_SUFFIX"
+
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    qos INTEGER NOT NULL,
+    retain INTEGER NOT NULL,
+    created REAL NOT NULL
+)
+"""
+
+
+# Função para gerar um identificador de cliente estável (o mesmo a cada execução),
+# necessário para que o broker reconheça a sessão persistente
+def stable_client_id(prefix):
+    suffix = os.environ.get(CLIENT_SUFFIX_ENV) or socket.gethostname()
+    suffix = "".join(char for char in suffix if char.isalnum() or char in "-_")
+    return f"{prefix}-{suffix}"
+
+
+class Backoff:
+    """Espera exponencial com variação aleatória entre as tentativas de reconexão.
+
+    A espera de cada tentativa é sorteada entre `minimum` e o limite atual, que
+    dobra a cada falha até `maximum`; assim, clientes derrubados pela mesma
+    queda do broker não reconectam todos no mesmo instante.
+    """
+
+    def __init__(self, minimum=1.0, maximum=60.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempts = 0
+
+    def next(self):
+        limit = min(self.maximum, self.minimum * 2 ** self.attempts)
+        self.attempts += 1
+        return random.uniform(self.minimum, limit)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class Spool:
+    """Fila em disco (SQLite) das publicações feitas enquanto o cliente está desconectado.
+
+    Sobrevive a reinícios do processo; acima de `max_messages`, as mais antigas
+    são descartadas. O arquivo só é criado na primeira publicação guardada.
+    """
+
+    def __init__(self, path, max_messages=10000):
+        self.path = path
+        self.max_messages = max_messages
+        self._connection = None
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.dropped = 0
+
+    def _db(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(SPOOL_SCHEMA)
+        return self._connection
+
+    def put(self, topic, payload, qos, retain):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._lock:
+            db = self._db()
+            excess = self._depth(db) - self.max_messages + 1
+            if excess > 0:
+                db.execute("DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (excess,))
+                self.dropped += excess
+            db.execute("INSERT INTO spool (topic, payload, qos, retain, created) VALUES (?, ?, ?, ?, ?)",
+                       (topic, payload, qos, int(retain), time.time()))
+
+    def peek(self, limit=100):
+        """Retorna as mensagens mais antigas: (id, tópico, payload, qos, retain)."""
+        if self._connection is None and not os.path.exists(self.path):
+            return []
+        with self._lock:
+            return self._db().execute("SELECT id, topic, payload, qos, retain FROM spool ORDER BY id LIMIT ?",
+                                      (limit,)).fetchall()
+
+    def remove_through(self, message_id):
+        with self._lock:
+            self._db().execute("DELETE FROM spool WHERE id <= ?", (message_id,))
+
+    def _depth(self, db):
+        return db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def depth(self):
+        if self._connection is None and not os.path.exists(self.path):
+            return 0
+        with self._lock:
+            return self._depth(self._db())
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class MqttSession:
+    """Conexão MQTT resiliente usada pelo dashboard e pelo receptor.
+
+    Envolve um cliente paho já configurado (callbacks definidos antes):
+
+    - mantém a conexão com `run_forever()`, reconectando com `Backoff`
+    - com sessão persistente (clean_session=False) e identificador estável, o
+      broker guarda as mensagens QoS 1 enquanto o cliente está fora
+    - `publish()` sem conexão grava no `Spool`; as mensagens guardadas são
+      enviadas em ordem assim que a conexão volta
+    - mede as quedas: quantidade, duração da última e tempo total desconectado
+    """
+
+    def __init__(self, client, qos=1, spool=None, backoff=None):
+        self.client = client
+        self.qos = qos
+        self.spool = spool
+        self.backoff = backoff or Backoff()
+        self._on_connect = client.on_connect
+        self._on_disconnect = client.on_disconnect
+        client.on_connect = self._handle_connect
+        client.on_disconnect = self._handle_disconnect
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._running = False
+        self._spool_pending = spool is not None and spool.depth() > 0
+        self.connected = False
+        self._down_since = None
+
+        # Métricas
+        self.connects = 0
+        self.outages = 0
+        self.last_outage_seconds = None
+        self.outage_seconds_total = 0.0
+        self.published = 0
+        self.spooled = 0
+        self.lost = 0
+
+    def _handle_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            with self._lock:
+                self.connected = True
+                self.connects += 1
+                if self._down_since is not None:
+                    outage = time.monotonic() - self._down_since
+                    self._down_since = None
+                    self.outages += 1
+                    self.last_outage_seconds = outage
+                    self.outage_seconds_total += outage
+                    logging.warning(f"Conexão MQTT restabelecida após {outage:.1f}s "
+                                    f"(sessão mantida pelo broker: {'sim' if flags.get('session present') else 'não'})")
+            self.backoff.reset()
+        if self._on_connect is not None:
+            self._on_connect(client, userdata, flags, rc)
+        if rc == 0 and self._spool_pending:
+            self.flush_spool()
+
+    def _handle_disconnect(self, client, userdata, rc):
+        self._mark_down()
+        if self._on_disconnect is not None:
+            self._on_disconnect(client, userdata, rc)
+
+    def _mark_down(self):
+        with self._lock:
+            if self.connected:
+                self.connected = False
+                self._down_since = time.monotonic()
+
+    def publish(self, topic, payload, retain=False):
+        """Publica com o QoS configurado; sem conexão, guarda no spool (se houver)."""
+        if self.connected and not self._spool_pending:
+            info = self.client.publish(topic, payload, qos=self.qos, retain=retain)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.published += 1
+                return True
+        if self.spool is None:
+            self.lost += 1
+            return False
+        # Atrás das mensagens já guardadas, para manter a ordem
+        self.spool.put(topic, payload, self.qos, retain)
+        self.spooled += 1
+        self._spool_pending = True
+        if self.connected:
+            self.flush_spool()
+        return False
+
+    def flush_spool(self):
+        """Envia as mensagens guardadas, da mais antiga para a mais nova."""
+        with self._flush_lock:
+            while self.connected:
+                batch = self.spool.peek()
+                if not batch:
+                    self._spool_pending = False
+                    return
+                sent_through = None
+                for message_id, topic, payload, qos, retain in batch:
+                    # A partir daqui a mensagem fica com o paho (reenviada por ele se a conexão cair)
+                    if self.client.publish(topic, payload, qos=qos, retain=bool(retain)).rc != mqtt.MQTT_ERR_SUCCESS:
+                        break
+                    sent_through = message_id
+                    self.published += 1
+                if sent_through is None:
+                    return
+                self.spool.remove_through(sent_through)
+
+    def run_forever(self, host, port, keepalive=60):
+        """Conecta e mantém a conexão até `stop()` (bloqueante)."""
+        self._stopping.clear()
+        self._running = True
+        try:
+            self._run(host, port, keepalive)
+        finally:
+            self._running = False
+
+    def _run(self, host, port, keepalive):
+        self.client.connect_async(host, port, keepalive)
+        while not self._stopping.is_set():
+            try:
+                self.client.reconnect()
+            except (OSError, ValueError) as e:
+                delay = self.backoff.next()
+                logging.error(f"Falha na conexão com o broker {host}:{port}: {str(e)}; nova tentativa em {delay:.1f}s")
+                self._stopping.wait(delay)
+                continue
+            while not self._stopping.is_set():
+                if self.client.loop(timeout=1.0) != mqtt.MQTT_ERR_SUCCESS:
+                    break
+            # O paho nem sempre chama on_disconnect quando a conexão é recusada
+            self._mark_down()
+            if not self._stopping.is_set():
+                delay = self.backoff.next()
+                logging.warning(f"Conexão MQTT perdida; reconectando em {delay:.1f}s")
+                self._stopping.wait(delay)
+
+    def stop(self):
+        """Encerra `run_forever()` com um DISCONNECT (a sessão persistente continua no broker)."""
+        self._stopping.set()
+        self.client.disconnect()
+        if not self._running:
+            # Laço já encerrado (ex.: Ctrl+C): enviar aqui as publicações pendentes e o DISCONNECT
+            for _ in range(10):
+                if not self.client.want_write() or self.client.loop_write() != mqtt.MQTT_ERR_SUCCESS:
+                    break
+        if self.spool is not None:
+            self.spool.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connected": self.connected,
+                "qos": self.qos,
+                "connects": self.connects,
+                "outages": self.outages,
+                "last_outage_seconds": self.last_outage_seconds,
+                "outage_seconds_total": self.outage_seconds_total,
+                "published": self.published,
+                "spooled": self.spooled,
+                "spool_depth": self.spool.depth() if self.spool is not None else 0,
+                "spool_dropped": self.spool.dropped if self.spool is not None else 0,
+                "lost": self.lost,
+            }
@@ -0,0 +1,402 @@
+"""Caminho de ingestão do dashboard: de uma mensagem MQTT ao estado dos dispositivos.
+
+`IngestPipeline.handle_message(topic, payload, received_at)` decodifica o
+payload, alinha os timestamps, grava os pontos (memória, delta e disco),
+atualiza status e prazos de offline e avalia as regras de alerta. Não
+depende do servidor web nem do cliente MQTT: app.py monta o caminho com o
+estado do dashboard, e `create_pipeline()` monta um caminho independente,
+usado pela reprodução local de gravações (traffic.py).
+
+Todos os instantes vêm de `received_at` (ou do instante passado a
+`check_offline_devices`), então uma reprodução pode usar a linha do tempo
+da gravação.
+"""
+import logging
+import math
+import os
+import time
+
+from alerts import AlertEngine, load_rules
+from deadlines import DeadlineTracker
+from decoder import DecodeError, decode_samples, decode_status
+from delta import DeltaBuilder
+from devices import DeviceRegistry
+from metrics import LogSampler, Registry
+
+# Regras de alerta (limites com histerese, taxa de variação e janelas N de M)
+ALERT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alert_rules.json")
+
+# Janela (amostras) das métricas de vibração: RMS, pico a pico, fator de crista e espectro
+ANALYTICS_WINDOW = 256
+ANALYTICS_FIELDS = {"rms", "peak_to_peak", "crest_factor", "mean"}
+
+# Tempo máximo sem dados para considerar um dispositivo offline (segundos)
+OFFLINE_THRESHOLD = 15
+# Limites do histograma do atraso na detecção de dispositivos offline (segundos)
+OFFLINE_DETECTION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Valor máximo de magnitude do sensor (para remapeamento)
+VIBRATION_MAX_SENSOR = 3.464102
+VIBRATION_MAX_SCALE = 9.0  # Escala máxima desejada
+
+# Espaçamento mínimo entre amostras de uma série (segundos): mantém os timestamps estritamente
+# crescentes quando várias amostras chegam sem timestamp do dispositivo ou no mesmo milissegundo
+MIN_SAMPLE_SPACING = 0.001
+
+# Logs por amostra só em nível DEBUG, e apenas 1 a cada LOG_SAMPLE_EVERY amostras
+LOG_SAMPLE_EVERY = 100
+
+
+# Função para remapear valores de vibração para a escala 0-9
+def remap_vibration(value):
+    # Garantir que o valor está dentro do intervalo esperado
+    value = max(0, min(value, VIBRATION_MAX_SENSOR))
+    # Aplicar regra de três para remapear
+    return (value / VIBRATION_MAX_SENSOR) * VIBRATION_MAX_SCALE
+
+
+# Função para montar um ponto no formato enviado ao dashboard
+def make_point(fields, timestamp, values):
+    point = {"t": timestamp, "time": time.strftime("%H:%M:%S", time.localtime(timestamp))}
+    for name, value in zip(fields, values):
+        point[name] = value
+    return point
+
+
+def _run_now(key, function, *args):
+    function(*args)
+
+
+class IngestPipeline:
+    """Processa as mensagens recebidas e mantém o estado dos dispositivos.
+
+    `submit(chave, função, *args)` executa uma alteração no worker do
+    dispositivo (`IngestQueue.submit`; por padrão, na hora) e `notify()`
+    agenda o envio das mudanças acumuladas em `delta_builder` (por padrão,
+    nada). `on_alerts_changed(dispositivo)` é chamado, no worker do
+    dispositivo, sempre que a lista de alertas dele muda. Sem
+    `history_store`, os pontos ficam só em memória. As métricas do caminho
+    são registradas em `metrics`.
+    """
+
+    def __init__(self, registry, delta_builder, history_store, alert_engine, deadlines, metrics,
+                 submit=_run_now, notify=None, offline_threshold=OFFLINE_THRESHOLD, on_alerts_changed=None):
+        self.registry = registry
+        self.delta_builder = delta_builder
+        self.history_store = history_store
+        self.alert_engine = alert_engine
+        self.deadlines = deadlines
+        self.submit = submit
+        self.notify = notify if notify is not None else (lambda: None)
+        self.offline_threshold = offline_threshold
+        self.on_alerts_changed = on_alerts_changed
+        # Métricas da janela só são calculadas se alguma regra as usa
+        self.alerts_use_analytics = any(field in ANALYTICS_FIELDS or field.startswith("band_")
+                                        for field in alert_engine.fields("vibration"))
+        self.sample_log = LogSampler(LOG_SAMPLE_EVERY)
+
+        # Métricas
+        self.metric_samples = metrics.counter("iot_samples_total", "Amostras gravadas no histórico (um lote traz várias)", ("sensor",))
+        self.metric_decode_failures = metrics.counter("iot_decode_failures_total", "Payloads que não puderam ser decodificados", ("sensor",))
+        self.metric_decode_seconds = metrics.histogram("iot_decode_seconds", "Tempo de decodificação dos payloads", ("sensor",))
+        self.metric_process_seconds = metrics.histogram("iot_process_seconds", "Tempo total de processamento de uma mensagem", ("sensor",))
+        self.metric_history_seconds = metrics.histogram("iot_history_insert_seconds", "Tempo de inserção de um ponto no histórico", ("sensor",))
+        self.metric_alert_seconds = metrics.histogram("iot_alert_evaluation_seconds", "Tempo de avaliação das regras de alerta", ("sensor",))
+        self.metric_offline_delay = metrics.histogram("iot_offline_detection_delay_seconds",
+                                                      "Atraso entre o fim do prazo sem dados e a marcação como offline",
+                                                      buckets=OFFLINE_DETECTION_BUCKETS)
+
+    # --- Estado dos dispositivos ------------------------------------------------
+
+    def get_device(self, device_id):
+        """Obtém (ou registra) o estado de um dispositivo; None se o limite foi atingido."""
+        known = device_id in self.registry
+        device = self.registry.get_or_create(device_id)
+        if device is None:
+            logging.error(f"Limite de {self.registry.max_devices} dispositivos atingido; ignorando {device_id}")
+        elif not known:
+            logging.warning(f"Novo dispositivo registrado: {device_id}")
+            self.delta_builder.set_global_field("device_list", self.registry.ids())
+        return device
+
+    def set_status(self, device, status):
+        device.status = status
+        self.delta_builder.set_field(device.device_id, "status", status)
+
+    def set_last_update(self, device, current_time):
+        device.last_update = current_time
+        self.delta_builder.set_field(device.device_id, "last_update", current_time)
+
+    def reset_status(self, device):
+        """Volta o status a "desconhecido" (roda no worker do dispositivo)."""
+        with device.lock:
+            self.set_status(device, "desconhecido")
+
+    def mark_alerts_changed(self, device):
+        """Registra que a lista de alertas do dispositivo mudou."""
+        self.delta_builder.set_field(device.device_id, "alerts", [alert.to_dict() for alert in device.alerts.values()])
+        if self.on_alerts_changed is not None:
+            self.on_alerts_changed(device)
+
+    # --- Mensagens ----------------------------------------------------------------
+
+    def handle_message(self, topic, payload, received_at):
+        """Processa uma mensagem recebida (executado pelos workers da fila de ingestão)."""
+        start = time.perf_counter()
+        sensor = None
+        try:
+            # O tópico tem o formato <dispositivo>/<sensor>
+            device_id, _, sensor = topic.rpartition("/")
+            if not device_id:
+                return
+            device = self.get_device(device_id)
+            if device is None:
+                return
+
+            # Só o worker deste dispositivo grava no seu estado; o lock protege os leitores
+            # (API e broadcast) de verem uma atualização pela metade
+            with device.lock:
+                # Usar o instante de recepção (e não o de processamento) como timestamp
+                now = received_at
+                current_time = time.strftime("%H:%M:%S", time.localtime(now))
+
+                # Atualizar timestamp de última recepção de dados e o prazo para ficar offline
+                device.last_data_received = now
+                self.deadlines.touch(device_id, now + self.offline_threshold)
+
+                # Assumir que o dispositivo está online se recebemos qualquer dado
+                # (exceto mensagens de status, que trazem o próprio status)
+                if sensor != "status" and device.status != "online":
+                    self.set_status(device, "online")
+                    logging.warning(f"Status de {device_id} atualizado para 'online' devido a recepção de dados")
+
+                # Processar o payload com base no tópico
+                if sensor == "vibration":
+                    self.process_vibration_data(device, payload, now)
+
+                elif sensor == "temperature":
+                    self.process_temperature_data(device, payload, now)
+
+                elif sensor == "humidity":
+                    self.process_humidity_data(device, payload, now)
+
+                elif sensor == "status":
+                    self.process_status_data(device, payload)
+
+                # Atualiza a hora da última atualização
+                self.set_last_update(device, current_time)
+
+            # Remover alertas expirados
+            self.expire_alerts(now)
+
+            # Agendar o envio das mudanças no próximo quadro
+            self.notify()
+
+        except Exception as e:
+            logging.error(f"Erro ao processar mensagem do tópico {topic}: {str(e)}")
+        finally:
+            if sensor is not None:
+                self.metric_process_seconds.observe(time.perf_counter() - start, sensor)
+
+    def timed_decode(self, sensor, payload):
+        """Decodifica as amostras registrando duração e falhas."""
+        start = time.perf_counter()
+        try:
+            return decode_samples(sensor, payload)
+        except DecodeError:
+            self.metric_decode_failures.inc(sensor)
+            raise
+        finally:
+            self.metric_decode_seconds.observe(time.perf_counter() - start, sensor)
+
+    def align_timestamps(self, device, sensor_type, samples, received_at):
+        """Converte os timestamps do dispositivo (millis) em instantes do servidor (segundos).
+
+        Os instantes ficam estritamente crescentes na série; amostras sem
+        timestamp ficam com o instante de recepção.
+        """
+        device_times = [timestamp for _, timestamp in samples if isinstance(timestamp, (int, float))]
+        if device_times:
+            # Uma medida por mensagem: a da amostra mais recente, enviada logo antes da publicação
+            device.clock.observe(max(device_times) / 1000.0, received_at)
+        last = device.history[sensor_type].last()
+        previous = last[0] if last is not None else 0.0
+        aligned = []
+        for value, timestamp in samples:
+            if isinstance(timestamp, (int, float)):
+                instant = min(device.clock.to_server(timestamp / 1000.0), received_at)
+            else:
+                instant = received_at
+            instant = max(instant, previous + MIN_SAMPLE_SPACING)
+            aligned.append((value, instant))
+            previous = instant
+        return aligned
+
+    def process_vibration_data(self, device, payload, received_at):
+        """Processa dados de vibração (uma amostra ou um lote)."""
+        # Tentar extrair as amostras do payload (JSON, binário ou texto)
+        try:
+            samples = self.timed_decode("vibration", payload)
+        except DecodeError:
+            samples = [(None, None)]
+
+        for raw_value, timestamp in self.align_timestamps(device, "vibration", samples, received_at):
+            if raw_value is None:
+                raw_value = 0.0
+
+            # Remapear o valor para a escala 0-9
+            remapped_value = remap_vibration(raw_value)
+
+            # Adicionar dados ao histórico
+            self.record_point(device, "vibration", timestamp, (remapped_value, raw_value))
+
+            if self.sample_log():
+                logging.debug(f"Dado de magnitude processado: valor original={raw_value}, remapeado={remapped_value:.2f}")
+
+    def process_temperature_data(self, device, payload, received_at):
+        """Processa dados de temperatura (uma amostra ou um lote)."""
+        # Tentar extrair as amostras do payload (JSON, binário ou texto)
+        try:
+            samples = [sample for sample in self.timed_decode("temperature", payload) if sample[0] is not None]
+        except DecodeError as e:
+            logging.error(f"Erro ao processar dados de temperatura: {str(e)}")
+            return
+        if not samples:
+            logging.error("Não foi possível encontrar valor de temperatura válido no payload")
+            return
+
+        # Adicionar dados ao histórico
+        for value, timestamp in self.align_timestamps(device, "temperature", samples, received_at):
+            self.add_data_to_history(device, "temperature", value, timestamp)
+
+        if self.sample_log():
+            logging.debug(f"Dado de temperatura recebido de {device.device_id}: {value}°C (Total: {len(device.history['temperature'])} pontos)")
+
+    def process_humidity_data(self, device, payload, received_at):
+        """Processa dados de umidade (uma amostra ou um lote)."""
+        # Tentar extrair as amostras do payload (JSON, binário ou texto)
+        try:
+            samples = [sample for sample in self.timed_decode("humidity", payload) if sample[0] is not None]
+        except DecodeError as e:
+            logging.error(f"Erro ao processar dados de umidade: {str(e)}")
+            return
+        if not samples:
+            logging.error("Não foi possível encontrar valor de umidade válido no payload")
+            return
+
+        # Adicionar dados ao histórico
+        for value, timestamp in self.align_timestamps(device, "humidity", samples, received_at):
+            self.add_data_to_history(device, "humidity", value, timestamp)
+
+        if self.sample_log():
+            logging.debug(f"Dado de umidade recebido de {device.device_id}: {value}% (Total: {len(device.history['humidity'])} pontos)")
+
+    def process_status_data(self, device, payload):
+        """Processa uma mensagem de status."""
+        status = decode_status(payload)
+        if status is not None:
+            self.set_status(device, status)
+            if status == "offline":
+                # Desligamento ou last will: já está offline, sem esperar o prazo
+                self.deadlines.cancel(device.device_id)
+
+        logging.warning(f"Status de {device.device_id} atualizado explicitamente: {device.status}")
+
+    # --- Histórico e alertas ------------------------------------------------------
+
+    def add_data_to_history(self, device, sensor_type, value, timestamp):
+        """Adiciona um valor ao histórico, validando a série e o valor."""
+        # Verificar se temos um buffer válido para este tipo de sensor
+        history = device.history.get(sensor_type)
+        if history is None:
+            logging.error(f"Tipo de sensor inválido ou buffer não inicializado: {sensor_type}")
+            return
+
+        # Validar o valor
+        if not isinstance(value, (int, float)) or math.isnan(value):
+            logging.error(f"Valor inválido para adicionar ao histórico: {value}")
+            return
+
+        self.record_point(device, sensor_type, timestamp, (value,))
+
+    def record_point(self, device, sensor_type, timestamp, values):
+        """Registra um ponto no histórico em memória, no delta e no disco, e avalia os alertas da série."""
+        start = time.perf_counter()
+        history = device.history[sensor_type]
+        history.append(timestamp, *values)
+        self.metric_samples.inc(sensor_type)
+        self.delta_builder.add_point(device.device_id, sensor_type, make_point(history.fields, timestamp, values))
+        device.rollups[sensor_type].add(timestamp, values[0])
+        if self.history_store is not None:
+            self.history_store.append(device.device_id, sensor_type, timestamp, *values)
+        inserted = time.perf_counter()
+        self.metric_history_seconds.observe(inserted - start, sensor_type)
+        sample = dict(zip(history.fields, values))
+        if sensor_type == "vibration":
+            device.analytics.add(timestamp, sample["raw_value"])
+            if self.alerts_use_analytics:
+                sample.update(device.analytics.metrics())
+        # Avaliar apenas as regras de alerta da série que mudou
+        if self.alert_engine.evaluate(device, sensor_type, timestamp, sample):
+            self.mark_alerts_changed(device)
+        self.metric_alert_seconds.observe(time.perf_counter() - inserted, sensor_type)
+
+    def expire_alerts(self, now):
+        """Remove os alertas expirados; a remoção roda no worker de cada dispositivo afetado."""
+        for device, alert_types in self.alert_engine.expire(now):
+            self.submit(device.device_id, self.prune_alerts, device, alert_types, now)
+
+    def prune_alerts(self, device, alert_types, now):
+        with device.lock:
+            changed = self.alert_engine.prune(device, alert_types, now)
+            if changed:
+                self.mark_alerts_changed(device)
+        if changed:
+            self.notify()
+
+    # --- Dispositivos offline -----------------------------------------------------
+
+    def check_offline_devices(self, current_time):
+        """Marca como offline os dispositivos cujo prazo (`offline_threshold` segundos sem dados) venceu."""
+        self.expire_alerts(current_time)
+        for device_id in self.deadlines.expire(current_time):
+            device = self.registry.get(device_id)
+            if device is not None:
+                self.submit(device_id, self.mark_offline, device, current_time)
+
+    def is_stale(self, device, current_time):
+        """Indica se o dispositivo está sem dados há `offline_threshold` segundos ou mais e não está offline."""
+        last_received = device.last_data_received
+        return (last_received > 0 and (current_time - last_received) >= self.offline_threshold
+                and device.status != "offline")
+
+    def mark_offline(self, device, current_time):
+        """Marca o dispositivo como offline (roda no worker do dispositivo).
+
+        Dados podem ter chegado depois da verificação, por isso a condição é
+        conferida de novo.
+        """
+        with device.lock:
+            if not self.is_stale(device, current_time):
+                return
+            self.set_status(device, "offline")
+            silence = int(current_time - device.last_data_received)
+            delay = time.time() - (device.last_data_received + self.offline_threshold)
+        self.metric_offline_delay.observe(max(0.0, delay))
+        logging.warning(f"Status de {device.device_id} atualizado para 'offline' - sem dados há {silence} segundos")
+        # Agendar o envio da atualização no próximo quadro
+        self.notify()
+
+
+def create_pipeline(history_store, capacities, max_devices=None, rules_file=ALERT_RULES_FILE,
+                    offline_threshold=OFFLINE_THRESHOLD, on_alerts_changed=None):
+    """Monta um caminho de ingestão independente, com registro, delta, regras e prazos próprios.
+
+    Sem camadas de agregação em memória; as alterações rodam na hora (sem
+    workers) e as métricas ficam em um registro próprio. `history_store`
+    pode ser None (sem gravação em disco).
+    """
+    registry = DeviceRegistry(capacities, {}, max_devices=max_devices, analytics_window=ANALYTICS_WINDOW)
+    return IngestPipeline(registry, DeltaBuilder(), history_store, AlertEngine(load_rules(rules_file)),
+                          DeadlineTracker(), Registry(), offline_threshold=offline_threshold,
+                          on_alerts_changed=on_alerts_changed)
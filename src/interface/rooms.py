@@ -0,0 +1,171 @@
+import threading
+
+# Resoluções das assinaturas: largura do intervalo (segundos) com no máximo um ponto por série
+RESOLUTIONS = {"raw": 0, "1s": 1, "10s": 10}
+
+
+class Subscription:
+    """O que um cliente do dashboard exibe: um dispositivo, um conjunto de séries e uma resolução."""
+
+    __slots__ = ("device", "sensors", "resolution")
+
+    def __init__(self, device, sensors, resolution="raw"):
+        self.device = device
+        self.sensors = tuple(sorted(set(sensors)))
+        self.resolution = resolution
+
+    @property
+    def room(self):
+        # Clientes com a mesma assinatura compartilham a sala (e o quadro serializado)
+        return f"{self.device}|{','.join(self.sensors)}|{self.resolution}"
+
+    @property
+    def width(self):
+        return RESOLUTIONS[self.resolution]
+
+    def to_dict(self):
+        return {"device": self.device, "sensors": list(self.sensors), "resolution": self.resolution}
+
+
+def parse_subscription(args, device_id, all_sensors):
+    """Monta a assinatura de `args` ('sensors' em lista ou separado por vírgulas, 'resolution').
+
+    `device_id` é o dispositivo já resolvido; sem 'sensors', assina todas as séries.
+    Levanta ValueError para séries ou resoluções desconhecidas.
+    """
+    sensors = args.get('sensors') or list(all_sensors)
+    if isinstance(sensors, str):
+        sensors = [name for name in sensors.split(',') if name]
+    unknown = [name for name in sensors if name not in all_sensors]
+    if unknown or not sensors:
+        raise ValueError(f"Séries inválidas: {', '.join(map(str, unknown)) or 'nenhuma'}")
+    resolution = args.get('resolution') or "raw"
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Resolução inválida: {resolution}")
+    return Subscription(device_id, sensors, resolution)
+
+
+def decimate_points(points, width, last_bucket=None):
+    """Mantém o primeiro ponto de cada intervalo de `width` segundos (todos se `width` for 0).
+
+    `last_bucket` é o último intervalo já enviado; retorna (pontos, último intervalo).
+    """
+    if not width:
+        return points, last_bucket
+    kept = []
+    for point in points:
+        bucket = int(point["t"] // width)
+        if last_bucket is None or bucket > last_bucket:
+            kept.append(point)
+            last_bucket = bucket
+    return kept, last_bucket
+
+
+class _Room:
+    __slots__ = ("subscription", "members", "last_seq", "last_buckets")
+
+    def __init__(self, subscription):
+        self.subscription = subscription
+        self.members = 0
+        self.last_seq = 0  # Último delta enviado à sala
+        self.last_buckets = {}  # série -> último intervalo enviado
+
+
+class RoomFanout:
+    """Distribui os deltas do dashboard pelas salas de assinatura.
+
+    Cada cliente está em uma única sala, determinada pela sua assinatura.
+    `split(delta)` monta, para cada sala com membros, um quadro com apenas o
+    dispositivo e as séries assinados (reduzidos à resolução da sala) e os
+    campos globais; salas sem nada novo não recebem quadro. O quadro traz
+    `seq` e `prev` (o último delta enviado à sala): o cliente só tem uma
+    lacuna se `prev` for maior que o último `seq` que recebeu.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = {}  # id do cliente -> sala
+        self._rooms = {}  # nome da sala -> _Room
+
+        # Métricas
+        self.frames = 0
+        self.skipped = 0
+
+    def join(self, client_id, subscription):
+        """Coloca o cliente na sala da assinatura; retorna a sala anterior (ou None)."""
+        room = subscription.room
+        with self._lock:
+            previous = self._leave(client_id)
+            state = self._rooms.get(room)
+            if state is None:
+                state = self._rooms[room] = _Room(subscription)
+            state.members += 1
+            self._members[client_id] = room
+        return previous
+
+    def leave(self, client_id):
+        """Remove o cliente da sua sala; retorna a sala (ou None)."""
+        with self._lock:
+            return self._leave(client_id)
+
+    def _leave(self, client_id):
+        room = self._members.pop(client_id, None)
+        if room is not None:
+            state = self._rooms[room]
+            state.members -= 1
+            if state.members == 0:
+                del self._rooms[room]
+        return room
+
+    def device_rooms(self, device_id):
+        """Salas com membros que exibem o dispositivo."""
+        with self._lock:
+            return [room for room, state in self._rooms.items() if state.subscription.device == device_id]
+
+    def split(self, delta):
+        """Retorna [(sala, quadro)] com as partes de `delta` que interessam a cada sala."""
+        seq = delta["seq"]
+        device_changes = delta.get("devices", {})
+        global_fields = {name: value for name, value in delta.items() if name not in ("seq", "devices")}
+        frames = []
+        with self._lock:
+            for room, state in self._rooms.items():
+                subscription = state.subscription
+                changes = device_changes.get(subscription.device)
+                frame_changes = self._filter(state, changes) if changes else None
+                if not frame_changes and not global_fields:
+                    self.skipped += 1
+                    continue
+                # Sequência reiniciada (ex.: processo de ingestão reiniciado): sem delta anterior
+                prev = state.last_seq if state.last_seq < seq else 0
+                frame = {"seq": seq, "prev": prev,
+                         "devices": {subscription.device: frame_changes} if frame_changes else {}}
+                frame.update(global_fields)
+                state.last_seq = seq
+                frames.append((room, frame))
+            self.frames += len(frames)
+        return frames
+
+    def _filter(self, state, changes):
+        subscription = state.subscription
+        filtered = {name: value for name, value in changes.items() if name != "points"}
+        points = {}
+        for series, series_points in changes.get("points", {}).items():
+            if series not in subscription.sensors:
+                continue
+            kept, state.last_buckets[series] = decimate_points(
+                series_points, subscription.width, state.last_buckets.get(series))
+            if kept:
+                points[series] = kept
+        if points:
+            filtered["points"] = points
+        return filtered
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "clients": len(self._members),
+                "frames": self.frames,
+                "skipped": self.skipped,
+            }
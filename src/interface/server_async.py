@@ -0,0 +1,406 @@
+"""Modo assíncrono do dashboard: MQTT, HTTP e WebSocket em um único laço asyncio.
+
+Usa o mesmo estado e a mesma lógica de app.py (registro de dispositivos,
+histórico, alertas, protocolo incremental), mas sem threads por tarefa:
+
+- o cliente paho é dirigido pelo laço de eventos (add_reader/add_writer), sem loop_forever
+- as mensagens são processadas no próprio laço, sem fila de workers
+- os quadros Socket.IO e a verificação de dispositivos offline usam timers do laço
+- HTTP e WebSocket são servidos por uma aplicação ASGI (python-socketio + uvicorn)
+
+Uso: python src/interface/server_async.py (requer `pip install uvicorn`)
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+import paho.mqtt.client as mqtt
+import socketio
+
+import app as dashboard
+from broadcast import AsyncBroadcastScheduler
+from ingest import InlineIngest
+from metrics import Registry
+from export import ExportStream
+from snapshots import CachedBody
+
+HOST = "0.0.0.0"
+PORT = 5000
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+
+
+# Função para enviar um quadro: dividido agora pelas salas de assinatura, o envio roda como tarefa do laço
+def send_delta(delta):
+    asyncio.get_running_loop().create_task(emit_delta(dashboard.room_fanout.split(delta)))
+
+
+async def emit_delta(frames):
+    start = time.perf_counter()
+    for room, frame in frames:
+        await sio.emit('data_delta', frame, to=room)
+    dashboard.METRIC_EMIT_SECONDS.observe(time.perf_counter() - start)
+
+
+# Resultados dos comandos enviados pelo laço (as respostas MQTT e os prazos são tratados nele),
+# ao cliente que enviou o comando ou às salas que exibem o dispositivo
+def emit_command_result(result, requester=None):
+    rooms = [requester] if requester is not None else dashboard.room_fanout.device_rooms(result["device"])
+    loop = asyncio.get_running_loop()
+    for room in rooms:
+        loop.create_task(sio.emit('command_result', result, to=room))
+
+
+# Processamento no laço (sem workers) e quadros agendados por timers
+dashboard.ingest_queue = InlineIngest(dashboard.handle_message)
+dashboard.broadcast_scheduler = AsyncBroadcastScheduler(dashboard.delta_builder.build, send_delta,
+                                                        frame_rate=dashboard.BROADCAST_FRAME_RATE,
+                                                        max_latency=dashboard.BROADCAST_MAX_LATENCY)
+dashboard.emit_command_result = emit_command_result
+
+
+class AsyncioMqtt:
+    """Conduz um cliente paho pelo laço asyncio em vez de `loop_forever`.
+
+    O socket do cliente é registrado no laço (leitura sempre, escrita quando
+    há dados pendentes) e as tarefas periódicas do paho (keep alive) rodam em
+    uma corrotina. Reconecta após uma queda com a espera aleatorizada de `backoff`.
+    """
+
+    def __init__(self, client, loop, backoff):
+        self.client = client
+        self.loop = loop
+        self.backoff = backoff
+        self._loop_thread = threading.get_ident()  # Criado na thread do laço
+        self._misc = None
+        self._reconnecting = False
+        self._stopping = False
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._on_disconnect = client.on_disconnect
+        client.on_disconnect = self._handle_disconnect
+
+    # Os callbacks de socket podem vir de outra thread (conexão feita no executor);
+    # nesse caso a chamada é repassada ao laço
+    def _call(self, function, *args):
+        if threading.get_ident() == self._loop_thread:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._call(self._register, sock)
+
+    def _register(self, sock):
+        self.loop.add_reader(sock, self.client.loop_read)
+        if self._misc is None or self._misc.done():
+            self._misc = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._call(self.loop.remove_reader, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._call(self.loop.add_writer, sock, self.client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._call(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _handle_disconnect(self, client, userdata, rc):
+        self._on_disconnect(client, userdata, rc)
+        if not self._stopping:
+            self._call(self._schedule_reconnect)
+
+    def _schedule_reconnect(self):
+        if not self._reconnecting:
+            self._reconnecting = True
+            self.loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            while not self._stopping:
+                await asyncio.sleep(self.backoff.next())
+                try:
+                    # A conexão TCP é bloqueante no paho: feita fora do laço
+                    await self.loop.run_in_executor(None, self.client.reconnect)
+                    return
+                except OSError as e:
+                    logging.error(f"Falha ao reconectar ao broker MQTT: {str(e)}")
+        finally:
+            self._reconnecting = False
+
+    async def connect(self, host, port, keepalive=60):
+        try:
+            await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+        except OSError as e:
+            logging.error(f"Erro na conexão MQTT da interface: {str(e)}")
+            self._schedule_reconnect()
+
+    def disconnect(self):
+        self._stopping = True
+        self.client.disconnect()
+        if self._misc is not None:
+            self._misc.cancel()
+
+
+# Função para converter a query string em um dicionário (primeiro valor de cada parâmetro)
+def parse_query(query_string):
+    if isinstance(query_string, bytes):
+        query_string = query_string.decode("latin-1")
+    return {key: values[0] for key, values in parse_qs(query_string).items()}
+
+
+# Rotas da API, reaproveitando a lógica de app.py: (método, caminho, função, bloqueante).
+# As bloqueantes rodam no executor, fora do laço: leituras do SQLite, redução das séries, FFT,
+# e o envio de comandos, que pode esperar (ex.: 'wait') por eventos tratados no laço
+ROUTES = (
+    ("GET", re.compile(r"^/api/data$"), dashboard.api_data, True),
+    ("GET", re.compile(r"^/api/devices$"), dashboard.api_devices, False),
+    ("GET", re.compile(r"^/api/devices/(?P<device_id>[^/]+)/data$"), dashboard.api_device_data, True),
+    ("GET", re.compile(r"^/api/devices/(?P<device_id>[^/]+)/analytics$"), dashboard.api_device_analytics, True),
+    ("GET", re.compile(r"^/api/devices/(?P<device_id>[^/]+)/export$"), dashboard.api_export, False),
+    ("POST", re.compile(r"^/api/devices/(?P<device_id>[^/]+)/commands$"), dashboard.api_send_command, True),
+    ("GET", re.compile(r"^/api/commands$"), dashboard.api_commands, False),
+    ("GET", re.compile(r"^/api/commands/(?P<command_id>[^/]+)$"), dashboard.api_command, False),
+    ("GET", re.compile(r"^/api/history$"), dashboard.api_history, True),
+    ("GET", re.compile(r"^/api/stats$"), dashboard.api_stats, True),
+    ("GET", re.compile(r"^/api/test/send$"), dashboard.api_test_send, False),
+    ("GET", re.compile(r"^/health$"), dashboard.api_health, False),
+)
+
+
+# Função para renderizar a página do dashboard (com os templates do Flask)
+def render_index():
+    with dashboard.app.test_request_context():
+        return dashboard.render_template('index.html', socket_transports=dashboard.SOCKET_TRANSPORTS).encode()
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_response(send, status, body, content_type, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode()),
+                            (b"content-length", str(len(body)).encode())] +
+                           [(name.lower().encode(), value.encode()) for name, value in headers]})
+    await send({"type": "http.response.body", "body": body})
+
+
+# Função para enviar o resultado de uma rota da API (mesmas regras de `respond` em app.py)
+async def send_api_result(send, scope, data, status):
+    if data is None:
+        await send_response(send, status, b"", "application/json")
+        return
+    if isinstance(data, CachedBody):
+        headers = dict(scope.get("headers", ()))
+        if data.matches(headers.get(b"if-none-match", b"").decode("latin-1")):
+            await send_response(send, 304, b"", "application/json", data.headers(None))
+            return
+        body, encoding = data.select(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        await send_response(send, status, body, "application/json", data.headers(encoding))
+        return
+    if isinstance(data, ExportStream):
+        headers = dict(scope.get("headers", ()))
+        chunks, encoding = data.select(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        await send_stream(send, status, chunks, data.content_type, data.headers(encoding))
+        return
+    await send_response(send, status, json.dumps(data).encode(), "application/json")
+
+
+# Função para enviar um corpo gerado em blocos; cada bloco é gerado fora do laço (lê o disco)
+async def send_stream(send, status, chunks, content_type, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode())] +
+                           [(name.lower().encode(), value.encode()) for name, value in headers]})
+    loop = asyncio.get_running_loop()
+    iterator = iter(chunks)
+    try:
+        while True:
+            chunk = await loop.run_in_executor(None, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    finally:
+        # Cliente desconectado: fechar o gerador (e os segmentos abertos) na thread de leitura
+        await loop.run_in_executor(None, getattr(iterator, "close", lambda: None))
+    await send({"type": "http.response.body", "body": b""})
+
+
+# Aplicação ASGI das rotas HTTP (o Socket.IO e os arquivos estáticos são tratados antes)
+async def http_app(scope, receive, send):
+    if scope["type"] != "http":
+        return
+    path = scope["path"]
+    if path == "/":
+        await send_response(send, 200, index_html, "text/html; charset=utf-8")
+        return
+    if path == "/metrics":
+        await send_response(send, 200, dashboard.metrics.render().encode(), Registry.CONTENT_TYPE)
+        return
+    for method, pattern, handler, blocking in ROUTES:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if scope["method"] != method:
+            await send_response(send, 405, json.dumps({"error": "Método não permitido"}).encode(), "application/json")
+            return
+        args = parse_query(scope.get("query_string", b""))
+        if method == "POST":
+            # Corpo JSON opcional, com prioridade sobre a query string
+            body = await read_body(receive)
+            try:
+                body = json.loads(body) if body else {}
+            except ValueError:
+                await send_response(send, 400, json.dumps({"error": "Corpo JSON inválido"}).encode(), "application/json")
+                return
+            if isinstance(body, dict):
+                args.update(body)
+        if blocking:
+            data, status = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: handler(args, **match.groupdict()))
+        else:
+            data, status = handler(args, **match.groupdict())
+        await send_api_result(send, scope, data, status)
+        return
+    await send_response(send, 404, json.dumps({"error": "Não encontrado"}).encode(), "application/json")
+
+
+# Função para (re)inscrever um cliente na sala da sua assinatura e enviar o snapshot (como no modo padrão)
+async def subscribe_client(sid, args):
+    device_id = dashboard.resolve_device_id(args.get('device'))
+    try:
+        subscription = dashboard.parse_subscription(args, device_id, dashboard.HISTORY_CAPACITY)
+    except ValueError as e:
+        await sio.emit('subscribe_error', {"error": str(e)}, to=sid)
+        return
+    previous = dashboard.room_fanout.join(sid, subscription)
+    if previous is not None and previous != subscription.room:
+        await sio.leave_room(sid, previous)
+    await sio.enter_room(sid, subscription.room)
+    snapshot = dashboard.build_snapshot(device_id, sensors=subscription.sensors, resolution=subscription.resolution)
+    await sio.emit('data_snapshot', snapshot, to=sid)
+
+
+# Eventos do WebSocket (mesmo protocolo do modo padrão)
+@sio.event
+async def connect(sid, environ, auth=None):
+    dashboard.METRIC_WS_CLIENTS.inc()
+    await subscribe_client(sid, parse_query(environ.get("QUERY_STRING", "")))
+
+
+@sio.event
+async def disconnect(sid, *args):
+    dashboard.METRIC_WS_CLIENTS.dec()
+    dashboard.room_fanout.leave(sid)
+
+
+@sio.event
+async def subscribe(sid, data=None):
+    await subscribe_client(sid, data if isinstance(data, dict) else {})
+
+
+@sio.event
+async def resync(sid, data=None):
+    await subscribe_client(sid, data if isinstance(data, dict) else {})
+
+
+@sio.event
+async def send_command(sid, data=None):
+    data = dict(data) if isinstance(data, dict) else {}
+    data.pop('wait', None)
+    result, status = dashboard.api_send_command(data, dashboard.resolve_device_id(data.pop('device', None)), sid)
+    return dict(result, code=status)
+
+
+mqtt_adapter = None
+offline_timer = None
+command_timer = None
+
+
+# Função para verificar dispositivos offline com um timer do laço, agendado para o prazo mais próximo
+# (prazos novos vencem depois de OFFLINE_THRESHOLD segundos, nunca antes do timer já agendado)
+def schedule_offline_check(loop):
+    global offline_timer
+
+    def check():
+        dashboard.check_offline_devices(time.time())
+        schedule_offline_check(loop)
+
+    delay = dashboard.OFFLINE_CHECK_INTERVAL
+    deadline = dashboard.device_deadlines.next_deadline()
+    if deadline is not None:
+        delay = min(delay, max(0.0, deadline - time.time()))
+    offline_timer = loop.call_later(delay, check)
+
+
+# Função para verificar os prazos dos comandos periodicamente com um timer do laço
+def schedule_command_check(loop):
+    global command_timer
+
+    def check():
+        dashboard.expire_commands()
+        schedule_command_check(loop)
+
+    command_timer = loop.call_later(dashboard.COMMAND_CHECK_INTERVAL, check)
+
+
+async def on_startup():
+    global mqtt_adapter
+    loop = asyncio.get_running_loop()
+    dashboard.broadcast_scheduler.start(loop)
+    dashboard.history_store.start()
+    if dashboard.traffic_recorder is not None:
+        dashboard.traffic_recorder.start()
+    schedule_offline_check(loop)
+    schedule_command_check(loop)
+
+    # Mesmo cliente (sessão persistente, spool e medição das quedas) do modo padrão
+    mqtt_adapter = AsyncioMqtt(dashboard.mqtt_client, loop, dashboard.mqtt_session.backoff)
+    logging.warning(f"Conectando interface web ao broker {dashboard.MQTT_BROKER}:{dashboard.MQTT_PORT}...")
+    await mqtt_adapter.connect(dashboard.MQTT_BROKER, dashboard.MQTT_PORT, 60)
+
+
+async def on_shutdown():
+    if offline_timer is not None:
+        offline_timer.cancel()
+    if command_timer is not None:
+        command_timer.cancel()
+    if mqtt_adapter is not None:
+        mqtt_adapter.disconnect()
+    dashboard.broadcast_scheduler.stop()
+    # Gravar as amostras pendentes antes de sair
+    dashboard.history_store.stop()
+    if dashboard.traffic_recorder is not None:
+        dashboard.traffic_recorder.stop()
+
+
+index_html = render_index()
+asgi_app = socketio.ASGIApp(sio, other_asgi_app=http_app, static_files={"/static": STATIC_DIR},
+                            on_startup=on_startup, on_shutdown=on_shutdown)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        logging.error("O modo assíncrono requer o uvicorn: pip install uvicorn")
+        raise SystemExit(1)
+    uvicorn.run(asgi_app, host=HOST, port=PORT, log_level="warning")
@@ -0,0 +1,124 @@
+import collections
+import gzip
+import hashlib
+import json
+import threading
+
+# Serialização JSON mais rápida, se instalada
+try:
+    import orjson
+
+    def json_dumps(data):
+        return orjson.dumps(data)
+except ImportError:
+    def json_dumps(data):
+        return json.dumps(data, separators=(",", ":")).encode()
+
+# Brotli é opcional (gzip é sempre oferecido)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Codificações oferecidas, na ordem de preferência
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+# Função para extrair as codificações aceitas de um cabeçalho Accept-Encoding (ignorando q=0)
+def accepted_encodings(header):
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class CachedBody:
+    """Resposta JSON já serializada e comprimida, reutilizada entre requisições.
+
+    `version` é o número de sequência dos deltas em que o conteúdo foi gerado;
+    o ETag é um hash do corpo, válido mesmo após um reinício do servidor.
+    """
+
+    __slots__ = ("body", "version", "etag", "encoded")
+
+    def __init__(self, body, version, compress_min_size=1024):
+        self.body = body
+        self.version = version
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.encoded = {}
+        if len(body) >= compress_min_size:
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body, quality=5)
+
+    def matches(self, if_none_match):
+        """Indica se o cliente já tem este conteúdo (cabeçalho If-None-Match)."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == self.etag for tag in tags)
+
+    def select(self, accept_encoding):
+        """Retorna (corpo, codificação) conforme o Accept-Encoding do cliente."""
+        if self.encoded:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding in ENCODINGS:
+                if encoding in accepted and encoding in self.encoded:
+                    return self.encoded[encoding], encoding
+        return self.body, None
+
+    def headers(self, encoding):
+        headers = [("ETag", self.etag), ("Cache-Control", "no-cache"), ("Vary", "Accept-Encoding")]
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        return headers
+
+
+class SnapshotCache:
+    """Snapshots serializados por chave (dispositivo, parâmetros) e versão.
+
+    Uma entrada vale enquanto a versão atual (número de sequência dos deltas)
+    for a mesma em que foi gerada; qualquer mudança ingerida gera um novo delta
+    e invalida as entradas. Entre atualizações, as requisições reutilizam os
+    bytes prontos, sem montar nem serializar o snapshot. Guarda no máximo
+    `max_entries` chaves, descartando as menos usadas.
+    """
+
+    def __init__(self, max_entries=64, compress_min_size=1024):
+        self.max_entries = max_entries
+        self.compress_min_size = compress_min_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, build):
+        """Retorna a entrada de `key` na versão `version`, gerando-a com `build()` se preciso.
+
+        `build()` retorna (dados, versão dos dados), já que o conteúdo gerado pode
+        incluir mudanças posteriores a `version`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        data, data_version = build()
+        entry = CachedBody(json_dumps(data), data_version, self.compress_min_size)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -144,6 +144,10 @@ const currentTemperature = document.getElementById('current-temperature');
 const currentHumidity = document.getElementById('current-humidity');
 const currentVibration = document.getElementById('current-vibration');
 const alertsContainer = document.getElementById('alerts-container');
+const deviceSelect = document.getElementById('device-select');
+const resolutionSelect = document.getElementById('resolution-select');
+const pingButton = document.getElementById('ping-button');
+const commandResult = document.getElementById('command-result');
 
 // Função para atualizar o status do dispositivo
 function updateStatus(status) {
@@ -251,7 +255,7 @@ function updateCharts(data) {
     }
     
     // Atualizar temperatura
-    if (data.temperature && data.temperature.length > 0) {
+    if (data.temperature) {
         // Atualização completa do gráfico para garantir todos os pontos de dados
         const labels = data.temperature.map(item => item.time);
         const values = data.temperature.map(item => item.value);
@@ -276,7 +280,7 @@ function updateCharts(data) {
     }
     
     // Atualizar umidade
-    if (data.humidity && data.humidity.length > 0) {
+    if (data.humidity) {
         // Atualização completa do gráfico para garantir todos os pontos de dados
         const labels = data.humidity.map(item => item.time);
         const values = data.humidity.map(item => item.value);
@@ -299,7 +303,7 @@ function updateCharts(data) {
     }
     
     // Atualizar vibração (agora chamado de magnitude)
-    if (data.vibration && data.vibration.length > 0) {
+    if (data.vibration) {
         const labels = data.vibration.map(item => item.time);
         const values = data.vibration.map(item => item.value); // Os valores já estão remapeados no backend
         
@@ -322,12 +326,191 @@ function updateCharts(data) {
     }
 }
 
+// Estado local mantido pelo protocolo incremental (snapshot + deltas)
+const SERIES = ['temperature', 'humidity', 'vibration'];
+let maxPoints = 60;
+let lastSeq = null;
+let resyncPending = false;
+let socket = null;
+let selectedDevice = null;
+let selectedResolution = 'raw';
+const seriesData = {
+    temperature: [],
+    humidity: [],
+    vibration: []
+};
+
+// Função para atualizar a lista de dispositivos disponíveis
+function updateDeviceList(devices) {
+    if (!devices) return;
+    const options = devices.includes(selectedDevice) || !selectedDevice ? devices : [selectedDevice, ...devices];
+    deviceSelect.innerHTML = '';
+    options.forEach(deviceId => {
+        const option = document.createElement('option');
+        option.value = deviceId;
+        option.textContent = deviceId;
+        option.selected = deviceId === selectedDevice;
+        deviceSelect.appendChild(option);
+    });
+}
+
+// Função para aplicar um snapshot completo enviado pelo servidor
+function applySnapshot(data) {
+    lastSeq = data.seq;
+    resyncPending = false;
+    selectedDevice = data.device;
+    if (data.subscription) {
+        selectedResolution = data.subscription.resolution;
+        resolutionSelect.value = selectedResolution;
+    }
+    updateDeviceList(data.devices);
+    if (data.max_points) {
+        maxPoints = data.max_points;
+    }
+    SERIES.forEach(name => {
+        seriesData[name] = (data[name] || []).slice(-maxPoints);
+    });
+    updateCharts(data);
+}
+
+// Função para montar a assinatura enviada ao servidor (dispositivo, séries e resolução exibidos)
+function currentSubscription() {
+    const subscription = { sensors: SERIES.join(','), resolution: selectedResolution };
+    if (selectedDevice) {
+        subscription.device = selectedDevice;
+    }
+    return subscription;
+}
+
+// Função para pedir um snapshot completo ao servidor
+function requestResync() {
+    if (resyncPending || !socket) return;
+    resyncPending = true;
+    socket.emit('resync', currentSubscription());
+}
+
+// Função para trocar a assinatura (o servidor muda a sala do cliente e responde com um snapshot)
+function subscribe() {
+    if (!socket) return;
+    resyncPending = true;
+    socket.emit('subscribe', currentSubscription());
+}
+
+// Função para trocar o dispositivo exibido
+function selectDevice(deviceId) {
+    if (deviceId === selectedDevice) return;
+    selectedDevice = deviceId;
+    subscribe();
+}
+
+// Função para trocar a resolução dos gráficos
+function selectResolution(resolution) {
+    if (resolution === selectedResolution) return;
+    selectedResolution = resolution;
+    subscribe();
+}
+
+// Função para aplicar um delta (apenas pontos novos e campos alterados)
+function applyDelta(delta) {
+    if (lastSeq === null || resyncPending) return;
+    // Delta já incluído no snapshot atual
+    if (delta.seq <= lastSeq) return;
+    // Lacuna na sequência: a sala recebeu um delta que não chegou aqui
+    // ('prev' é o delta anterior enviado à sala; as salas só recebem os deltas que lhes interessam)
+    if (delta.prev > lastSeq) {
+        requestResync();
+        return;
+    }
+    lastSeq = delta.seq;
+
+    if (delta.device_list) {
+        updateDeviceList(delta.device_list);
+    }
+
+    // Considerar apenas as mudanças do dispositivo exibido
+    const changes = (delta.devices || {})[selectedDevice];
+    if (!changes) return;
+
+    const update = {
+        status: changes.status,
+        alerts: changes.alerts,
+        last_update: changes.last_update
+    };
+
+    Object.entries(changes.points || {}).forEach(([name, points]) => {
+        const history = seriesData[name];
+        if (!history) return;
+        points.forEach(point => {
+            const last = history[history.length - 1];
+            if (!last || point.t > last.t) {
+                history.push(point);
+            }
+        });
+        if (history.length > maxPoints) {
+            history.splice(0, history.length - maxPoints);
+        }
+        update[name] = history;
+    });
+
+    updateCharts(update);
+}
+
+// Comandos enviados por este cliente aguardando resultado (id -> tipo) e resultados
+// que chegaram antes da confirmação do envio
+const pendingCommands = new Map();
+const earlyResults = new Map();
+
+// Função para exibir o resultado de um comando (latência de ida e volta ou prazo esgotado)
+function showCommandResult(result) {
+    if (result.status === 'completed') {
+        commandResult.textContent = `${result.type}: ${(result.latency * 1000).toFixed(0)} ms`;
+    } else {
+        commandResult.textContent = `${result.type}: sem resposta em ${result.timeout}s`;
+    }
+}
+
+// Função para enviar um comando ao dispositivo exibido; o resultado chega no evento 'command_result'
+function sendCommand(type, params = {}) {
+    if (!socket) return;
+    commandResult.textContent = `${type}: enviando...`;
+    socket.emit('send_command', { device: selectedDevice, type: type, params: params }, (ack) => {
+        if (ack.code >= 400) {
+            commandResult.textContent = `${type}: ${ack.error}`;
+            return;
+        }
+        const early = earlyResults.get(ack.id);
+        if (early) {
+            earlyResults.delete(ack.id);
+            showCommandResult(early);
+            return;
+        }
+        pendingCommands.set(ack.id, type);
+        commandResult.textContent = `${type}: aguardando resposta...`;
+    });
+}
+
+// Função para tratar o resultado de um comando (enviado a todos os clientes)
+function handleCommandResult(result) {
+    if (pendingCommands.has(result.id)) {
+        pendingCommands.delete(result.id);
+        showCommandResult(result);
+        return;
+    }
+    earlyResults.set(result.id, result);
+    if (earlyResults.size > 50) {
+        earlyResults.delete(earlyResults.keys().next().value);
+    }
+}
+
 // Função para buscar dados do servidor (mantida para compatibilidade inicial)
 function fetchData() {
     fetch('/api/data')
         .then(response => response.json())
         .then(data => {
-            updateCharts(data);
+            // Usar apenas se o WebSocket ainda não tiver entregado um snapshot
+            if (lastSeq === null) {
+                applySnapshot(data);
+            }
         })
         .catch(error => {
             console.error('Erro ao buscar dados:', error);
@@ -337,11 +520,41 @@ function fetchData() {
 // Inicialização do Socket.IO e configuração dos eventos
 document.addEventListener('DOMContentLoaded', () => {
     // Inicializar conexão WebSocket usando Socket.IO
-    const socket = io();
+    socket = io({ transports: SOCKET_TRANSPORTS, query: currentSubscription() });
+    
+    // Snapshot completo: enviado na conexão e em resposta a 'resync'
+    socket.on('data_snapshot', (data) => {
+        applySnapshot(data);
+    });
+    
+    // Atualizações incrementais
+    socket.on('data_delta', (delta) => {
+        applyDelta(delta);
+    });
+    
+    // O servidor reiniciou a sequência de deltas (ex.: processo de ingestão reiniciado)
+    socket.on('resync_required', () => {
+        requestResync();
+    });
+    
+    // Resultados dos comandos
+    socket.on('command_result', (result) => {
+        handleCommandResult(result);
+    });
+    
+    // Troca do dispositivo exibido
+    deviceSelect.addEventListener('change', () => {
+        selectDevice(deviceSelect.value);
+    });
+    
+    // Troca da resolução exibida
+    resolutionSelect.addEventListener('change', () => {
+        selectResolution(resolutionSelect.value);
+    });
     
-    // Evento disparado quando há atualização de dados
-    socket.on('data_update', (data) => {
-        updateCharts(data);
+    // Comando de teste: mede a ida e volta até o dispositivo
+    pingButton.addEventListener('click', () => {
+        sendCommand('ping');
     });
     
     // Evento de conexão estabelecida
@@ -352,6 +565,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // Evento de desconexão
     socket.on('disconnect', () => {
         console.log('Conexão WebSocket perdida');
+        // Na reconexão o servidor refaz a assinatura e envia um novo snapshot
+        lastSeq = null;
+        socket.io.opts.query = currentSubscription();
         // Tentar reconectar automaticamente (implementado pelo Socket.IO)
     });
     
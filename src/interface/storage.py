@@ -0,0 +1,273 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SEGMENT_PREFIX = "history-"
+SEGMENT_SUFFIX = ".sqlite"
+# user_version de um segmento já compactado
+COMPACTED_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    device TEXT NOT NULL,
+    sensor TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    raw_value REAL,
+    PRIMARY KEY (device, sensor, ts)
+) WITHOUT ROWID
+"""
+
+
+class HistoryStore:
+    """Histórico persistente em segmentos SQLite (modo WAL), um arquivo por período.
+
+    `append()` apenas enfileira a amostra, então pode ser chamado da thread do
+    MQTT; uma thread própria grava em lotes, em uma transação por segmento.
+    A tabela é ordenada por (dispositivo, sensor, timestamp), o que torna as
+    consultas por intervalo leituras contíguas do índice, e só os segmentos
+    que cobrem o intervalo pedido são abertos. A retenção apaga segmentos
+    inteiros; segmentos que deixaram de receber escrita são compactados.
+    """
+
+    def __init__(self, directory, retention_days=30, segment_seconds=86400,
+                 batch_size=1000, flush_interval=1.0, max_queue=100000):
+        self.directory = directory
+        self.retention_seconds = retention_days * 86400
+        self.segment_seconds = segment_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._connections = {}  # Conexões de escrita abertas, por início de segmento
+        self._compacted = set()
+        self._thread = None
+        self._running = False
+        self._last_maintenance = 0.0
+        self._stats_lock = threading.Lock()
+
+        # Métricas (alteradas pela thread de escrita e pelas de ingestão, sob `_stats_lock`)
+        self.samples_written = 0
+        self.samples_dropped = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Escrita -----------------------------------------------------------
+
+    def append(self, device_id, sensor, timestamp, value, raw_value=None):
+        """Enfileira uma amostra para gravação (não bloqueia)."""
+        try:
+            self._queue.put_nowait((device_id, sensor, timestamp, value, raw_value))
+        except queue.Full:
+            with self._stats_lock:
+                self.samples_dropped += 1
+
+    def _segment_start(self, timestamp):
+        return int(timestamp // self.segment_seconds) * self.segment_seconds
+
+    def _segment_path(self, segment_start):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_start}{SEGMENT_SUFFIX}")
+
+    def _writer_connection(self, segment_start):
+        connection = self._connections.get(segment_start)
+        if connection is None:
+            # As conexões de escrita só são usadas pela thread de escrita (ou após stop())
+            connection = sqlite3.connect(self._segment_path(segment_start), check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(SCHEMA)
+            self._connections[segment_start] = connection
+        return connection
+
+    def _write_batch(self, batch):
+        by_segment = {}
+        for sample in batch:
+            by_segment.setdefault(self._segment_start(sample[2]), []).append(sample)
+        for segment_start, samples in by_segment.items():
+            try:
+                connection = self._writer_connection(segment_start)
+                with connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO samples (device, sensor, ts, value, raw_value) VALUES (?, ?, ?, ?, ?)",
+                        samples)
+                with self._stats_lock:
+                    self.samples_written += len(samples)
+            except sqlite3.Error as e:
+                with self._stats_lock:
+                    self.write_errors += 1
+                logging.error(f"Erro ao gravar histórico no segmento {segment_start}: {str(e)}")
+        with self._stats_lock:
+            self.batches_written += 1
+
+    def _drain(self, first=None):
+        # Junta o que já está na fila, até batch_size amostras
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            batch = self._drain(first)
+            if batch:
+                self._write_batch(batch)
+            if time.time() - self._last_maintenance > 60:
+                self.maintain()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Grava as amostras pendentes e fecha os segmentos."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    # --- Retenção e compactação ---------------------------------------------
+
+    def segments(self):
+        """Lista (início, caminho) dos segmentos existentes, em ordem cronológica."""
+        result = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    start = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                except ValueError:
+                    continue
+                result.append((start, os.path.join(self.directory, name)))
+        result.sort()
+        return result
+
+    def maintain(self, now=None):
+        """Apaga segmentos fora da retenção e compacta os que não recebem mais escrita.
+
+        Executado periodicamente pela thread de escrita; chamar diretamente
+        apenas com o armazenamento parado.
+        """
+        now = time.time() if now is None else now
+        self._last_maintenance = now
+        current_segment = self._segment_start(now)
+        for segment_start, path in self.segments():
+            if segment_start + self.segment_seconds < now - self.retention_seconds:
+                connection = self._connections.pop(segment_start, None)
+                if connection is not None:
+                    connection.close()
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                self._compacted.discard(segment_start)
+                logging.warning(f"Segmento de histórico removido pela retenção: {os.path.basename(path)}")
+            elif segment_start < current_segment and segment_start not in self._compacted:
+                self._compact(segment_start, path)
+
+    def _compact(self, segment_start, path):
+        # Fecha a conexão de escrita, aplica o WAL e reescreve o arquivo sem espaço livre
+        connection = self._connections.pop(segment_start, None)
+        if connection is not None:
+            connection.close()
+        try:
+            connection = sqlite3.connect(path)
+            # Marca gravada no próprio segmento: após reiniciar, segmentos já compactados não passam de novo pelo VACUUM
+            if connection.execute("PRAGMA user_version").fetchone()[0] < COMPACTED_VERSION:
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                connection.execute(f"PRAGMA user_version = {COMPACTED_VERSION}")
+                connection.execute("VACUUM")
+            connection.close()
+            self._compacted.add(segment_start)
+        except sqlite3.Error as e:
+            logging.error(f"Erro ao compactar segmento {os.path.basename(path)}: {str(e)}")
+
+    # --- Consulta -----------------------------------------------------------
+
+    def query(self, device_id, sensor, start_time, end_time, limit=None):
+        """Retorna (timestamps, valores, valores brutos) no intervalo [start_time, end_time]."""
+        times, values, raw_values = [], [], []
+        first_segment = self._segment_start(start_time)
+        for segment_start, path in self.segments():
+            if segment_start < first_segment or segment_start > end_time:
+                continue
+            remaining = None if limit is None else limit - len(times)
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            except sqlite3.Error:
+                continue
+            try:
+                rows = connection.execute(
+                    "SELECT ts, value, raw_value FROM samples "
+                    "WHERE device = ? AND sensor = ? AND ts >= ? AND ts <= ? ORDER BY ts LIMIT ?",
+                    (device_id, sensor, start_time, end_time, -1 if remaining is None else remaining))
+                for ts, value, raw_value in rows:
+                    times.append(ts)
+                    values.append(value)
+                    raw_values.append(raw_value)
+            except sqlite3.Error as e:
+                logging.error(f"Erro ao consultar segmento {os.path.basename(path)}: {str(e)}")
+            finally:
+                connection.close()
+        return times, values, raw_values
+
+    def iter_range(self, device_id, sensor, start_time, end_time, after=None, batch_size=5000):
+        """Gera as amostras do intervalo em lotes de até `batch_size` linhas (ts, valor, valor bruto).
+
+        Lê segmento a segmento com um cursor, sem carregar o intervalo inteiro.
+        Com `after`, começa na primeira amostra com timestamp maior que `after`
+        (continuação de uma leitura interrompida).
+        """
+        if after is not None and after >= start_time:
+            condition, lower = "ts > ?", after
+        else:
+            condition, lower = "ts >= ?", start_time
+        first_segment = self._segment_start(lower)
+        for segment_start, path in self.segments():
+            if segment_start < first_segment or segment_start > end_time:
+                continue
+            try:
+                # O consumidor pode avançar o gerador de threads diferentes (ex.: executor do modo assíncrono)
+                connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            except sqlite3.Error:
+                continue
+            try:
+                cursor = connection.execute(
+                    "SELECT ts, value, raw_value FROM samples "
+                    f"WHERE device = ? AND sensor = ? AND {condition} AND ts <= ? ORDER BY ts",
+                    (device_id, sensor, lower, end_time))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            except sqlite3.Error as e:
+                logging.error(f"Erro ao consultar segmento {os.path.basename(path)}: {str(e)}")
+            finally:
+                connection.close()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {
+                "queue_depth": self._queue.qsize(),
+                "samples_written": self.samples_written,
+                "samples_dropped": self.samples_dropped,
+                "batches_written": self.batches_written,
+                "write_errors": self.write_errors,
+            }
+        stats["segments"] = len(self.segments())
+        return stats
@@ -0,0 +1,289 @@
+import collections
+
+import numpy as np
+
+from gorilla import decode_block, encode_block, quantize_time
+
+# Tamanho inicial dos arrays; cresce por duplicação até atingir a capacidade (ver RingBuffer)
+INITIAL_ALLOCATION = 256
+
+
+class RingBuffer:
+    """Buffer circular de série temporal baseado em arrays NumPy.
+
+    Guarda timestamps (float64, segundos de época) e uma ou mais colunas de
+    valores (float64). A inserção é O(1) amortizado: os arrays crescem por
+    duplicação até `capacity` e, a partir daí, o ponto mais antigo é
+    sobrescrito. Assume timestamps não decrescentes, o que permite consultas
+    por intervalo com busca binária.
+
+    Os arrays não são alocados com `capacity` de início: com as capacidades
+    do dashboard, uma série de vibração cheia ocupa cerca de 5 MB, e o
+    registro aceita centenas de dispositivos, muitos com poucos dados. Eles
+    começam com INITIAL_ALLOCATION pontos, e cada duplicação copia os dados
+    uma vez; depois de atingir `capacity`, não há mais alocação nem cópia.
+    """
+
+    def __init__(self, capacity, fields=("value",)):
+        if capacity <= 0:
+            raise ValueError("capacity deve ser positiva")
+        self.capacity = int(capacity)
+        self.fields = tuple(fields)
+        allocation = min(self.capacity, INITIAL_ALLOCATION)
+        self._time = np.empty(allocation, dtype=np.float64)
+        self._columns = [np.empty(allocation, dtype=np.float64) for _ in self.fields]
+        self._head = 0  # Próxima posição de escrita
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self):
+        # Só cresce enquanto o buffer ainda não deu a volta (dados contíguos em [0, size))
+        allocation = min(self.capacity, len(self._time) * 2)
+        time_array = np.empty(allocation, dtype=np.float64)
+        time_array[:self._size] = self._time[:self._size]
+        self._time = time_array
+        for index, column in enumerate(self._columns):
+            new_column = np.empty(allocation, dtype=np.float64)
+            new_column[:self._size] = column[:self._size]
+            self._columns[index] = new_column
+        self._head = self._size
+
+    def append(self, timestamp, *values):
+        """Adiciona um ponto; `values` segue a ordem de `fields`."""
+        if len(values) != len(self.fields):
+            raise ValueError(f"Esperados {len(self.fields)} valores, recebidos {len(values)}")
+        if self._size == len(self._time) and self._size < self.capacity:
+            self._grow()
+
+        head = self._head
+        self._time[head] = timestamp
+        for column, value in zip(self._columns, values):
+            column[head] = value
+
+        self._head = (head + 1) % len(self._time)
+        if self._size < len(self._time):
+            self._size += 1
+
+    def last(self):
+        """Retorna (timestamp, valores...) do ponto mais recente ou None."""
+        if self._size == 0:
+            return None
+        last = (self._head - 1) % len(self._time)
+        return (float(self._time[last]),) + tuple(float(column[last]) for column in self._columns)
+
+    def first(self):
+        """Retorna (timestamp, valores...) do ponto mais antigo ou None."""
+        if self._size == 0:
+            return None
+        first = self._head if self._size == len(self._time) else 0
+        return (float(self._time[first]),) + tuple(float(column[first]) for column in self._columns)
+
+    def is_full(self):
+        """Indica se o buffer atingiu a capacidade (pontos antigos estão sendo descartados)."""
+        return self._size == self.capacity
+
+    def _segments(self):
+        # Intervalos físicos [início, fim) em ordem cronológica
+        if self._size < len(self._time):
+            return [(0, self._size)]
+        if self._head == 0:
+            return [(0, self._size)]
+        return [(self._head, len(self._time)), (0, self._head)]
+
+    def _gather(self, pieces):
+        # Concatena apenas os trechos selecionados (copia só o resultado)
+        if not pieces:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, {name: empty for name in self.fields}
+        times = np.concatenate([self._time[start:end] for start, end in pieces])
+        columns = {
+            name: np.concatenate([column[start:end] for start, end in pieces])
+            for name, column in zip(self.fields, self._columns)
+        }
+        return times, columns
+
+    def tail(self, count):
+        """Retorna (timestamps, {campo: valores}) dos `count` pontos mais recentes."""
+        remaining = max(0, min(int(count), self._size))
+        pieces = []
+        for start, end in reversed(self._segments()):
+            if remaining == 0:
+                break
+            take = min(remaining, end - start)
+            pieces.append((end - take, end))
+            remaining -= take
+        pieces.reverse()
+        return self._gather(pieces)
+
+    def range(self, start_time=None, end_time=None):
+        """Retorna os pontos com start_time <= timestamp <= end_time."""
+        pieces = []
+        for start, end in self._segments():
+            segment = self._time[start:end]
+            low = 0 if start_time is None else int(np.searchsorted(segment, start_time, side="left"))
+            high = len(segment) if end_time is None else int(np.searchsorted(segment, end_time, side="right"))
+            if low < high:
+                pieces.append((start + low, start + high))
+        return self._gather(pieces)
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def nbytes(self):
+        """Memória ocupada pelos arrays alocados, em bytes."""
+        return self._time.nbytes + sum(column.nbytes for column in self._columns)
+
+
+class _Block:
+    """Bloco fechado de uma série comprimida: bytes codificados e limites do intervalo."""
+
+    __slots__ = ("data", "count", "first", "last")
+
+    def __init__(self, data, count, first, last):
+        self.data = data
+        self.count = count
+        # (timestamp, valores...) do primeiro e do último ponto
+        self.first = first
+        self.last = last
+
+
+class CompressedSeries:
+    """Série temporal com os blocos fechados comprimidos (gorilla.py).
+
+    Mesma interface de leitura do `RingBuffer`. Os pontos novos vão para um
+    bloco aberto de `block_size` pontos em arrays NumPy; quando ele enche, é
+    codificado (delta-of-delta dos timestamps, XOR dos valores) e guardado
+    como bytes. As leituras decodificam apenas os blocos que cruzam o
+    intervalo pedido, um de cada vez. Quando os blocos fechados passam de
+    `capacity` pontos, o mais antigo é descartado inteiro. Timestamps
+    decodificados têm resolução de microssegundos.
+    """
+
+    def __init__(self, capacity, fields=("value",), block_size=1024):
+        if capacity <= 0 or block_size <= 0:
+            raise ValueError("capacity e block_size devem ser positivos")
+        self.capacity = int(capacity)
+        self.fields = tuple(fields)
+        self.block_size = min(int(block_size), self.capacity)
+        self._blocks = collections.deque()
+        self._sealed = 0  # Pontos nos blocos fechados
+        self._time = np.empty(self.block_size, dtype=np.float64)
+        self._columns = [np.empty(self.block_size, dtype=np.float64) for _ in self.fields]
+        self._open = 0  # Pontos no bloco aberto
+        self._dropped = False
+
+    def __len__(self):
+        return self._sealed + self._open
+
+    def append(self, timestamp, *values):
+        """Adiciona um ponto; `values` segue a ordem de `fields`."""
+        if len(values) != len(self.fields):
+            raise ValueError(f"Esperados {len(self.fields)} valores, recebidos {len(values)}")
+        index = self._open
+        self._time[index] = timestamp
+        for column, value in zip(self._columns, values):
+            column[index] = value
+        self._open = index + 1
+        if self._open == self.block_size:
+            self._seal()
+
+    def _seal(self):
+        count = self._open
+        times = self._time[:count].tolist()
+        columns = [column[:count].tolist() for column in self._columns]
+        first = (quantize_time(times[0]),) + tuple(values[0] for values in columns)
+        last = (quantize_time(times[-1]),) + tuple(values[-1] for values in columns)
+        self._blocks.append(_Block(encode_block(times, columns), count, first, last))
+        self._sealed += count
+        self._open = 0
+        while self._sealed > self.capacity:
+            self._sealed -= self._blocks.popleft().count
+            self._dropped = True
+
+    def _decode(self, block):
+        times, columns = decode_block(block.data, block.count, len(self.fields))
+        return np.array(times), {name: np.array(values) for name, values in zip(self.fields, columns)}
+
+    def _open_arrays(self, low=0, high=None):
+        high = self._open if high is None else high
+        return self._time[low:high].copy(), {name: column[low:high].copy()
+                                             for name, column in zip(self.fields, self._columns)}
+
+    def last(self):
+        """Retorna (timestamp, valores...) do ponto mais recente ou None."""
+        if self._open:
+            last = self._open - 1
+            return (float(self._time[last]),) + tuple(float(column[last]) for column in self._columns)
+        return self._blocks[-1].last if self._blocks else None
+
+    def first(self):
+        """Retorna (timestamp, valores...) do ponto mais antigo ou None."""
+        if self._blocks:
+            return self._blocks[0].first
+        if self._open:
+            return (float(self._time[0]),) + tuple(float(column[0]) for column in self._columns)
+        return None
+
+    def is_full(self):
+        """Indica se pontos antigos já foram descartados por falta de capacidade."""
+        return self._dropped
+
+    def _concatenate(self, pieces):
+        if not pieces:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, {name: empty for name in self.fields}
+        times = np.concatenate([times for times, _ in pieces])
+        columns = {name: np.concatenate([columns[name] for _, columns in pieces]) for name in self.fields}
+        return times, columns
+
+    def tail(self, count):
+        """Retorna (timestamps, {campo: valores}) dos `count` pontos mais recentes."""
+        remaining = max(0, min(int(count), len(self)))
+        pieces = []
+        take = min(remaining, self._open)
+        if take:
+            pieces.append(self._open_arrays(self._open - take))
+            remaining -= take
+        for block in reversed(self._blocks):
+            if remaining == 0:
+                break
+            times, columns = self._decode(block)
+            take = min(remaining, block.count)
+            pieces.append((times[-take:], {name: values[-take:] for name, values in columns.items()}))
+            remaining -= take
+        pieces.reverse()
+        return self._concatenate(pieces)
+
+    def range(self, start_time=None, end_time=None):
+        """Retorna os pontos com start_time <= timestamp <= end_time."""
+        pieces = []
+        for block in self._blocks:
+            if start_time is not None and block.last[0] < start_time:
+                continue
+            if end_time is not None and block.first[0] > end_time:
+                break
+            times, columns = self._decode(block)
+            low = 0 if start_time is None else int(np.searchsorted(times, start_time, side="left"))
+            high = len(times) if end_time is None else int(np.searchsorted(times, end_time, side="right"))
+            pieces.append((times[low:high], {name: values[low:high] for name, values in columns.items()}))
+        if self._open:
+            segment = self._time[:self._open]
+            low = 0 if start_time is None else int(np.searchsorted(segment, start_time, side="left"))
+            high = self._open if end_time is None else int(np.searchsorted(segment, end_time, side="right"))
+            if low < high:
+                pieces.append(self._open_arrays(low, high))
+        return self._concatenate(pieces)
+
+    def clear(self):
+        self._blocks.clear()
+        self._sealed = 0
+        self._open = 0
+        self._dropped = False
+
+    def nbytes(self):
+        """Memória ocupada pelos blocos codificados e pelos arrays do bloco aberto, em bytes."""
+        return (sum(len(block.data) for block in self._blocks) + self._time.nbytes
+                + sum(column.nbytes for column in self._columns))
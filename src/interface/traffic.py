@@ -0,0 +1,451 @@
+"""Gravação e reprodução do tráfego MQTT recebido.
+
+O `TrafficRecorder` grava as mensagens brutas (tópico, payload, instante de
+recepção) em um arquivo só de acréscimo (.iotrec). Ele é ativado no dashboard
+e no receptor pela variável IOT_RECORD_DIR (`main.py --record DIR`) ou, sem
+eles, pela linha de comando `record`. O `Replayer` reproduz uma gravação em 1x,
+Nx ou na velocidade máxima, com repetição e multiplexação da gravação em
+vários dispositivos sintéticos.
+
+Formato do arquivo: o cabeçalho MAGIC, seguido de registros
+- tópico: b"T", id (uint16), tamanho (uint16) e o nome; cada tópico é gravado uma vez
+- mensagem: b"M", instante de recepção (float64), id do tópico (uint16),
+  tamanho (uint32) e o payload
+Um registro incompleto no fim (processo encerrado durante a escrita) é ignorado.
+
+Uso:
+    python src/interface/traffic.py record --broker 127.0.0.1:1883 -o incidente.iotrec [--duration S]
+    python src/interface/traffic.py info incidente.iotrec
+    python src/interface/traffic.py replay incidente.iotrec --broker 127.0.0.1:1883 --speed 10 --loop 3 --devices 50
+    python src/interface/traffic.py replay incidente.iotrec --local > alertas.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+MAGIC = b"IOTREC1\n"
+TOPIC_RECORD = struct.Struct("<cHH")
+MESSAGE_RECORD = struct.Struct("<cdHI")
+MAX_TOPICS = 0xFFFF
+
+# Diretório das gravações automáticas (repassado por main.py --record)
+RECORD_DIR_ENV = "IOT_RECORD_DIR"
+RECORD_SUFFIX = ".iotrec"
+# Pontos em memória por série na reprodução local (os alertas usam só as amostras recentes)
+REPLAY_HISTORY_CAPACITY = 4096
+
+
+class TrafficRecorder:
+    """Grava as mensagens recebidas em um arquivo .iotrec, fora da thread do MQTT.
+
+    `record()` apenas enfileira (descarta se a fila estiver cheia, sem bloquear
+    o cliente MQTT); uma thread própria grava em lotes. Ao reabrir um arquivo
+    existente, a tabela de tópicos é recarregada e a gravação continua no fim.
+    Com `max_bytes`, a gravação para quando o arquivo atinge o tamanho.
+    """
+
+    def __init__(self, path, max_queue=100000, flush_interval=1.0, max_bytes=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._topics = {}
+        self._file = None
+        self._thread = None
+        self._running = False
+
+        # Métricas
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def record(self, topic, payload, received_at):
+        """Enfileira uma mensagem para gravação (não bloqueia)."""
+        try:
+            self._queue.put_nowait((topic, bytes(payload), received_at))
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            end = 0
+            for topic_id, topic, _, payload, offset in _read_records(self.path):
+                if payload is None:
+                    self._topics[topic] = topic_id
+                end = offset
+            self._file = open(self.path, "r+b")
+            # Descartar um registro incompleto no fim
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(self.path, "wb")
+            self._file.write(MAGIC)
+        self.bytes = self._file.tell()
+
+    def _write(self, topic, payload, received_at):
+        topic_id = self._topics.get(topic)
+        if topic_id is None:
+            if len(self._topics) >= MAX_TOPICS:
+                self.dropped += 1
+                return
+            topic_id = self._topics[topic] = len(self._topics)
+            name = topic.encode()
+            self._file.write(TOPIC_RECORD.pack(b"T", topic_id, len(name)) + name)
+            self.bytes += TOPIC_RECORD.size + len(name)
+        self._file.write(MESSAGE_RECORD.pack(b"M", received_at, topic_id, len(payload)) + payload)
+        self.bytes += MESSAGE_RECORD.size + len(payload)
+        self.recorded += 1
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for topic, payload, received_at in batch:
+                if self.max_bytes is not None and self.bytes >= self.max_bytes:
+                    self.dropped += 1
+                    continue
+                self._write(topic, payload, received_at)
+            self._file.flush()
+
+    def start(self):
+        self._open()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logging.warning(f"Gravando o tráfego MQTT em {self.path}")
+
+    def stop(self):
+        """Grava as mensagens pendentes e fecha o arquivo."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "queue_depth": self._queue.qsize(),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+        }
+
+
+# Função para criar o gravador de um componente se IOT_RECORD_DIR estiver definida (senão None)
+def recorder_from_env(name):
+    directory = os.environ.get(RECORD_DIR_ENV)
+    if not directory:
+        return None
+    return TrafficRecorder(os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}{RECORD_SUFFIX}"))
+
+
+# Função que percorre os registros de um arquivo: (id do tópico, tópico, instante, payload, fim do registro),
+# com instante e payload None nos registros de tópico; termina no primeiro registro incompleto
+def _read_records(path):
+    topics = {}
+    with open(path, "rb") as capture:
+        if capture.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} não é uma gravação de tráfego")
+        offset = len(MAGIC)
+        while True:
+            kind = capture.read(1)
+            if kind == b"T":
+                header = capture.read(TOPIC_RECORD.size - 1)
+                if len(header) < TOPIC_RECORD.size - 1:
+                    return
+                _, topic_id, length = TOPIC_RECORD.unpack(kind + header)
+                name = capture.read(length)
+                if len(name) < length:
+                    return
+                topics[topic_id] = name.decode()
+                offset += TOPIC_RECORD.size + length
+                yield topic_id, topics[topic_id], None, None, offset
+            elif kind == b"M":
+                header = capture.read(MESSAGE_RECORD.size - 1)
+                if len(header) < MESSAGE_RECORD.size - 1:
+                    return
+                _, received_at, topic_id, length = MESSAGE_RECORD.unpack(kind + header)
+                payload = capture.read(length)
+                if len(payload) < length:
+                    return
+                offset += MESSAGE_RECORD.size + length
+                yield topic_id, topics[topic_id], received_at, payload, offset
+            else:
+                # Fim do arquivo (ou lixo após uma escrita interrompida)
+                return
+
+
+def read_capture(path):
+    """Gera as mensagens (instante de recepção, tópico, payload) de uma gravação, em ordem."""
+    for _, topic, received_at, payload, _ in _read_records(path):
+        if payload is not None:
+            yield received_at, topic, payload
+
+
+def capture_info(path):
+    """Resumo de uma gravação: mensagens, dispositivos, duração e mensagens por sensor."""
+    messages = 0
+    first = last = None
+    devices = set()
+    sensors = {}
+    for received_at, topic, payload in read_capture(path):
+        messages += 1
+        first = received_at if first is None else first
+        last = received_at
+        device_id, _, sensor = topic.rpartition("/")
+        devices.add(device_id)
+        sensors[sensor] = sensors.get(sensor, 0) + 1
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "messages": messages,
+        "devices": sorted(devices),
+        "start": first,
+        "end": last,
+        "duration": (last - first) if messages else 0.0,
+        "sensors": sensors,
+    }
+
+
+class Replayer:
+    """Reproduz uma gravação, entregando cada mensagem a `deliver(tópico, payload, instante)`.
+
+    O instante entregue segue a linha do tempo da gravação (os intervalos
+    originais entre mensagens), deslocada a cada repetição, de modo que o
+    resultado não depende da velocidade. `speed` controla apenas o ritmo
+    real da entrega: 1.0 como gravado, N vezes mais rápido ou None (máxima,
+    sem esperas). Com `devices` > 1, cada mensagem é entregue para N
+    dispositivos sintéticos (`<dispositivo>-<n>`).
+    """
+
+    def __init__(self, path, deliver, speed=1.0, loops=1, devices=1):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed deve ser positiva")
+        self.path = path
+        self.deliver = deliver
+        self.speed = speed
+        self.loops = loops
+        self.devices = devices
+        self._topics = {}
+
+        # Métricas
+        self.delivered = 0
+        self.max_lag = 0.0
+
+    def _expand(self, topic):
+        # Tópicos dos dispositivos sintéticos, calculados uma vez por tópico gravado
+        topics = self._topics.get(topic)
+        if topics is None:
+            if self.devices <= 1:
+                topics = (topic,)
+            else:
+                device_id, _, sensor = topic.rpartition("/")
+                topics = tuple(f"{device_id}-{index}/{sensor}" for index in range(1, self.devices + 1))
+            self._topics[topic] = topics
+        return topics
+
+    def run(self, stopping=None):
+        """Reproduz a gravação (`loops` vezes; 0 repete até `stopping` ser sinalizado)."""
+        wall_start = time.monotonic()
+        first = None
+        period = 0.0
+        loop = 0
+        while self.loops == 0 or loop < self.loops:
+            last = None
+            count = 0
+            for received_at, topic, payload in read_capture(self.path):
+                if stopping is not None and stopping.is_set():
+                    return self.stats()
+                if first is None:
+                    first = received_at
+                last = received_at
+                count += 1
+                # Repetições continuam a linha do tempo depois do fim da anterior
+                timestamp = received_at + loop * period
+                if self.speed is not None:
+                    delay = wall_start + (timestamp - first) / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        self.max_lag = max(self.max_lag, -delay)
+                for expanded in self._expand(topic):
+                    self.deliver(expanded, payload, timestamp)
+                    self.delivered += 1
+            if last is None:
+                break
+            if loop == 0:
+                # Duração da gravação mais o intervalo médio entre mensagens
+                period = (last - first) * count / max(count - 1, 1) or 1.0
+            loop += 1
+        return self.stats()
+
+    def stats(self):
+        return {"delivered": self.delivered, "max_lag": self.max_lag}
+
+
+# Função para converter "host:porta" em (host, porta)
+def parse_broker(text):
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1"), int(port or 1883)
+
+
+# Função para gravar o tráfego de um broker pela linha de comando
+def command_record(args):
+    import paho.mqtt.client as mqtt
+
+    recorder = TrafficRecorder(args.output)
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    client.on_connect = lambda client, userdata, flags, rc: [client.subscribe(topic, 1) for topic in args.topic]
+    client.on_message = lambda client, userdata, msg: recorder.record(msg.topic, msg.payload, time.time())
+    recorder.start()
+    client.connect(*parse_broker(args.broker))
+    client.loop_start()
+    try:
+        end = time.monotonic() + args.duration if args.duration else None
+        while end is None or time.monotonic() < end:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        recorder.stop()
+    print(json.dumps(recorder.stats()))
+
+
+# Função para reproduzir uma gravação publicando em um broker (o dashboard e o receptor a recebem como tráfego real)
+def command_replay_broker(args, replayer_options):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    client.connect(*parse_broker(args.broker))
+    client.loop_start()
+    replayer = Replayer(args.capture, lambda topic, payload, timestamp: client.publish(topic, payload, args.qos),
+                        **replayer_options)
+    try:
+        stats = replayer.run()
+    except KeyboardInterrupt:
+        stats = replayer.stats()
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    print(json.dumps(stats))
+
+
+# Função para reproduzir uma gravação no caminho de ingestão do dashboard (pipeline.py), no próprio processo,
+# sem broker nem servidor web: processa em linha, na linha do tempo da gravação, e escreve cada transição
+# nos alertas (alerta que surge, some ou muda de nível) como uma linha JSON. Os pontos ficam só em memória,
+# a menos que `--history-dir` indique onde gravá-los
+def command_replay_local(args, replayer_options):
+    from devices import HISTORY_FIELDS
+    from pipeline import create_pipeline
+    from storage import HistoryStore
+
+    current = {"time": None}
+    levels = {}  # dispositivo -> {tipo: nível} da última transição escrita
+
+    def report_transition(device):
+        alerts = sorted(device.alerts.values(), key=lambda alert: alert.type)
+        state = {alert.type: alert.level for alert in alerts}
+        if levels.get(device.device_id, {}) == state:
+            # Só a mensagem mudou (ex.: novo valor medido)
+            return
+        levels[device.device_id] = state
+        print(json.dumps({"t": current["time"], "device": device.device_id,
+                          "alerts": [{"type": alert.type, "level": alert.level, "message": alert.message}
+                                     for alert in alerts]}, ensure_ascii=False))
+
+    # Retenção longa: as gravações podem ser antigas, e a manutenção usa o relógio real
+    history_store = (HistoryStore(args.history_dir, retention_days=36500)
+                     if args.history_dir is not None else None)
+    pipeline = create_pipeline(history_store, {sensor: REPLAY_HISTORY_CAPACITY for sensor in HISTORY_FIELDS},
+                               on_alerts_changed=report_transition)
+
+    def deliver(topic, payload, timestamp):
+        current["time"] = timestamp
+        pipeline.check_offline_devices(timestamp)
+        pipeline.handle_message(topic, payload, timestamp)
+        # Sem clientes conectados: só descartar as mudanças acumuladas para os quadros
+        pipeline.delta_builder.build()
+
+    if history_store is not None:
+        history_store.start()
+    replayer = Replayer(args.capture, deliver, **replayer_options)
+    try:
+        stats = replayer.run()
+    finally:
+        if history_store is not None:
+            history_store.stop()
+    stats["devices"] = {device.device_id: {"status": device.status, "alerts": sorted(device.alerts)}
+                        for device in pipeline.registry.devices()}
+    print(json.dumps(stats), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gravação e reprodução do tráfego MQTT")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="gravar o tráfego de um broker")
+    record.add_argument("--broker", default="127.0.0.1:1883", help="host:porta")
+    record.add_argument("--topic", action="append", default=None, help="filtro de tópicos (padrão: +/+)")
+    record.add_argument("--duration", type=float, help="segundos de gravação (padrão: até Ctrl+C)")
+    record.add_argument("-o", "--output", required=True)
+
+    info = commands.add_parser("info", help="resumo de uma gravação")
+    info.add_argument("capture")
+
+    replay = commands.add_parser("replay", help="reproduzir uma gravação")
+    replay.add_argument("capture")
+    target = replay.add_mutually_exclusive_group(required=True)
+    target.add_argument("--broker", help="publicar em um broker (host:porta)")
+    target.add_argument("--local", action="store_true",
+                        help="processar no caminho de ingestão do dashboard neste processo (alertas em JSON por linha)")
+    replay.add_argument("--speed", default=None, help="1 (como gravado), N (N vezes mais rápido) ou max")
+    replay.add_argument("--loop", type=int, default=1, help="repetições (0: sem fim)")
+    replay.add_argument("--devices", type=int, default=1, help="dispositivos sintéticos por dispositivo gravado")
+    replay.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    replay.add_argument("--history-dir", default=None,
+                        help="com --local, gravar os pontos reproduzidos em segmentos SQLite neste diretório")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        args.topic = args.topic or ["+/+"]
+        command_record(args)
+        return
+    if args.command == "info":
+        print(json.dumps(capture_info(args.capture), indent=2))
+        return
+    # Padrão: tempo real no broker, velocidade máxima no modo local
+    speed = args.speed or ("max" if args.local else "1")
+    options = {"speed": None if speed == "max" else float(speed), "loops": args.loop, "devices": args.devices}
+    if args.local:
+        if args.loop == 0:
+            parser.error("--local requer um número finito de repetições")
+        command_replay_local(args, options)
+    else:
+        if args.history_dir is not None:
+            parser.error("--history-dir só se aplica a --local")
+        command_replay_broker(args, options)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,213 @@
 import paho.mqtt.client as mqtt
 import time
 import json
-import random
 import logging
+import os
+from interface.decoder import decode_sample, decode_status, decode_object, DecodeError
+from interface.metrics import Registry, LogSampler, serve_metrics
+from interface.logs import configure_logging
+from interface.mqtt_session import MqttSession, Spool, stable_client_id
+from interface.traffic import recorder_from_env
 
 # Configuração de logs - reduzindo para WARNING para remover mensagens de debug
-logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging(logging.WARNING)
 
 # Configuração do Broker MQTT
 MQTT_BROKER = "broker.hivemq.com"
 MQTT_PORT = 1883
-CLIENT_ID = f"python-mqtt-client-{random.randint(0, 1000)}"
-
-# Tópicos
-TOPIC_VIBRATION = "sensorGS2025FIAPLEOOO_XYZ_0987654321/vibration"
-TOPIC_TEMPERATURE = "sensorGS2025FIAPLEOOO_XYZ_0987654321/temperature" 
-TOPIC_HUMIDITY = "sensorGS2025FIAPLEOOO_XYZ_0987654321/humidity"
-TOPIC_STATUS = "sensorGS2025FIAPLEOOO_XYZ_0987654321/status"
-TOPIC_COMMANDS = "sensorGS2025FIAPLEOOO_XYZ_0987654321/commands"
-
-# Armazenamento de dados recebidos
-latest_data = {
-    "vibration": None,
-    "temperature": None,
-    "humidity": None,
-    "status": "desconhecido",
-    "last_update": None
-}
+# Identificador estável e sessão persistente: o broker guarda as mensagens QoS 1 enquanto o receptor está fora
+CLIENT_ID = stable_client_id("python-mqtt-client")
+MQTT_QOS = 1
+MQTT_CLEAN_SESSION = False
+# Publicações (status do receptor) feitas sem conexão ficam em disco até a reconexão
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "spool")
+
+# Tópicos: o primeiro nível identifica o dispositivo ('+' assina todos)
+DEVICE_WILDCARD = "+"
+TOPIC_VIBRATION = f"{DEVICE_WILDCARD}/vibration"
+TOPIC_TEMPERATURE = f"{DEVICE_WILDCARD}/temperature"
+TOPIC_HUMIDITY = f"{DEVICE_WILDCARD}/humidity"
+TOPIC_STATUS = f"{DEVICE_WILDCARD}/status"
+TOPIC_COMMANDS = f"{DEVICE_WILDCARD}/commands"
+
+# Tópico em que o receptor anuncia online/offline; com três níveis, não casa com '+/status'
+# e o dashboard não o trata como status de um dispositivo
+TOPIC_RECEIVER_STATUS = "iot/receiver/status"
+
+# Número máximo de dispositivos acompanhados
+MAX_DEVICES = 1000
+
+# Nomes dos sensores usados nos logs
+SENSOR_LABELS = {"vibration": "vibração", "temperature": "temperatura", "humidity": "umidade"}
+
+# Armazenamento dos últimos dados recebidos, por dispositivo
+latest_data = {}
+
+# Métricas expostas em http://<host>:METRICS_PORT/metrics (formato texto do Prometheus)
+METRICS_PORT = 9100
+metrics = Registry()
+METRIC_MESSAGES = metrics.counter("iot_receiver_messages_total", "Mensagens MQTT recebidas", ("sensor",))
+METRIC_DECODE_FAILURES = metrics.counter("iot_receiver_decode_failures_total", "Payloads que não puderam ser decodificados", ("sensor",))
+METRIC_DECODE_SECONDS = metrics.histogram("iot_receiver_decode_seconds", "Tempo de decodificação dos payloads", ("sensor",))
+METRIC_PROCESS_SECONDS = metrics.histogram("iot_receiver_process_seconds", "Tempo total de processamento de uma mensagem", ("sensor",))
+METRIC_MQTT_CONNECTS = metrics.counter("iot_receiver_mqtt_connects_total", "Conexões (e reconexões) ao broker MQTT")
+METRIC_MQTT_DISCONNECTS = metrics.counter("iot_receiver_mqtt_disconnects_total", "Desconexões do broker MQTT", ("reason",))
+METRIC_COMMANDS = metrics.counter("iot_receiver_commands_total", "Comandos observados nos tópicos de comandos", ("command",))
+metrics.gauge("iot_receiver_devices", "Dispositivos acompanhados", function=lambda: len(latest_data))
+
+# Gravação do tráfego MQTT recebido (interface/traffic.py); ativada pela variável IOT_RECORD_DIR
+traffic_recorder = recorder_from_env("receiver")
+if traffic_recorder is not None:
+    metrics.counter("iot_receiver_traffic_recorded_total", "Mensagens gravadas pelo gravador de tráfego",
+                    function=lambda: traffic_recorder.recorded)
+    metrics.counter("iot_receiver_traffic_dropped_total", "Mensagens descartadas pelo gravador de tráfego",
+                    function=lambda: traffic_recorder.dropped)
+
+# Logs por amostra só em nível DEBUG, e apenas 1 a cada LOG_SAMPLE_EVERY amostras
+LOG_SAMPLE_EVERY = 100
+sample_log = LogSampler(LOG_SAMPLE_EVERY)
+
+# Função para obter (ou criar) o registro de um dispositivo
+def get_device_data(device_id):
+    data = latest_data.get(device_id)
+    if data is None:
+        if len(latest_data) >= MAX_DEVICES:
+            return None
+        data = latest_data[device_id] = {
+            "vibration": None,
+            "temperature": None,
+            "humidity": None,
+            "status": "desconhecido",
+            "last_update": None
+        }
+    return data
+
+# Estado do receptor para o supervisor (main.py), exposto em /health junto às métricas
+def health():
+    return {"ready": True, "checks": {"mqtt": client.is_connected()}}, 200
 
 # Callbacks
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
+        METRIC_MQTT_CONNECTS.inc()
         logging.warning("Conectado ao broker MQTT!")
         # Inscrever em todos os tópicos
-        client.subscribe(TOPIC_VIBRATION)
-        client.subscribe(TOPIC_TEMPERATURE)
-        client.subscribe(TOPIC_HUMIDITY)
-        client.subscribe(TOPIC_STATUS)
-        client.subscribe(TOPIC_COMMANDS)
+        client.subscribe(TOPIC_VIBRATION, MQTT_QOS)
+        client.subscribe(TOPIC_TEMPERATURE, MQTT_QOS)
+        client.subscribe(TOPIC_HUMIDITY, MQTT_QOS)
+        client.subscribe(TOPIC_STATUS, MQTT_QOS)
+        client.subscribe(TOPIC_COMMANDS, MQTT_QOS)
         
         # Publicar status online do cliente receptor
-        client.publish(TOPIC_STATUS, json.dumps({"status": "online", "device": "receiver"}))
+        mqtt_session.publish(TOPIC_RECEIVER_STATUS, json.dumps({"status": "online", "device": "receiver"}))
     else:
         logging.error(f"Falha na conexão, código de retorno: {rc}")
 
 def on_message(client, userdata, msg):
+    start = time.perf_counter()
+    sensor = None
+    if traffic_recorder is not None:
+        traffic_recorder.record(msg.topic, msg.payload, time.time())
     try:
         topic = msg.topic
-        payload = None
         
-        # Tentar decodificar a mensagem como JSON
-        try:
-            payload = json.loads(msg.payload.decode())
-        except json.JSONDecodeError:
-            # Se não for JSON, tratar como string ou número
-            payload_str = msg.payload.decode().strip()
-            try:
-                # Tentar converter para número
-                payload_value = float(payload_str)
-                payload = {"value": payload_value}
-            except ValueError:
-                # Se não for número, usar como string
-                payload = {"value": payload_str}
+        # O tópico tem o formato <dispositivo>/<sensor>
+        device_id, _, sensor = topic.rpartition("/")
+        METRIC_MESSAGES.inc(sensor)
+        device_data = get_device_data(device_id) if device_id else None
+        if device_data is None:
+            return
         
         current_time = time.strftime("%H:%M:%S")
         
-        # Atualizar dados baseado no tópico
-        if topic == TOPIC_VIBRATION and "value" in payload:
-            latest_data["vibration"] = payload["value"]
-            logging.warning(f"Dado de vibração recebido: {payload['value']}")
-            
-        elif topic == TOPIC_TEMPERATURE and "value" in payload:
-            latest_data["temperature"] = payload["value"]
-            logging.warning(f"Dado de temperatura recebido: {payload['value']}")
-            
-        elif topic == TOPIC_HUMIDITY and "value" in payload:
-            latest_data["humidity"] = payload["value"]
-            logging.warning(f"Dado de umidade recebido: {payload['value']}")
+        # Atualizar dados baseado no tópico (payload JSON, binário ou texto)
+        if sensor in ("vibration", "temperature", "humidity"):
+            decode_start = time.perf_counter()
+            try:
+                value, _ = decode_sample(sensor, msg.payload)
+            except DecodeError as e:
+                METRIC_DECODE_FAILURES.inc(sensor)
+                logging.error(f"Payload inválido no tópico {topic}: {str(e)}")
+                return
+            finally:
+                METRIC_DECODE_SECONDS.observe(time.perf_counter() - decode_start, sensor)
+            if value is None:
+                return
+            device_data[sensor] = value
+            if sample_log():
+                logging.debug(f"Dado de {SENSOR_LABELS[sensor]} recebido de {device_id}: {value}")
             
-        elif topic == TOPIC_STATUS:
-            if isinstance(payload, dict) and "status" in payload:
-                latest_data["status"] = payload["status"]
-                device = payload.get("device", "unknown")
-                logging.warning(f"Status recebido do dispositivo {device}: {payload['status']}")
+        elif sensor == "status":
+            status = decode_status(msg.payload)
+            if status is not None:
+                device_data["status"] = status
+                logging.warning(f"Status recebido do dispositivo {device_id}: {status}")
         
         # Processar comandos recebidos
-        elif topic == TOPIC_COMMANDS and isinstance(payload, dict):
-            command_type = payload.get("type")
+        elif sensor == "commands":
+            payload = decode_object(msg.payload)
+            command_type = payload.get("type") if payload is not None else None
+            # Só registra: a resposta em <dispositivo>/responses é do próprio dispositivo
+            # (uma resposta do receptor seria medida pelo dashboard como a ida e volta do comando)
             if command_type:
-                logging.warning(f"Comando recebido: {command_type}")
-                
-                # Publicar resposta ao comando
-                response = {
-                    "response_to": command_type,
-                    "status": "received",
-                    "timestamp": time.time()
-                }
-                client.publish(TOPIC_STATUS, json.dumps(response))
+                logging.warning(f"Comando observado para {device_id}: {command_type}")
+                METRIC_COMMANDS.inc(command_type)
         
-        latest_data["last_update"] = current_time
+        device_data["last_update"] = current_time
         
     except Exception as e:
         logging.error(f"Erro ao processar mensagem do tópico {msg.topic}: {str(e)}")
+    finally:
+        if sensor is not None:
+            METRIC_PROCESS_SECONDS.observe(time.perf_counter() - start, sensor)
 
 def on_disconnect(client, userdata, rc):
+    METRIC_MQTT_DISCONNECTS.inc("unexpected" if rc != 0 else "requested")
     logging.warning("Desconectado do broker MQTT")
     if rc != 0:
         logging.warning("Desconexão inesperada. Tentando reconectar...")
 
 # Configuração do cliente MQTT
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, CLIENT_ID)
+client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, CLIENT_ID, clean_session=MQTT_CLEAN_SESSION)
 client.on_connect = on_connect
 client.on_message = on_message
 client.on_disconnect = on_disconnect
+# Reconexão com espera aleatorizada, spool em disco e medição das quedas
+mqtt_session = MqttSession(client, qos=MQTT_QOS, spool=Spool(os.path.join(SPOOL_DIR, f"{CLIENT_ID}.sqlite")))
+metrics.counter("iot_receiver_mqtt_outages_total", "Quedas da conexão com o broker", function=lambda: mqtt_session.outages)
+metrics.counter("iot_receiver_mqtt_outage_seconds_total", "Tempo total sem conexão com o broker após uma queda",
+                function=lambda: mqtt_session.outage_seconds_total)
+metrics.gauge("iot_receiver_mqtt_spool_depth", "Publicações aguardando a reconexão no spool em disco",
+              function=lambda: mqtt_session.spool.depth())
 
 # Função principal
 def main():
     try:
-        # Conectar ao broker
-        logging.warning(f"Conectando ao broker {MQTT_BROKER}:{MQTT_PORT}...")
-        client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        # Expor as métricas e o estado (/health) para coleta
+        serve_metrics(metrics, port=METRICS_PORT, health=health)
         
-        # Iniciar loop MQTT em modo de bloqueio
-        logging.warning("Iniciando loop MQTT para receber dados dos sensores...")
-        client.loop_forever()
+        # Iniciar a gravação do tráfego MQTT, se ativada
+        if traffic_recorder is not None:
+            traffic_recorder.start()
+        
+        # Conectar ao broker e manter a conexão (reconectando após quedas), em modo de bloqueio
+        logging.warning(f"Conectando ao broker {MQTT_BROKER}:{MQTT_PORT}...")
+        mqtt_session.run_forever(MQTT_BROKER, MQTT_PORT, 60)
             
     except KeyboardInterrupt:
         logging.warning("Programa interrompido pelo usuário")
     except Exception as e:
         logging.error(f"Erro inesperado: {str(e)}")
     finally:
-        # Publicar status offline e desconectar
+        # Publicar status offline (guardado no spool se não houver conexão) e desconectar
         try:
-            client.publish(TOPIC_STATUS, json.dumps({"status": "offline", "device": "receiver"}))
-            client.disconnect()
+            mqtt_session.publish(TOPIC_RECEIVER_STATUS, json.dumps({"status": "offline", "device": "receiver"}))
+            mqtt_session.stop()
             logging.warning("Desconectado do broker MQTT")
         except Exception:
             pass
+        if traffic_recorder is not None:
+            traffic_recorder.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from alerts import AlertEngine, ThresholdRule, WindowRule, load_rules  # noqa: E402
+from devices import HISTORY_FIELDS, DeviceState  # noqa: E402
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface", "alert_rules.json")
+
+
+def rule(**definition):
+    base = {"name": "quente", "sensor": "temperature", "type": "temperatura", "above": 50.0, "message": "{value}"}
+    base.update(definition)
+    return base
+
+
+def test_shipped_rules_load():
+    assert load_rules(RULES_FILE)
+
+
+def test_unknown_message_field_rejected_on_load(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [rule(message="Temperatura {valor:.1f}")]}))
+    with pytest.raises(ValueError, match="valor"):
+        load_rules(str(path))
+    # Campos de outro tipo de regra também não existem no contexto
+    with pytest.raises(ValueError, match="rate"):
+        ThresholdRule(rule(message="{rate}"))
+    with pytest.raises(ValueError):
+        ThresholdRule(rule(message="{value"))
+    assert WindowRule(rule(kind="window", message="{count} de {samples}")).samples == 10
+
+
+def test_message_format_error_does_not_stop_other_rules():
+    rules = [ThresholdRule(rule(message="Temperatura {value:d}")),
+             ThresholdRule(rule(name="outra", type="outro", message="Valor {value:.1f}"))]
+    engine = AlertEngine(rules)
+    device = DeviceState("dev1", {sensor: 10 for sensor in HISTORY_FIELDS}, {})
+    assert engine.evaluate(device, "temperature", 1000.0, {"value": 60.0})
+    assert device.alerts["temperatura"].message == "Temperatura {value:d}"
+    assert device.alerts["outro"].message == "Valor 60.0"
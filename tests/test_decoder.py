@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from decoder import (DecodeError, decode_object, decode_sample, decode_samples, decode_status,  # noqa: E402
+                     detect_format, encode_batch, encode_struct)
+
+SAMPLES = [{"magnitude": 1.5, "timestamp": 1000}, {"magnitude": 2.5, "timestamp": 1100}, {"magnitude": 3.5, "timestamp": 1200}]
+EXPECTED = [(1.5, 1000), (2.5, 1100), (3.5, 1200)]
+EVENLY_SPACED = {"timestamp": 1000, "interval": 100, "values": [1.5, 2.5, 3.5]}
+
+
+def test_batch_round_trip_json():
+    assert decode_samples("vibration", json.dumps(SAMPLES).encode()) == EXPECTED
+    assert decode_samples("vibration", json.dumps(EVENLY_SPACED).encode()) == EXPECTED
+
+
+def test_batch_round_trip_msgpack_map():
+    msgpack = pytest.importorskip("msgpack")
+    assert decode_samples("vibration", msgpack.packb(EVENLY_SPACED)) == EXPECTED
+    assert decode_samples("vibration", msgpack.packb({"samples": SAMPLES})) == EXPECTED
+
+
+def test_batch_round_trip_msgpack_array():
+    msgpack = pytest.importorskip("msgpack")
+    payload = msgpack.packb(SAMPLES)
+    assert detect_format(payload) == "msgpack"
+    assert decode_samples("vibration", payload) == EXPECTED
+    # array16: mais de 15 amostras
+    samples = [{"magnitude": float(index), "timestamp": index} for index in range(20)]
+    payload = msgpack.packb(samples)
+    assert payload[0] == 0xDC
+    assert decode_samples("vibration", payload) == [(float(index), index) for index in range(20)]
+
+
+def test_batch_round_trip_csv():
+    assert decode_samples("vibration", b"1.5,2.5,3.5") == [(1.5, None), (2.5, None), (3.5, None)]
+    assert decode_samples("temperature", b" 21.0, 21.5\n") == [(21.0, None), (21.5, None)]
+
+
+def test_detect_format():
+    assert detect_format(b"") == "empty"
+    assert detect_format(b'{"magnitude": 1}') == "json"
+    assert detect_format(b"[1, 2]") == "json"
+    assert detect_format(b"23.5") == "text"
+    assert detect_format(encode_struct("temperature", 23.5, 1000)) == "struct"
+    assert detect_format(encode_batch("vibration", [1.0, 2.0], 1000, 100)) == "batch"
+    # Primeiro byte de lote, mas tamanho que não bate com o cabeçalho
+    assert detect_format(encode_batch("vibration", [1.0, 2.0])[:-1]) == "text"
+
+
+def test_detect_format_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    assert detect_format(msgpack.packb({"magnitude": 1.0})) == "msgpack"
+    assert detect_format(msgpack.packb({str(index): index for index in range(20)})) == "msgpack"
+    assert detect_format(msgpack.packb([1.0, 2.0])) == "msgpack"
+
+
+def test_decode_sample_formats():
+    assert decode_sample("vibration", b'{"magnitude": 3.0, "level": 1.0, "timestamp": 42}') == (3.0, 42)
+    assert decode_sample("temperature", b'{"temperature": 22.5}') == (22.5, None)
+    assert decode_sample("humidity", b"55.5") == (55.5, None)
+    value, timestamp = decode_sample("temperature", encode_struct("temperature", 23.5, 1000))
+    assert (value, timestamp) == (23.5, 1000)
+    assert decode_samples("vibration", encode_batch("vibration", [1.0, 2.0], 1000, 100)) == [(1.0, 1000), (2.0, 1100)]
+    # Sem valor numérico utilizável
+    assert decode_sample("temperature", b'{"status": "ok"}') == (None, None)
+
+
+def test_decode_errors():
+    for payload in (b'{"magnitude": 1', b"\xff\xfe", b'{"magnitude": 1, "timestamp": "x"}', b"nan",
+                    encode_struct("temperature", float("nan"))):
+        with pytest.raises(DecodeError):
+            decode_samples("vibration", payload)
+
+
+def test_decode_status_and_object():
+    assert decode_status(b"online") == "online"
+    assert decode_status(b'{"status": "offline"}') == "offline"
+    assert decode_status(b"\xff\xfe") is None
+    assert decode_object(b'{"id": "abc"}') == {"id": "abc"}
+    assert decode_object(b"[1, 2]") is None
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from downsample import RollupTier, Rollups  # noqa: E402
+
+
+def test_range_starting_mid_bucket_includes_current_bucket():
+    tier = RollupTier(60, 100)
+    for timestamp in range(1000, 1010):
+        tier.add(timestamp, float(timestamp))
+    # Balde [960, 1020); o intervalo começa no meio dele
+    assert tier.covers(1005, True)
+    times, columns = tier.range(1005, 1100)
+    assert times.tolist() == [960.0]
+    assert columns["count"].tolist() == [10]
+
+
+def test_range_starting_mid_bucket_includes_sealed_bucket():
+    tier = RollupTier(60, 100)
+    for timestamp in (1000, 1010, 1090, 1150):
+        tier.add(timestamp, 1.0)
+    # Baldes 960, 1080 e 1140 (corrente); 1010 cai dentro do balde 960
+    times, _ = tier.range(1010, 1100)
+    assert times.tolist() == [960.0, 1080.0]
+    # Balde que termina exatamente no início do intervalo fica de fora
+    times, _ = tier.range(1020, 1100)
+    assert times.tolist() == [1080.0]
+    times, _ = tier.range(1100, 1200)
+    assert times.tolist() == [1080.0, 1140.0]
+
+
+def test_choose_and_range_agree_on_short_range():
+    rollups = Rollups({"1s": (1, 100), "1m": (60, 100)})
+    for timestamp in range(1000, 1004):
+        rollups.add(timestamp, 1.0)
+    name = rollups.choose(995, 1015, 3, require_coverage=True)
+    times, _ = rollups.tiers[name].range(995, 1015)
+    assert len(times) > 0
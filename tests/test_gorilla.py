@@ -0,0 +1,64 @@
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from gorilla import decode_block, encode_block, quantize_time  # noqa: E402
+from timeseries import CompressedSeries  # noqa: E402
+
+
+def test_round_trip_regular_spacing():
+    times = [1743465600.0 + index * 0.1 for index in range(1000)]
+    values = [20.0 + math.sin(index / 10) for index in range(1000)]
+    data = encode_block(times, [values])
+    decoded_times, decoded_values = decode_block(data, len(times))
+    assert decoded_times == [quantize_time(timestamp) for timestamp in times]
+    assert decoded_values == [values]
+    # Espaçamento regular e valores suaves: bem menos que 16 bytes por ponto
+    assert len(data) < 8 * len(times)
+
+
+def test_round_trip_irregular_spacing_and_special_values():
+    rng = random.Random(7)
+    times, timestamp = [], 1743465600.0
+    # Delta-of-delta em todas as faixas, inclusive a completa (salto de horas) e negativas
+    for gap in (0.1, 0.1, 0.1001, 0.25, 0.9, 3600.0, 0.001, 0.1, 5e-6):
+        timestamp += gap
+        times.append(timestamp)
+    for _ in range(200):
+        timestamp += rng.uniform(0.0, 2.0)
+        times.append(timestamp)
+    special = [0.0, -0.0, 1e308, -1e-308, float("inf"), float("-inf"), 5e-324]
+    values = special + [rng.gauss(0, 1e6) for _ in range(len(times) - len(special))]
+    raw = [float(index % 3) for index in range(len(times))]
+    decoded_times, (decoded_values, decoded_raw) = decode_block(encode_block(times, [values, raw]), len(times), 2)
+    assert decoded_times == [quantize_time(timestamp) for timestamp in times]
+    assert [math.copysign(1, value) for value in decoded_values[:2]] == [1, -1]
+    assert decoded_values == values
+    assert decoded_raw == raw
+
+
+def test_round_trip_nan_and_small_blocks():
+    assert decode_block(encode_block([], [[]]), 0) == ([], [[]])
+    decoded_times, (decoded_values,) = decode_block(encode_block([1.5], [[float("nan")]]), 1)
+    assert decoded_times == [1.5] and math.isnan(decoded_values[0])
+    decoded_times, (decoded_values,) = decode_block(encode_block([1.0, 2.0], [[3.0, 3.0]]), 2)
+    assert decoded_times == [1.0, 2.0] and decoded_values == [3.0, 3.0]
+
+
+def test_compressed_series_reads_across_blocks():
+    series = CompressedSeries(100, fields=("value", "raw"), block_size=16)
+    for index in range(130):
+        series.append(1000.0 + index, float(index), float(-index))
+    # Blocos fechados além da capacidade são descartados inteiros
+    assert len(series) == 130 - 32
+    assert series.is_full()
+    assert series.first()[0] == 1032.0
+    times, columns = series.range(1040.5, 1100.0)
+    assert times.tolist() == [1000.0 + index for index in range(41, 101)]
+    assert columns["raw"].tolist() == [-float(index) for index in range(41, 101)]
+    times, columns = series.tail(20)
+    assert times.tolist() == [1000.0 + index for index in range(110, 130)]
+    assert columns["value"].tolist() == [float(index) for index in range(110, 130)]
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from ingest import IngestQueue  # noqa: E402
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def __call__(self, topic, payload, received_at):
+        with self.lock:
+            self.calls.append((topic, payload, threading.current_thread().name))
+
+    def payloads(self):
+        return [payload for _, payload, _ in self.calls]
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        IngestQueue(Recorder(), policy="drop-newest")
+
+
+def test_drop_oldest_keeps_newest_messages():
+    handler = Recorder()
+    queue = IngestQueue(handler, maxsize=4, policy="drop-oldest")
+    assert all(queue.put("dev", "dev/vibration", index) for index in range(6))
+    assert (queue.depth(), queue.enqueued, queue.dropped, queue.max_depth) == (4, 6, 2, 4)
+    queue.start()
+    queue.stop(timeout=5)
+    assert handler.payloads() == [2, 3, 4, 5]
+    assert queue.stats()["processed"] == 4
+
+
+def test_block_waits_for_the_worker():
+    gate = threading.Event()
+    handler = Recorder()
+
+    def slow_handler(topic, payload, received_at):
+        gate.wait(5)
+        handler(topic, payload, received_at)
+
+    queue = IngestQueue(slow_handler, maxsize=1, policy="block", block_timeout=5)
+    queue.start()
+    queue.put("dev", "dev/vibration", 0)
+    # O worker segura a primeira mensagem; a segunda ocupa a fila e a terceira espera
+    deadline = time.monotonic() + 5
+    while queue.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    queue.put("dev", "dev/vibration", 1)
+    results = []
+    producer = threading.Thread(target=lambda: results.append(queue.put("dev", "dev/vibration", 2)))
+    producer.start()
+    time.sleep(0.1)
+    assert producer.is_alive()
+    gate.set()
+    producer.join(5)
+    queue.stop(timeout=5)
+    assert results == [True]
+    assert handler.payloads() == [0, 1, 2]
+    assert queue.dropped == 0
+
+
+def test_block_drops_new_message_after_timeout():
+    queue = IngestQueue(Recorder(), maxsize=1, policy="block", block_timeout=0.05)
+    assert queue.put("dev", "dev/vibration", 0)
+    start = time.monotonic()
+    assert not queue.put("dev", "dev/vibration", 1)
+    assert time.monotonic() - start >= 0.05
+    assert (queue.enqueued, queue.dropped) == (1, 1)
+
+
+def test_sample_thins_above_half_capacity():
+    handler = Recorder()
+    queue = IngestQueue(handler, maxsize=8, policy="sample", sample_every=4)
+    accepted = [index for index in range(20) if queue.put("dev", "dev/vibration", index)]
+    # Até metade da capacidade aceita todas; depois, 1 de cada 4; cheia, descarta
+    assert accepted == [0, 1, 2, 3, 7, 11, 15, 19]
+    assert (queue.enqueued, queue.dropped) == (8, 12)
+    queue.start()
+    queue.stop(timeout=5)
+    assert handler.payloads() == accepted
+
+
+def test_messages_of_a_key_keep_order_on_one_worker():
+    handler = Recorder()
+    queue = IngestQueue(handler, maxsize=10000, workers=4)
+    queue.start()
+    keys = [f"dev{index}" for index in range(8)]
+    for seq in range(200):
+        for key in keys:
+            queue.put(key, f"{key}/vibration", seq)
+    queue.stop(timeout=5)
+    assert queue.stats()["processed"] == len(keys) * 200
+    for key in keys:
+        calls = [(payload, thread) for topic, payload, thread in handler.calls if topic.startswith(key + "/")]
+        assert [payload for payload, _ in calls] == list(range(200))
+        assert len({thread for _, thread in calls}) == 1
+
+
+def test_submitted_tasks_run_before_queued_messages():
+    handler = Recorder()
+    queue = IngestQueue(handler, maxsize=10)
+    queue.put("dev", "dev/vibration", 0)
+    queue.submit("dev", handler, "task", "reset", None)
+    queue.start()
+    queue.stop(timeout=5)
+    assert handler.payloads() == ["reset", 0]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+import server_async  # noqa: E402
+
+dashboard = server_async.dashboard
+
+
+async def request(path, query=b"", headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await server_async.http_app({"type": "http", "method": "GET", "path": path, "query_string": query,
+                                 "headers": list(headers)}, receive, send)
+    status = messages[0]["status"]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return status, body, dict(messages[0]["headers"])
+
+
+def test_api_data_flushes_pending_delta_on_the_loop():
+    scheduler = dashboard.broadcast_scheduler
+    frames = []
+    send_frame = scheduler.send_frame
+
+    def record_frame(delta):
+        frames.append(delta)
+        send_frame(delta)
+
+    async def scenario():
+        scheduler.send_frame = record_frame
+        scheduler.start()
+        try:
+            # Mensagem ingerida: delta pendente até o próximo quadro
+            now = time.time()
+            dashboard.handle_message("async-dev/temperature", json.dumps({"value": 21.5, "timestamp": now}).encode(), now)
+            assert dashboard.delta_builder.has_changes()
+            # A rota roda no executor; o envio do delta pendente tem de acontecer no laço
+            status, body, _ = await request("/api/data", b"device=async-dev")
+            await asyncio.sleep(scheduler.max_latency + 0.1)
+            return status, json.loads(body)
+        finally:
+            scheduler.stop()
+            scheduler.send_frame = send_frame
+
+    status, data = asyncio.run(scenario())
+    assert status == 200
+    assert len(frames) == 1
+    assert data["seq"] == frames[0]["seq"]
+    assert [point["value"] for point in data["temperature"]] == [21.5]
+    assert not dashboard.delta_builder.has_changes()
+
+
+def test_snapshot_seq_does_not_cover_frames_sent_while_building():
+    scheduler = dashboard.broadcast_scheduler
+    serialize_device = dashboard.serialize_device
+
+    def ingest(value):
+        now = time.time()
+        dashboard.handle_message("race-dev/humidity", json.dumps({"value": value, "timestamp": now}).encode(), now)
+
+    def racing_serialize(*args, **kwargs):
+        data = serialize_device(*args, **kwargs)
+        # Quadro enviado depois da leitura do estado e antes do fim do snapshot
+        ingest(61.0)
+        scheduler.flush()
+        return data
+
+    async def scenario():
+        scheduler.start()
+        try:
+            ingest(60.0)
+            dashboard.serialize_device = racing_serialize
+            try:
+                first = await request("/api/data", b"device=race-dev")
+            finally:
+                dashboard.serialize_device = serialize_device
+            second = await request("/api/data", b"device=race-dev")
+            # Sem novas mudanças: a entrada é encontrada, com o mesmo ETag
+            hits = dashboard.snapshot_cache.hits
+            third = await request("/api/data", b"device=race-dev")
+            assert dashboard.snapshot_cache.hits == hits + 1
+            assert third[2][b"etag"] == second[2][b"etag"]
+            return json.loads(first[1]), json.loads(second[1])
+        finally:
+            scheduler.stop()
+
+    first, second = asyncio.run(scenario())
+    # O primeiro snapshot não inclui o ponto do quadro do meio: a sequência dele fica de fora
+    assert [point["value"] for point in first["humidity"]] == [60.0]
+    assert first["seq"] == dashboard.delta_builder.current_seq() - 1
+    # A entrada em cache tem essa sequência, então a consulta seguinte gera o snapshot atual
+    assert [point["value"] for point in second["humidity"]] == [60.0, 61.0]
+    assert second["seq"] == dashboard.delta_builder.current_seq()
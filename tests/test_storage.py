@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "interface"))
+
+from storage import COMPACTED_VERSION, HistoryStore  # noqa: E402
+
+DAY = 86400
+# Início de um segmento diário
+BASE = 1743465600
+
+
+def write(store, samples):
+    store.start()
+    for sample in samples:
+        store.append(*sample)
+    store.stop()
+
+
+def test_write_and_query_across_segments(tmp_path):
+    store = HistoryStore(str(tmp_path), retention_days=36500, flush_interval=0.05)
+    samples = [("dev1", "vibration", BASE + DAY - 2 + index, float(index), float(index) * 10) for index in range(4)]
+    samples.append(("dev1", "temperature", BASE + 10, 21.5, None))
+    samples.append(("dev2", "vibration", BASE + 10, 99.0, None))
+    write(store, samples)
+
+    assert [start for start, _ in store.segments()] == [BASE, BASE + DAY]
+    stats = store.stats()
+    assert (stats["samples_written"], stats["samples_dropped"], stats["write_errors"]) == (6, 0, 0)
+
+    times, values, raw_values = store.query("dev1", "vibration", BASE, BASE + 2 * DAY)
+    assert times == [BASE + DAY - 2 + index for index in range(4)]
+    assert values == [0.0, 1.0, 2.0, 3.0]
+    assert raw_values == [0.0, 10.0, 20.0, 30.0]
+    # Limite atravessando segmentos e intervalo fechado nas duas pontas
+    assert store.query("dev1", "vibration", BASE, BASE + 2 * DAY, limit=3)[0] == times[:3]
+    assert store.query("dev1", "vibration", BASE + DAY - 1, BASE + DAY)[0] == [BASE + DAY - 1, BASE + DAY]
+    assert store.query("dev1", "temperature", BASE, BASE + DAY) == ([BASE + 10], [21.5], [None])
+
+    # Reescrever um timestamp substitui a amostra
+    write(store, [("dev1", "temperature", BASE + 10, 22.0, None)])
+    assert store.query("dev1", "temperature", BASE, BASE + DAY)[1] == [22.0]
+
+
+def test_iter_range_streams_in_batches_and_resumes(tmp_path):
+    store = HistoryStore(str(tmp_path), retention_days=36500, flush_interval=0.05)
+    write(store, [("dev1", "vibration", BASE + DAY - 5 + index, float(index), None) for index in range(10)])
+    batches = list(store.iter_range("dev1", "vibration", BASE, BASE + 2 * DAY, batch_size=3))
+    # Um cursor por segmento: 5 amostras em cada um
+    assert [len(batch) for batch in batches] == [3, 2, 3, 2]
+    assert [row[1] for batch in batches for row in batch] == [float(index) for index in range(10)]
+    resumed = [row[0] for batch in store.iter_range("dev1", "vibration", BASE, BASE + 2 * DAY, after=BASE + DAY)
+               for row in batch]
+    assert resumed == [BASE + DAY + index for index in range(1, 5)]
+
+
+def test_retention_and_compaction(tmp_path):
+    # A manutenção da thread de escrita usa o relógio real: segmentos dos últimos dias até o atual
+    now = time.time()
+    current = int(now // DAY) * DAY
+    write(HistoryStore(str(tmp_path), retention_days=36500, flush_interval=0.05),
+          [("dev1", "vibration", current + (day - 4) * DAY + 1, float(day), None) for day in range(5)])
+    store = HistoryStore(str(tmp_path), retention_days=2)
+    store.maintain(now)
+
+    # Fora da retenção: segmentos que terminaram antes de now - 2 dias
+    segments = store.segments()
+    assert [start for start, _ in segments] == [current - 2 * DAY, current - DAY, current]
+    assert store.query("dev1", "vibration", current - 4 * DAY, now)[1] == [2.0, 3.0, 4.0]
+
+    # Segmentos que não recebem mais escrita ficam compactados, com a marca gravada no arquivo
+    def user_version(path):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            connection.close()
+
+    assert [user_version(path) for _, path in segments] == [COMPACTED_VERSION, COMPACTED_VERSION, 0]
+    assert not any(os.path.exists(path + "-wal") and os.path.getsize(path + "-wal") for _, path in segments[:2])
+
+    # Após reiniciar, segmentos já compactados não são reescritos
+    modified = [os.stat(path).st_mtime_ns for _, path in segments[:2]]
+    HistoryStore(str(tmp_path), retention_days=2).maintain(now)
+    assert [os.stat(path).st_mtime_ns for _, path in segments[:2]] == modified
+
+
+def test_append_drops_when_queue_is_full(tmp_path):
+    store = HistoryStore(str(tmp_path), retention_days=36500, max_queue=2)
+    for index in range(5):
+        store.append("dev1", "vibration", BASE + index, 1.0)
+    assert store.stats()["samples_dropped"] == 3
+    write(store, [])
+    assert store.query("dev1", "vibration", BASE, BASE + 10)[0] == [BASE, BASE + 1]